@@ -0,0 +1,103 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select, true
+from models import Order, Product, Seller, User, Withdrawal, db
+from background import start_periodic
+from cache import catalog_cache
+
+PLATFORM_FEE = 0.07
+
+_snapshot = {'metrics': None, 'computed_at': None, 'monotonic': 0.0}
+_lock = threading.Lock()
+
+def init_app(app):
+    """Refresh the dashboard snapshot in the background"""
+    start_periodic(
+        app,
+        'admin-metrics',
+        app.config.get('ADMIN_METRICS_REFRESH_INTERVAL', 60),
+        refresh
+    )
+
+def compute():
+    """All dashboard metrics in one round trip.
+
+    Each table is aggregated once in its own derived table and the one-row
+    results are cross joined, instead of one COUNT per metric.
+    """
+    users = select(func.count().label('total_users')).select_from(User).subquery()
+    sellers = select(
+        func.count().label('total_sellers'),
+        func.count().filter(Seller.status == 'approved').label('active_sellers'),
+        func.count().filter(Seller.status == 'pending').label('pending_sellers')
+    ).subquery()
+    products = select(func.count().label('total_products')).select_from(Product).subquery()
+    orders = select(
+        func.count().label('total_orders'),
+        func.coalesce(func.sum(Order.total_price).filter(Order.status != 'cancelled'), 0).label('total_sales')
+    ).subquery()
+    withdrawals = select(
+        func.coalesce(func.sum(Withdrawal.amount_requested).filter(Withdrawal.status == 'processed'), 0).label('withdrawn')
+    ).subquery()
+
+    one_row = users.join(sellers, true()).join(products, true()).join(orders, true()).join(withdrawals, true())
+    row = db.session.execute(
+        select(users, sellers, products, orders, withdrawals).select_from(one_row)
+    ).one()
+
+    return {
+        'totalUsers': row.total_users,
+        'totalSellers': row.total_sellers,
+        'activeSellers': row.active_sellers,
+        'pendingSellers': row.pending_sellers,
+        'totalProducts': row.total_products,
+        'totalOrders': row.total_orders,
+        'totalSales': float(row.total_sales),
+        'platformRevenue': float(row.withdrawn) * PLATFORM_FEE
+    }
+
+def order_category_counts():
+    """Admin order category counters in one conditional-aggregate query"""
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    row = db.session.query(
+        func.count().label('total'),
+        func.count().filter(Order.created_at >= week_ago).label('recent'),
+        func.count().filter(Order.total_price > 100).label('high_value'),
+        func.count().filter(Order.status.in_(['pending', 'processing'])).label('pending_fulfillment'),
+        func.count().filter(Order.status == 'delivered').label('completed'),
+        func.count().filter(Order.status == 'cancelled').label('cancelled')
+    ).select_from(Order).one()
+    return dict(row._mapping)
+
+def get_order_category_counts():
+    """Cached category counters; `recent` drifts by at most ORDER_COUNTS_TTL"""
+    return catalog_cache.get_or_set(
+        'admin-order-counts',
+        ['order_counts'],
+        order_category_counts,
+        ttl=current_app.config.get('ORDER_COUNTS_TTL', 60)
+    )
+
+def invalidate_order_counts():
+    catalog_cache.invalidate('order_counts')
+
+def refresh():
+    metrics, computed_at = compute(), datetime.utcnow()
+    with _lock:
+        _snapshot.update(metrics=metrics, computed_at=computed_at, monotonic=time.monotonic())
+    return metrics, computed_at
+
+def get_metrics(fresh=False):
+    """Snapshot metrics and when they were computed.
+
+    Falls back to computing inline when asked to, when nothing has been
+    computed yet, or when the background refresh has fallen behind.
+    """
+    interval = current_app.config.get('ADMIN_METRICS_REFRESH_INTERVAL', 60)
+    with _lock:
+        metrics, computed_at, stamp = _snapshot['metrics'], _snapshot['computed_at'], _snapshot['monotonic']
+    if fresh or metrics is None or time.monotonic() - stamp > 2 * max(interval, 1):
+        metrics, computed_at = refresh()
+    return metrics, computed_at
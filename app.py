@@ -1,8 +1,24 @@
-from flask import Flask, jsonify,request
+from flask import Flask, Response, jsonify,request
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
+from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
 from models import db
+import search
+import reservations
+import ledger
+import admin_metrics
+import query_plans
+import serializers
+import db_profiles
+from auth import monitoring_required
+from cache import catalog_cache
+from passwords import password_hasher
+from product_import import product_importer
+from throttle import throttle
+from replicas import replicas
+from metrics import request_metrics
 from routes.auth_routes import auth_bp
 from routes.product_routes import product_bp
 from routes.order_routes import order_bp
@@ -15,9 +31,23 @@ def create_app():
     CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}}, supports_credentials=True)
     app.config.from_object(Config)
     
+    # Client address and scheme from trusted proxies' X-Forwarded-* headers
+    proxies = app.config.get('TRUSTED_PROXIES', 0)
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+    
     # Initialize extensions
     db.init_app(app)
+    db_profiles.init_app(app)
+    request_metrics.init_app(app)
+    replicas.init_app(app)
+    Migrate(app, db, render_as_batch=True, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
     jwt = JWTManager(app)
+    catalog_cache.init_app(app)
+    password_hasher.init_app(app)
+    product_importer.init_app(app)
+    throttle.init_app(app)
+    serializers.init_app(app)
     
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -53,6 +83,31 @@ def create_app():
     def health_check():
         return jsonify({'status': 'healthy'}), 200
     
+    @app.route('/api/cache/stats')
+    @monitoring_required
+    def cache_stats():
+        return jsonify(catalog_cache.stats()), 200
+    
+    @app.route('/api/throttle/stats')
+    @monitoring_required
+    def throttle_stats():
+        return jsonify(throttle.stats()), 200
+
+    @app.route('/api/db/stats')
+    @monitoring_required
+    def db_stats():
+        return jsonify(db_profiles.stats()), 200
+
+    @app.route('/api/replicas/stats')
+    @monitoring_required
+    def replica_stats():
+        return jsonify(replicas.stats()), 200
+
+    @app.route('/api/metrics')
+    @monitoring_required
+    def metrics():
+        return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -74,13 +129,17 @@ def create_app():
     def missing_token_callback(error):
         return jsonify({'message': 'Token is required'}), 401
     
-    # Create tables
-    with app.app_context():
-        db.create_all()
+    # Schema is managed by migrations: run `flask db upgrade` before serving
+    search.init_app(app)
+    reservations.init_app(app)
+    ledger.init_app(app)
+    admin_metrics.init_app(app)
+    query_plans.init_app(app)
     
     return app
 
 if __name__ == '__main__':
     app = create_app()
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    # Development server only; production runs gunicorn -c gunicorn.conf.py wsgi:app
+    app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
@@ -1,22 +1,93 @@
-import bcrypt
-from flask_jwt_extended import create_access_token, get_jwt_identity
-from models import User, db
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, jsonify, request
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import update
+from models import Seller, User, db
+from passwords import HasherBusy, password_hasher
+
+class Identity:
+    """What most routes need to know about the caller, without a User row"""
+    __slots__ = ('id', 'role', 'seller_id', 'seller_status')
+
+    def __init__(self, id, role, seller_id=None, seller_status=None):
+        self.id = id
+        self.role = role
+        self.seller_id = seller_id
+        self.seller_status = seller_status
+
+class IdentityCache:
+    """Process-local, size-bounded TTL cache of Identity objects by user id"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            identity, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return identity
+
+    def set(self, user_id, identity, ttl):
+        with self._lock:
+            self._entries[user_id] = (identity, time.monotonic() + ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+identity_cache = IdentityCache()
 
 def hash_password(password):
-    """Hash password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    """Hash password using bcrypt (raises HasherBusy when overloaded)"""
+    return password_hasher.hash(password)
 
 def verify_password(password, hashed):
-    """Verify password against hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    """Verify password against hash (raises HasherBusy when overloaded)"""
+    return password_hasher.verify(password, hashed)
 
 def authenticate_user(username, password):
     """Authenticate user and return access token"""
-    user = User.query.filter_by(username=username).first()
-    if user and verify_password(password, user.password):
-        access_token = create_access_token(identity=user.id)
-        return access_token, user
-    return None, None
+    row = db.session.query(User, Seller).outerjoin(
+        Seller, Seller.user_id == User.id
+    ).filter(User.username == username).first()
+    if row is None or not verify_password(password, row[0].password):
+        return None, None
+    user, seller = row
+    # Role and seller id never change; seller status is informational
+    # only, routes read the live value through get_current_identity()
+    access_token = create_access_token(identity=user.id, additional_claims={
+        'role': user.role,
+        'seller_id': seller.id if seller else None,
+        'seller_status': seller.status if seller else None
+    })
+    if password_hasher.needs_rehash(user.password):
+        # Upgrade to the configured cost; a busy pool just defers it
+        try:
+            rehashed = password_hasher.rehash(password)
+        except HasherBusy:
+            rehashed = None
+        if rehashed:
+            # Detached, `user` is not expired by the commit, so the response
+            # needs no refresh SELECT
+            db.session.expunge(user)
+            db.session.execute(update(User).where(User.id == user.id).values(password=rehashed))
+            db.session.commit()
+    return access_token, user
 
 def get_current_user():
     """Get current user from JWT token"""
@@ -24,3 +95,55 @@ def get_current_user():
     if user_id:
         return User.query.get(user_id)
     return None
+
+def get_current_identity():
+    """Identity of the JWT's user, without a DB round trip where possible.
+
+    Non-sellers are resolved from token claims alone. Sellers (whose status
+    can change) and tokens issued without claims take one joined lookup,
+    cached for IDENTITY_CACHE_TTL seconds and dropped by invalidate_identity.
+    """
+    user_id = get_jwt_identity()
+    if not user_id:
+        return None
+
+    identity = identity_cache.get(user_id)
+    if identity is not None:
+        return identity
+
+    claims = get_jwt()
+    if claims.get('role') and claims['role'] != 'seller':
+        identity = Identity(user_id, claims['role'])
+    else:
+        row = db.session.query(User.role, Seller.id, Seller.status).outerjoin(
+            Seller, Seller.user_id == User.id
+        ).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        identity = Identity(user_id, row[0], row[1], row[2])
+
+    identity_cache.set(user_id, identity, current_app.config.get('IDENTITY_CACHE_TTL', 30))
+    return identity
+
+def invalidate_identity(user_id):
+    """Forget the cached identity after a change to the user or their seller profile"""
+    identity_cache.invalidate(user_id)
+
+def monitoring_required(view):
+    """Restrict a metrics or stats endpoint to admins and the metrics scraper.
+
+    A scraper sends `Authorization: Bearer <METRICS_TOKEN>`; anything else
+    must be an admin's JWT.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('METRICS_TOKEN')
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        if token and scheme == 'Bearer' and hmac.compare_digest(credentials.encode(), token.encode()):
+            return view(*args, **kwargs)
+        verify_jwt_in_request()
+        identity = get_current_identity()
+        if identity is None or identity.role != 'admin':
+            return jsonify({'message': 'Unauthorized'}), 403
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,47 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def _spawn(app, name, interval, func):
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    func()
+                except Exception:
+                    logger.exception('Background job %s failed', name)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return stop, thread
+
+def start_periodic(app, name, interval, func):
+    """Run func() inside an app context every `interval` seconds.
+
+    Runs on a daemon thread so it never blocks shutdown. Returns the stop
+    event, or None when interval is not positive.
+    """
+    if not interval or interval <= 0:
+        return None
+
+    stop, thread = _spawn(app, name, interval, func)
+    app.extensions.setdefault('background_jobs', {})[name] = (stop, thread, interval, func)
+    return stop
+
+def stop_all(app, timeout=None):
+    """Stop every job, waiting up to `timeout` seconds for runs in progress"""
+    jobs = app.extensions.get('background_jobs', {})
+    for stop, _, _, _ in jobs.values():
+        stop.set()
+    for _, thread, _, _ in jobs.values():
+        thread.join(timeout)
+
+def restart_after_fork(app):
+    """Start every job again; threads do not survive fork()"""
+    jobs = app.extensions.get('background_jobs', {})
+    for name, (stop, _, interval, func) in list(jobs.items()):
+        stop.set()
+        jobs[name] = (*_spawn(app, name, interval, func), interval, func)
@@ -0,0 +1,132 @@
+"""Fire parallel checkouts at a low-stock product and check nothing oversells.
+
+Seeds a small marketplace (benchmarks/seed.py) into a fresh SQLite file or
+the empty database at --url, then for each round sets one product to
+--stock units, gives --buyers buyers an unheld cart line for one unit and
+releases all their checkouts at once. A round passes when at most --stock
+checkouts succeed and the product's stock, the units in new order items and
+the successful checkouts all agree. Exits 1 when any round oversells.
+
+    python benchmarks/checkout_oversell.py --buyers 40 --stock 5
+    python benchmarks/checkout_oversell.py --mode http --url postgresql://localhost/oversell
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def run_round(app, transports, tokens, product_id, stock):
+    from models import CartItem, OrderItem, Product, db
+
+    with app.app_context():
+        CartItem.query.filter(CartItem.product_id == product_id).delete(synchronize_session=False)
+        product = db.session.get(Product, product_id)
+        product.stock, product.reserved = stock, 0
+        sold_before = db.session.query(db.func.coalesce(db.func.sum(OrderItem.quantity), 0)).filter(
+            OrderItem.product_id == product_id).scalar()
+        for user_id in tokens:
+            # Unheld lines: every checkout has to win the stock itself
+            db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=1, reserved_quantity=0))
+        db.session.commit()
+
+    statuses = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(tokens))
+    body = b'{"shippingAddress": "1 Bench Street", "method": "paypal"}'
+
+    def buyer(transport, token):
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        barrier.wait()
+        status, _, _ = transport.request('POST', '/api/orders/checkout', headers, body)
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=buyer, args=(transport, token))
+               for transport, token in zip(transports, tokens.values())]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        product = db.session.get(Product, product_id)
+        sold = db.session.query(db.func.coalesce(db.func.sum(OrderItem.quantity), 0)).filter(
+            OrderItem.product_id == product_id).scalar() - sold_before
+        remaining = product.stock
+        db.session.rollback()
+
+    succeeded = statuses.get(201, 0)
+    problems = []
+    if succeeded > stock or sold > stock:
+        problems.append(f'oversold: {succeeded} checkouts and {sold} units for {stock} in stock')
+    if remaining < 0:
+        problems.append(f'stock went negative ({remaining})')
+    if sold != succeeded or remaining != stock - sold:
+        problems.append(f'inconsistent: {succeeded} checkouts, {sold} units sold, stock {stock} -> {remaining}')
+    return statuses, sold, remaining, problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=('client', 'http'), default='client')
+    parser.add_argument('--url', help='Empty database to use instead of a fresh SQLite file')
+    parser.add_argument('--buyers', type=int, default=40, help='Parallel checkouts per round')
+    parser.add_argument('--stock', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.url or f'sqlite:///{os.path.join(tempfile.mkdtemp(), "oversell.db")}'
+    os.environ['THROTTLE_ENABLED'] = '0'
+    os.environ['BCRYPT_ROUNDS'] = '4'
+    os.environ.setdefault('RESERVATION_SWEEP_INTERVAL', '0')
+    os.environ.setdefault('ADMIN_METRICS_REFRESH_INTERVAL', '0')
+
+    import flask_migrate
+    from app import create_app
+    from models import Product, Seller, User, db
+    from seed import BASE, seed
+    from workload import HttpTransport, TestClientTransport, login
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app = create_app()
+    with app.app_context():
+        flask_migrate.upgrade()
+        if db.session.query(User.id).first() is not None:
+            sys.exit('Database already has users; use an empty database')
+    seed(app, max(0.05, args.buyers / BASE['buyers']))
+
+    with app.app_context():
+        product_id = db.session.query(Product.id).join(Seller).filter(Seller.status == 'approved').first()[0]
+        buyers = db.session.query(User.id, User.username).filter(User.role == 'buyer').order_by(User.username).limit(args.buyers).all()
+    tokens = {user_id: login(app, username) for user_id, username in buyers}
+
+    server = None
+    if args.mode == 'http':
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    transports = [HttpTransport(server.server_port) if server else TestClientTransport(app) for _ in tokens]
+
+    failed = 0
+    for number in range(1, args.rounds + 1):
+        statuses, sold, remaining, problems = run_round(app, transports, tokens, product_id, args.stock)
+        outcome = ', '.join(f'{count}x{status}' for status, count in sorted(statuses.items()))
+        print(f'round {number}: {len(tokens)} checkouts for {args.stock} units -> {outcome}; '
+              f'{sold} sold, {remaining} left')
+        for problem in problems:
+            print(f'  FAIL {problem}')
+        failed += bool(problems)
+
+    if server:
+        server.shutdown()
+    if failed:
+        sys.exit(1)
+    print('No oversell')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Compare two benchmarks/workload.py result files and flag regressions.
+
+An endpoint regresses when its p95 latency rises by more than --threshold
+percent (and at least --min-ms), its throughput falls by more than
+--threshold percent, or it runs more SQL statements per request. Timings
+of endpoints with fewer than --min-count requests in either run are too
+noisy to judge and only their statement counts are compared. Exits 1
+when anything regressed, so it can gate a CI job.
+
+    python benchmarks/compare.py /tmp/base.json /tmp/new.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+# Run settings that make two results incomparable when they differ
+COMPARABLE = ('mode', 'dialect', 'scale', 'concurrency', 'config')
+
+def change(old, new):
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+def fmt(pct):
+    return '' if pct is None else f'{pct:+.1f}%'
+
+def compare(base, new, threshold, min_ms, query_slack, min_count):
+    """Rows of (endpoint, cells, problems) for every endpoint in either run"""
+    rows = []
+    for name in sorted(set(base['endpoints']) | set(new['endpoints'])):
+        old, cur = base['endpoints'].get(name), new['endpoints'].get(name)
+        if old is None or cur is None:
+            rows.append((name, None, ['only in ' + ('new' if old is None else 'base')]))
+            continue
+        problems = []
+        timed = min(old['count'], cur['count']) >= min_count
+        p95 = change(old['p95_ms'], cur['p95_ms'])
+        if timed and p95 is not None and p95 > threshold and cur['p95_ms'] - old['p95_ms'] >= min_ms:
+            problems.append(f'p95 {old["p95_ms"]} -> {cur["p95_ms"]} ms')
+        rps = change(old['rps'], cur['rps'])
+        if timed and rps is not None and rps < -threshold:
+            problems.append(f'rps {old["rps"]} -> {cur["rps"]}')
+        if old['queries_mean'] is not None and cur['queries_mean'] is not None \
+                and cur['queries_mean'] > old['queries_mean'] + query_slack:
+            problems.append(f'queries {old["queries_mean"]} -> {cur["queries_mean"]}')
+        if cur['errors'] > old['errors']:
+            problems.append(f'errors {old["errors"]} -> {cur["errors"]}')
+        queries = None
+        if old['queries_mean'] is not None and cur['queries_mean'] is not None:
+            queries = f'{cur["queries_mean"] - old["queries_mean"]:+.2f}'
+        if not timed and not problems:
+            problems = None
+        rows.append((name, (fmt(p95), fmt(rps), queries or ''), problems))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10, help='Allowed p95/rps change in percent')
+    parser.add_argument('--min-ms', type=float, default=1, help='Ignore p95 increases smaller than this')
+    parser.add_argument('--min-count', type=int, default=50, help='Requests needed to judge an endpoint\'s timings')
+    parser.add_argument('--query-slack', type=float, default=0.5,
+                        help='Allowed rise in mean statements per request (cache hit ratios vary a little)')
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f'base {base["meta"].get("commit")} {base["meta"]["timestamp"]}')
+    print(f'new  {new["meta"].get("commit")} {new["meta"]["timestamp"]}')
+    for key in COMPARABLE:
+        if base['meta'].get(key) != new['meta'].get(key):
+            print(f'warning: {key} differs ({base["meta"].get(key)} vs {new["meta"].get(key)})')
+
+    regressions = 0
+    print(f'{"endpoint":<20}{"p95":>10}{"rps":>10}{"queries":>10}  verdict')
+    for name, cells, problems in compare(base, new, args.threshold, args.min_ms, args.query_slack, args.min_count):
+        if cells is None:
+            print(f'{name:<20}{"":>30}  {problems[0]}')
+            continue
+        p95, rps, queries = cells
+        if problems is None:
+            verdict = 'ok (few samples)'
+        else:
+            verdict = 'REGRESSION: ' + ', '.join(problems) if problems else 'ok'
+        regressions += bool(problems)
+        print(f'{name:<20}{p95:>10}{rps:>10}{queries:>10}  {verdict}')
+    total_p95 = change(base['totals']['p95_ms'], new['totals']['p95_ms'])
+    total_rps = change(base['totals']['rps'], new['totals']['rps'])
+    print(f'{"total":<20}{fmt(total_p95):>10}{fmt(total_rps):>10}')
+
+    if regressions:
+        print(f'{regressions} endpoint(s) regressed')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
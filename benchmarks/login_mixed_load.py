@@ -0,0 +1,161 @@
+"""Login throughput vs. catalog latency under mixed load.
+
+Starts the app on a fixed-size request thread pool (like a gthread worker),
+then runs login clients and catalog clients side by side, once with bcrypt
+inline on the request thread and once on the dedicated hashing pool.
+
+    python benchmarks/login_mixed_load.py --duration 10 --login-clients 16
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{os.path.join(_db_dir, "bench.db")}')
+os.environ.setdefault('CATALOG_CACHE_ENABLED', '0')
+os.environ.setdefault('THROTTLE_ENABLED', '0')
+
+import flask_migrate
+from werkzeug.serving import BaseWSGIServer
+from app import create_app
+from auth import hash_password
+from models import Product, Seller, User, db
+from passwords import password_hasher
+
+class PooledServer(BaseWSGIServer):
+    """WSGI server with a bounded request thread pool"""
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+def seed(app, rounds):
+    with app.app_context():
+        flask_migrate.upgrade()
+        password_hasher.rounds = rounds
+        user = User(username='bench', email='bench@example.com', password=hash_password('secret'), role='seller')
+        db.session.add(user)
+        db.session.flush()
+        seller = Seller(user_id=user.id, business_name='Bench', status='approved')
+        db.session.add(seller)
+        db.session.flush()
+        db.session.add_all(
+            Product(seller_id=seller.id, name=f'Product {i}', description='Bench product',
+                    price=10 + i % 50, stock=100, category=['paint', 'markers', 'apparel'][i % 3])
+            for i in range(500)
+        )
+        db.session.commit()
+
+def request(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def run_scenario(base, args):
+    stop = threading.Event()
+    logins = {'ok': 0, 'busy': 0, 'other': 0}
+    catalog = []
+    lock = threading.Lock()
+
+    def login_client():
+        while not stop.is_set():
+            status = request(f'{base}/api/auth/login', {'username': 'bench', 'password': 'secret'})
+            key = 'ok' if status == 200 else 'busy' if status == 503 else 'other'
+            with lock:
+                logins[key] += 1
+            if status == 503:
+                time.sleep(0.05)
+
+    def catalog_client(n):
+        page = n
+        while not stop.is_set():
+            started = time.perf_counter()
+            request(f'{base}/api/products/?page={page % 20 + 1}&per_page=20')
+            with lock:
+                catalog.append(time.perf_counter() - started)
+            page += 1
+
+    threads = [threading.Thread(target=login_client) for _ in range(args.login_clients)]
+    threads += [threading.Thread(target=catalog_client, args=(n,)) for n in range(args.catalog_clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'logins/s': round(logins['ok'] / args.duration, 1),
+        'login 503s': logins['busy'],
+        'login errors': logins['other'],
+        'catalog req/s': round(len(catalog) / args.duration, 1),
+        'catalog p50 ms': round(percentile(catalog, 50) * 1000, 1),
+        'catalog p95 ms': round(percentile(catalog, 95) * 1000, 1),
+        'catalog p99 ms': round(percentile(catalog, 99) * 1000, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--server-threads', type=int, default=8)
+    parser.add_argument('--login-clients', type=int, default=16)
+    parser.add_argument('--catalog-clients', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--hash-workers', type=int, default=2)
+    parser.add_argument('--queue-depth', type=int, default=4)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app = create_app()
+    seed(app, args.rounds)
+    server = PooledServer('127.0.0.1', 0, app, args.server_threads)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    scenarios = [
+        ('inline bcrypt', 0, 0),
+        (f'hash pool ({args.hash_workers} workers, queue {args.queue_depth})', args.hash_workers, args.queue_depth)
+    ]
+    for name, workers, depth in scenarios:
+        app.config.update(BCRYPT_ROUNDS=args.rounds, PASSWORD_HASH_WORKERS=workers, PASSWORD_HASH_QUEUE_DEPTH=depth)
+        password_hasher.init_app(app)
+        print(f'== {name}')
+        for key, value in run_scenario(base, args).items():
+            print(f'  {key:<16}{value}')
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""Check every API route against its declared SQL statement budget.
+
+Seeds a small synthetic marketplace (benchmarks/seed.py) into a fresh
+SQLite file with the catalog cache off, then calls every route in
+routes/*.py through its branches (cursor pages, embeds, error paths, a
+login that rehashes, a token without role claims, cold identity lookups)
+as the right role, under
+METRICS_QUERY_BUDGET_STRICT and METRICS_QUERY_BUDGET_REPORT. String bodies
+are sent as raw uploads. Requests over
+their route's @query_budget are refused and listed with their statements grouped by
+normalized SQL. Exits 1 when a request is over budget, a route declares no
+budget or a route was not exercised, so N+1 regressions fail CI.
+
+    python benchmarks/query_budgets.py
+    python benchmarks/query_budgets.py --scale 2 --verbose
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BLUEPRINTS = ('auth', 'products', 'orders', 'seller', 'admin')
+
+def steps(ids):
+    """(role, method, path, body[, status]) for the calls that take each
+    route through its branches, in an order where later calls can use what
+    earlier ones created. `status` is the expected error status of calls
+    that exercise an error branch; `{cursor}` is the last next_cursor seen"""
+    product, order, item = ids['product'], ids['order'], ids['cart_item']
+    catalog = 'sku,name,price,stock,category\n' + ''.join(f'BUDGET-{i},Budget marker {i},4.5,20,markers\n' for i in range(600))
+    return [
+        (None, 'POST', '/api/auth/register', {'username': 'budget_buyer', 'email': 'budget_buyer@bench.test',
+                                              'password': 'bench', 'role': 'buyer'}),
+        (None, 'POST', '/api/auth/register', {'username': 'budget_seller', 'email': 'budget_seller@bench.test',
+                                              'password': 'bench', 'role': 'seller', 'businessName': 'Budget Shop'}),
+        (None, 'POST', '/api/auth/register', {'username': 'budget_buyer', 'email': 'other@bench.test',
+                                              'password': 'bench', 'role': 'buyer'}, 400),
+        (None, 'POST', '/api/auth/login', {'username': 'buyer0', 'password': 'bench'}),
+        # Stored with another bcrypt cost, so this login rehashes
+        (None, 'POST', '/api/auth/login', {'username': ids['rehash_seller'], 'password': 'bench'}),
+        (None, 'POST', '/api/auth/login', {'username': ids['rehash_seller'], 'password': 'bench'}),
+        (None, 'POST', '/api/auth/login', {'username': 'buyer0', 'password': 'wrong'}, 401),
+        ('buyer', 'GET', '/api/auth/me', None),
+        ('seller', 'GET', '/api/auth/me', None),
+        ('buyer', 'PUT', '/api/auth/profile', {'phone': '555-0100', 'address': '2 Bench Street'}),
+
+        (None, 'GET', '/api/products/', None),
+        (None, 'GET', '/api/products/?search=neon&sort=relevance', None),
+        (None, 'GET', '/api/products/?search=neon&cursor=&count=exact', None),
+        (None, 'GET', '/api/products/?category=markers&sort=price_asc&cursor=&per_page=2', None),
+        (None, 'GET', '/api/products/?category=markers&sort=price_asc&cursor={cursor}&per_page=2&count=exact', None),
+        (None, 'GET', '/api/products/?sort=newest&fields=id,name&cursor=&count=exact', None),
+        (None, 'GET', f'/api/products/{product}', None),
+        (None, 'GET', f'/api/products/{product}?embed=&fields=id,name', None),
+        (None, 'GET', '/api/products/categories', None),
+        ('seller', 'POST', '/api/products/', {'name': 'Budget can', 'description': 'Checked', 'price': 9.5,
+                                              'stock': 10, 'category': 'spray paint'}),
+        ('seller', 'PUT', '/api/products/{created_product}', {'price': 11, 'stock': 12}),
+        ('seller', 'PUT', '/api/products/{created_product}', {'category': 'budget cans'}),
+        ('seller', 'PUT', '/api/products/{created_product}', {'stock': -1}, 409),
+        ('buyer', 'POST', f'/api/products/{product}/reviews', {'rating': 5, 'comment': 'Fine'}),
+        ('buyer', 'POST', f'/api/products/{product}/reviews', {'rating': 4, 'comment': 'Again'}, 400),
+        ('seller', 'DELETE', '/api/products/{created_product}', None),
+        ('seller', 'POST', '/api/products/import?format=csv', catalog),
+        ('seller', 'POST', '/api/products/import?format=csv', catalog),
+        ('seller', 'GET', f'/api/products/imports/{ids["product_import"]}', None),
+        ('seller', 'GET', f'/api/products/imports/{ids["stale_import"]}', None),
+        ('seller', 'POST', '/api/products/adjustments', {'operations': [
+            {'productId': product, 'stockDelta': 5, 'price': 8.5}, {'productId': product, 'stock': 1},
+            {'productId': order, 'stockDelta': -1}]}),
+
+        ('buyer', 'POST', '/api/orders/cart', {'productId': product, 'quantity': 1}),
+        ('buyer', 'POST', '/api/orders/cart', {'productId': product, 'quantity': 10 ** 9}, 400),
+        ('buyer', 'GET', '/api/orders/cart', None),
+        ('buyer', 'GET', '/api/orders/cart?embed=', None),
+        ('buyer', 'PUT', f'/api/orders/cart/{item}', {'quantity': 2}),
+        ('buyer', 'DELETE', f'/api/orders/cart/{item}', None),
+        ('buyer', 'POST', '/api/orders/cart', {'productId': product, 'quantity': 1}),
+        ('buyer', 'POST', '/api/orders/checkout', {'shippingAddress': '2 Bench Street', 'method': 'paypal'}),
+        ('buyer', 'POST', '/api/orders/checkout', {'shippingAddress': '2 Bench Street', 'method': 'paypal'}, 400),
+        ('buyer', 'GET', '/api/orders/', None),
+        ('buyer', 'GET', '/api/orders/?cursor=&per_page=1', None),
+        ('buyer', 'GET', '/api/orders/?cursor={cursor}&per_page=1&count=exact', None),
+        ('buyer', 'GET', '/api/orders/?items=summary&embed=items', None),
+        ('seller', 'GET', '/api/orders/?count=exact', None),
+        ('admin', 'GET', '/api/orders/?embed=&per_page=5', None),
+        ('buyer', 'GET', f'/api/orders/{order}', None),
+        ('seller', 'GET', f'/api/orders/{order}?embed=items', None),
+        ('seller', 'PUT', f'/api/orders/{order}/status', {'status': 'shipped', 'carrier': 'Bench Post',
+                                                           'trackingNumber': 'BP1'}),
+        ('admin', 'PUT', f'/api/orders/{order}/status', {'status': 'delivered'}),
+        ('admin', 'PUT', f'/api/orders/{order}/status', {'status': 'cancelled'}),
+
+        ('seller', 'GET', '/api/seller/dashboard', None),
+        ('seller', 'GET', '/api/seller/products', None),
+        ('seller', 'GET', '/api/seller/withdrawals', None),
+        ('seller', 'POST', '/api/seller/withdrawals', {'amount': 1, 'method': 'paypal'}),
+        ('seller', 'POST', '/api/seller/withdrawals', {'amount': 10 ** 9, 'method': 'paypal'}, 400),
+        ('seller', 'POST', '/api/seller/verification', {'documents': 'license.pdf'}),
+        ('seller', 'GET', '/api/seller/exports/orders?format=ndjson', None),
+        ('seller', 'GET', '/api/seller/exports/withdrawals', None),
+        ('seller', 'GET', '/api/seller/exports/products', None),
+
+        ('admin', 'GET', '/api/admin/dashboard', None),
+        ('legacy', 'GET', '/api/admin/dashboard?fresh=1&pending_limit=1', None),
+        ('admin', 'GET', '/api/admin/dashboard?pending_limit=1&sellers_cursor={cursor}', None),
+        ('admin', 'GET', '/api/admin/sellers', None),
+        ('legacy', 'GET', '/api/admin/sellers?cursor=&count=exact&per_page=1', None),
+        ('admin', 'PUT', '/api/admin/sellers/{pending_seller}/approve', None),
+        ('legacy', 'PUT', '/api/admin/sellers/{other_pending_seller}/reject', None),
+        ('admin', 'GET', '/api/admin/withdrawals', None),
+        ('legacy', 'GET', '/api/admin/withdrawals?cursor=&count=exact&status=pending', None),
+        ('legacy', 'PUT', '/api/admin/withdrawals/{pending_withdrawal}/process', {'transactionId': 'budget-1'}),
+        # Reversing a processed withdrawal also writes a ledger entry
+        ('legacy', 'PUT', '/api/admin/withdrawals/{processed_withdrawal}/reject', None),
+        ('admin', 'PUT', '/api/admin/withdrawals/{other_pending_withdrawal}/reject', None),
+        ('admin', 'GET', '/api/admin/users', None),
+        ('legacy', 'GET', '/api/admin/users?cursor=&count=exact&per_page=1&role=buyer', None),
+        ('admin', 'GET', '/api/admin/orders', None),
+        ('legacy', 'GET', '/api/admin/orders?category=recent&cursor=&count=exact&per_page=2', None),
+        ('legacy', 'GET', '/api/admin/orders?cursor={cursor}&per_page=2&embed=items', None),
+        ('admin', 'GET', '/api/admin/exports/orders?status=delivered', None),
+        ('admin', 'GET', '/api/admin/exports/withdrawals?format=ndjson', None),
+        ('legacy', 'GET', '/api/admin/exports/users?role=seller', None),
+        # Last: the background job queries while later requests would be counted
+        ('seller', 'POST', '/api/products/import?format=csv&async=1', catalog),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=0.5)
+    parser.add_argument('--verbose', action='store_true', help='Print the statements of every request')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "budgets.db")}'
+    os.environ['CATALOG_CACHE_ENABLED'] = '0'
+    os.environ['THROTTLE_ENABLED'] = '0'
+    os.environ['BCRYPT_ROUNDS'] = '4'
+    # Cold identity lookups on every request, the worst case
+    os.environ['IDENTITY_CACHE_TTL'] = '0'
+    os.environ['METRICS_ENABLED'] = '1'
+    os.environ['METRICS_QUERY_BUDGET_STRICT'] = '1'
+    os.environ['METRICS_QUERY_BUDGET_REPORT'] = '1'
+    os.environ['RESERVATION_SWEEP_INTERVAL'] = '0'
+    os.environ['ADMIN_METRICS_REFRESH_INTERVAL'] = '0'
+
+    import bcrypt
+    import flask_migrate
+    from datetime import datetime, timedelta
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    from models import CartItem, Order, Product, ProductImport, Seller, User, Withdrawal, db
+    from query_budget import budget_for, count_queries
+    from product_import import product_importer
+    from seed import PASSWORD, seed
+
+    logging.getLogger('metrics').setLevel(logging.ERROR)
+    app = create_app()
+    with app.app_context():
+        flask_migrate.upgrade()
+    seed(app, args.scale)
+    client = app.test_client()
+
+    def token(username):
+        return client.post('/api/auth/login', json={'username': username, 'password': PASSWORD}).get_json()['access_token']
+
+    with app.app_context():
+        seller = db.session.query(Seller).join(User).filter(Seller.status == 'approved').order_by(User.username).first()
+        seller_username = db.session.get(User, seller.user_id).username
+        buyer = User.query.filter_by(username='buyer0').one()
+        order = Order.query.filter_by(seller_id=seller.id, buyer_id=buyer.id).first() \
+            or Order.query.filter_by(seller_id=seller.id).first()
+        product = Product.query.filter_by(seller_id=seller.id).first()
+        item = CartItem(user_id=buyer.id, product_id=product.id, quantity=1)
+        # Background imports would query while later requests are counted;
+        # poll a finished one instead
+        job = ProductImport(seller_id=seller.id, format='csv', status='completed')
+        # A job whose worker died, failed by the poll
+        stale = ProductImport(seller_id=seller.id, format='csv', status='running',
+                              heartbeat_at=datetime.utcnow() - timedelta(days=1))
+        db.session.add_all([item, job, stale])
+        # Another approved seller whose hash has a different cost than
+        # BCRYPT_ROUNDS, so logging in rehashes it
+        rehash_seller = db.session.query(User).join(Seller).filter(
+            Seller.status == 'approved', User.id != seller.user_id).order_by(User.username).first()
+        rehash_seller.password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(5)).decode()
+        db.session.commit()
+        ids = {'product': str(product.id), 'order': str(order.id), 'cart_item': str(item.id),
+               'product_import': str(job.id), 'stale_import': str(stale.id),
+               'rehash_seller': rehash_seller.username}
+        buyer_of_order = db.session.get(User, order.buyer_id).username
+        # Tokens issued before role claims were added resolve the user by id
+        legacy = create_access_token(identity=User.query.filter_by(username='admin').one().id)
+
+    tokens = {'buyer': token(buyer_of_order), 'seller': token(seller_username), 'admin': token('admin'),
+              'legacy': legacy}
+    # The registration step adds a second pending seller for the reject call
+    plan = steps(ids)
+    adapter = app.url_map.bind('localhost')
+    seen, failures, cursor = set(), 0, ''
+    print(f'{"method":<7}{"path":<58}{"status":>7}{"queries":>9}{"budget":>8}')
+    for role, method, path, body, *expected in plan:
+        if '{' in path:
+            with app.app_context():
+                pending = [str(s.id) for s in Seller.query.filter_by(status='pending').order_by(Seller.created_at)]
+                withdrawals = [str(w.id) for w in Withdrawal.query.filter_by(status='pending').order_by(Withdrawal.created_at)]
+                processed = Withdrawal.query.filter_by(status='processed').order_by(Withdrawal.processed_at.desc()).first()
+                created = Product.query.filter_by(name='Budget can').first()
+            path = path.format(
+                created_product=created.id if created else 'missing', cursor=cursor,
+                processed_withdrawal=processed.id if processed else 'missing',
+                pending_seller=pending[0], other_pending_seller=pending[-1],
+                pending_withdrawal=withdrawals[0], other_pending_withdrawal=withdrawals[-1]
+            )
+        headers = {'Authorization': f'Bearer {tokens[role]}'} if role else {}
+        with app.app_context(), count_queries() as log:
+            body_args = {'data': body} if isinstance(body, str) else {'json': body}
+            response = client.open(path, method=method, headers=headers, **body_args)
+        queries = log.count
+        # Streamed exports run their query after the budget check; drain
+        # and close them so their contexts pop in order
+        response.get_data()
+        response.close()
+        endpoint, _ = adapter.match(path.split('?')[0], method=method)
+        seen.add(endpoint)
+        budget = budget_for(app.view_functions[endpoint])
+        payload = response.get_json(silent=True) or {}
+        if isinstance(payload, dict):
+            cursor = payload.get('next_cursor') or payload.get('pendingApprovals', {}).get('sellersNextCursor') or cursor
+        over = response.status_code == 500 and str(payload.get('message', '')).startswith('Query budget exceeded')
+        error = response.status_code >= 400 and response.status_code not in expected
+        flag = '  OVER BUDGET' if over else '  ERROR' if error else ''
+        print(f'{method:<7}{path[:57]:<58}{response.status_code:>7}{queries:>9}{budget if budget is not None else "-":>8}{flag}')
+        if over:
+            failures += 1
+            print('\n'.join(payload['statements'] or []))
+        elif error:
+            failures += 1
+            print(f'  {json.dumps(payload)}')
+        elif args.verbose:
+            print(log.report())
+
+    missing = []
+    for rule in app.url_map.iter_rules():
+        blueprint, _, view = rule.endpoint.partition('.')
+        if not view or blueprint not in BLUEPRINTS:
+            continue
+        if budget_for(app.view_functions[rule.endpoint]) is None:
+            missing.append(f'{rule.endpoint} declares no @query_budget')
+        if rule.endpoint not in seen:
+            missing.append(f'{rule.endpoint} was not exercised')
+    product_importer.shutdown()
+    for problem in missing:
+        print(problem)
+    if failures or missing:
+        sys.exit(1)
+    print('All routes within budget')
+
+if __name__ == '__main__':
+    main()
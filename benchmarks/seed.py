@@ -0,0 +1,190 @@
+"""Seed a synthetic marketplace for the load tests.
+
+Bulk-inserts buyers, approved and pending sellers, products across
+categories, orders with items, reviews and withdrawals, then rebuilds the
+seller balances from that history. Every account's password is "bench";
+usernames are buyer<n>, seller<n> and admin. The same --scale and --seed
+always produce the same data.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed.py --scale 2
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+from sqlalchemy import insert
+from ids import new_id
+from models import Order, OrderItem, Product, Review, Seller, User, Withdrawal, db
+import ledger
+
+PASSWORD = 'bench'
+CHUNK = 2000
+
+# Rows at --scale 1; everything grows linearly with the scale (products
+# through the seller count)
+BASE = {
+    'buyers': 200,
+    'sellers': 20,
+    'orders': 2000,
+    'reviews': 1000,
+    'withdrawals': 40,
+}
+PRODUCTS_PER_SELLER = 50
+PENDING_SELLERS = 0.2
+CATEGORIES = ['spray paint', 'markers', 'caps', 'stencils', 'apparel', 'canvas', 'prints', 'accessories']
+WORDS = ['neon', 'chrome', 'matte', 'urban', 'wildstyle', 'throwup', 'drip', 'fade', 'bold', 'street',
+         'classic', 'pastel', 'midnight', 'electric', 'burner', 'tag', 'piece', 'mural', 'outline', 'fill']
+ORDER_STATUSES = ['pending'] * 2 + ['processing'] * 2 + ['shipped', 'in_transit'] + ['delivered'] * 5 + ['cancelled']
+SEARCH_TERMS = WORDS[:10]
+
+def counts(scale):
+    return {key: max(1, int(round(value * scale))) for key, value in BASE.items()}
+
+def _bulk(model, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(insert(model), rows[start:start + CHUNK])
+
+def seed(app, scale=1.0, seed=42):
+    """Insert the marketplace into an empty, migrated database.
+
+    Returns the row counts per table.
+    """
+    rng = random.Random(seed)
+    n = counts(scale)
+    # One low-cost hash shared by every account; run the app with
+    # BCRYPT_ROUNDS=4 so logins do not rehash it
+    password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=4)).decode()
+    now = datetime.utcnow()
+
+    def past(days=180):
+        return now - timedelta(seconds=rng.randint(0, days * 86400))
+
+    with app.app_context():
+        users = [{'id': new_id(), 'username': 'admin', 'email': 'admin@bench.test', 'password': password,
+                  'role': 'admin', 'created_at': past()}]
+        buyers = [{'id': new_id(), 'username': f'buyer{i}', 'email': f'buyer{i}@bench.test', 'password': password,
+                   'role': 'buyer', 'address': f'{i} Bench Street', 'created_at': past()} for i in range(n['buyers'])]
+        seller_users = [{'id': new_id(), 'username': f'seller{i}', 'email': f'seller{i}@bench.test', 'password': password,
+                         'role': 'seller', 'created_at': past()} for i in range(n['sellers'])]
+        users += buyers + seller_users
+        _bulk(User, users)
+
+        # Sellers are numbered so the approved ones come first: seller0..
+        pending_from = n['sellers'] - int(n['sellers'] * PENDING_SELLERS)
+        sellers = []
+        for i, user in enumerate(seller_users):
+            approved = i < pending_from or n['sellers'] == 1
+            sellers.append({
+                'id': new_id(), 'user_id': user['id'], 'business_name': f'Bench Shop {i}',
+                'status': 'approved' if approved else 'pending',
+                'verified_at': past() if approved else None, 'created_at': user['created_at']
+            })
+        _bulk(Seller, sellers)
+        approved = [s for s in sellers if s['status'] == 'approved']
+
+        products = []
+        for seller in approved:
+            for _ in range(PRODUCTS_PER_SELLER):
+                category = rng.choice(CATEGORIES)
+                name = f'{rng.choice(WORDS).title()} {rng.choice(WORDS)} {category}'
+                products.append({
+                    'id': new_id(), 'seller_id': seller['id'], 'name': name,
+                    'description': ' '.join(rng.choice(WORDS) for _ in range(12)),
+                    'price': Decimal(rng.randint(300, 9000)) / 100,
+                    # Deep stock so checkouts never run a product out mid-run
+                    'stock': 10 ** 6, 'category': category, 'created_at': past()
+                })
+        _bulk(Product, products)
+        by_seller = {}
+        for product in products:
+            by_seller.setdefault(product['seller_id'], []).append(product)
+
+        orders, items = [], []
+        for _ in range(n['orders']):
+            buyer = rng.choice(buyers)
+            seller = rng.choice(approved)
+            lines = rng.sample(by_seller[seller['id']], min(rng.randint(1, 4), len(by_seller[seller['id']])))
+            order_id = new_id()
+            total = Decimal(0)
+            for product in lines:
+                quantity = rng.randint(1, 3)
+                total += product['price'] * quantity
+                items.append({'id': new_id(), 'order_id': order_id, 'product_id': product['id'],
+                              'quantity': quantity, 'price': product['price']})
+            status = rng.choice(ORDER_STATUSES)
+            orders.append({
+                'id': order_id, 'buyer_id': buyer['id'], 'seller_id': seller['id'], 'total_price': total,
+                'shipping_address': buyer['address'], 'method': rng.choice(['paypal', 'card']),
+                'status': status, 'created_at': past(),
+                'carrier': 'Bench Post' if status in ('shipped', 'in_transit', 'delivered') else None,
+            })
+        _bulk(Order, orders)
+        _bulk(OrderItem, items)
+
+        reviews, reviewed = [], set()
+        while len(reviews) < min(n['reviews'], len(buyers) * len(products)):
+            buyer, product = rng.choice(buyers), rng.choice(products)
+            if (buyer['id'], product['id']) in reviewed:
+                continue
+            reviewed.add((buyer['id'], product['id']))
+            reviews.append({'id': new_id(), 'user_id': buyer['id'], 'product_id': product['id'],
+                            'rating': rng.randint(1, 5), 'comment': ' '.join(rng.choice(WORDS) for _ in range(6)),
+                            'created_at': past()})
+        _bulk(Review, reviews)
+
+        withdrawals = []
+        for _ in range(n['withdrawals']):
+            amount = Decimal(rng.randint(1000, 20000)) / 100
+            status = rng.choice(['pending', 'processed', 'processed', 'rejected'])
+            created = past()
+            withdrawals.append({
+                'id': new_id(), 'seller_id': rng.choice(approved)['id'], 'amount_requested': amount,
+                'amount_paid': (amount * Decimal('0.93')).quantize(Decimal('0.01')),
+                'method': rng.choice(['paypal', 'bank']), 'status': status, 'created_at': created,
+                'processed_at': created + timedelta(days=1) if status == 'processed' else None,
+                'transaction_id': f'bench-{rng.getrandbits(32):08x}' if status == 'processed' else None,
+            })
+        _bulk(Withdrawal, withdrawals)
+        db.session.commit()
+
+        # Balances are maintained incrementally by the routes; derive them
+        # from the history inserted above
+        ledger.reconcile()
+
+    return {
+        'users': len(users), 'sellers': len(sellers), 'approved_sellers': len(approved),
+        'products': len(products), 'orders': len(orders), 'order_items': len(items),
+        'reviews': len(reviews), 'withdrawals': len(withdrawals)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ.setdefault('RESERVATION_SWEEP_INTERVAL', '0')
+    os.environ.setdefault('ADMIN_METRICS_REFRESH_INTERVAL', '0')
+    import flask_migrate
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        flask_migrate.upgrade()
+        if db.session.query(User.id).first() is not None:
+            sys.exit('Database already has users; seed an empty database')
+    started = time.perf_counter()
+    created = seed(app, args.scale, args.seed)
+    for table, count in created.items():
+        print(f'  {table:<18}{count}')
+    print(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+if __name__ == '__main__':
+    main()
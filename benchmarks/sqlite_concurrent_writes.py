@@ -0,0 +1,145 @@
+"""Concurrent order writes on SQLite with and without the sqlite-prod profile.
+
+Runs checkout-shaped write transactions (decrement stock, insert an order
+and its item) from several threads while other threads read the catalog,
+once per DB_PROFILE, each in a fresh process and database file, and
+reports committed writes per second, "database is locked" failures and
+write latency.
+
+    python benchmarks/sqlite_concurrent_writes.py --duration 10 --writers 8 --readers 4
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def run_profile(args):
+    """Benchmark body, run in a child process configured through the env"""
+    sys.path.insert(0, ROOT)
+    import flask_migrate
+    from sqlalchemy import update
+    from sqlalchemy.exc import OperationalError
+    from app import create_app
+    from models import Order, OrderItem, Product, Seller, User, db
+
+    app = create_app()
+    with app.app_context():
+        flask_migrate.upgrade()
+        user = User(username='bench', email='bench@example.com', password='x', role='seller')
+        db.session.add(user)
+        db.session.flush()
+        seller = Seller(user_id=user.id, business_name='Bench', status='approved')
+        db.session.add(seller)
+        db.session.flush()
+        products = [
+            Product(seller_id=seller.id, name=f'Product {i}', description='Bench product',
+                    price=10, stock=10 ** 6, category='paint')
+            for i in range(200)
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        product_ids = [product.id for product in products]
+        buyer_id, seller_id = user.id, seller.id
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {'commits': 0, 'locked': 0, 'reads': 0, 'latencies': []}
+
+    def writer(n):
+        rng = random.Random(n)
+        with app.app_context():
+            while not stop.is_set():
+                product_id = rng.choice(product_ids)
+                started = time.perf_counter()
+                try:
+                    db.session.execute(
+                        update(Product).where(Product.id == product_id, Product.stock > 0)
+                        .values(stock=Product.stock - 1)
+                    )
+                    order = Order(buyer_id=buyer_id, seller_id=seller_id, total_price=10,
+                                  shipping_address='Bench street 1', method='paypal')
+                    db.session.add(order)
+                    db.session.flush()
+                    db.session.add(OrderItem(order_id=order.id, product_id=product_id, quantity=1, price=10))
+                    db.session.commit()
+                    outcome = 'commits'
+                except OperationalError as e:
+                    db.session.rollback()
+                    if 'locked' not in str(e):
+                        raise
+                    outcome = 'locked'
+                with lock:
+                    results[outcome] += 1
+                    if outcome == 'commits':
+                        results['latencies'].append(time.perf_counter() - started)
+
+    def reader():
+        with app.app_context():
+            while not stop.is_set():
+                Product.query.join(Seller).filter(Seller.status == 'approved').order_by(Product.name).limit(20).all()
+                Order.query.filter_by(seller_id=seller_id).count()
+                db.session.rollback()
+                with lock:
+                    results['reads'] += 1
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies = results['latencies']
+    print(json.dumps({
+        'writes/s': round(results['commits'] / args.duration, 1),
+        'locked errors': results['locked'],
+        'reads/s': round(results['reads'] / args.duration, 1),
+        'write p50 ms': round(percentile(latencies, 50) * 1000, 1),
+        'write p99 ms': round(percentile(latencies, 99) * 1000, 1)
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--profiles', default='dev,sqlite-prod')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_profile(args)
+        return
+
+    for profile in args.profiles.split(','):
+        env = dict(
+            os.environ,
+            DB_PROFILE=profile,
+            DATABASE_URL=f'sqlite:///{os.path.join(tempfile.mkdtemp(), "bench.db")}',
+            RESERVATION_SWEEP_INTERVAL='0',
+            ADMIN_METRICS_REFRESH_INTERVAL='0'
+        )
+        command = [sys.executable, os.path.abspath(__file__), '--child',
+                   '--duration', str(args.duration), '--writers', str(args.writers), '--readers', str(args.readers)]
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        print(f'== {profile}')
+        for key, value in json.loads(output.strip().splitlines()[-1]).items():
+            print(f'  {key:<16}{value}')
+
+if __name__ == '__main__':
+    main()
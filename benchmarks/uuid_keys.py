@@ -0,0 +1,143 @@
+"""Insert rate and index size of order/order_item with text vs compact keys.
+
+Builds the two tables twice, once with the old String(36) uuid4 keys and
+once with CompactUUID UUIDv7 keys, bulk-inserts the same workload into
+each and reports rows per second and table/index sizes.
+
+    python benchmarks/uuid_keys.py --orders 50000
+    python benchmarks/uuid_keys.py --url postgresql://localhost/bench
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa
+from ids import CompactUUID, new_id
+
+def legacy_id():
+    return str(uuid.uuid4())
+
+def build_tables(metadata, key_type):
+    order = sa.Table(
+        'bench_order', metadata,
+        sa.Column('id', key_type, primary_key=True),
+        sa.Column('buyer_id', key_type, nullable=False),
+        sa.Column('seller_id', key_type, nullable=False),
+        sa.Column('total_price', sa.Numeric(10, 2), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('created_at', sa.DateTime, nullable=False),
+        sa.Index('ix_bench_order_buyer_id_created_at_id', 'buyer_id', 'created_at', 'id'),
+        sa.Index('ix_bench_order_seller_id_created_at_id', 'seller_id', 'created_at', 'id')
+    )
+    order_item = sa.Table(
+        'bench_order_item', metadata,
+        sa.Column('id', key_type, primary_key=True),
+        sa.Column('order_id', key_type, sa.ForeignKey('bench_order.id'), nullable=False),
+        sa.Column('product_id', key_type, nullable=False),
+        sa.Column('quantity', sa.Integer, nullable=False),
+        sa.Column('price', sa.Numeric(10, 2), nullable=False),
+        sa.Index('ix_bench_order_item_order_id', 'order_id'),
+        sa.Index('ix_bench_order_item_product_id', 'product_id')
+    )
+    return order, order_item
+
+def sizes(conn, tables):
+    """{table: (table bytes, index bytes)}"""
+    if conn.dialect.name == 'postgresql':
+        return {
+            table.name: tuple(conn.execute(sa.text(
+                'SELECT pg_table_size(CAST(:name AS regclass)), pg_indexes_size(CAST(:name AS regclass))'
+            ), {'name': table.name}).one())
+            for table in tables
+        }
+    if conn.dialect.name == 'sqlite':
+        pages = dict(conn.execute(sa.text('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')).all())
+        result = {}
+        for table in tables:
+            index_names = [index.name for index in table.indexes] + [
+                name for name in pages if name.startswith(f'sqlite_autoindex_{table.name}_')
+            ]
+            result[table.name] = (pages.get(table.name, 0), sum(pages.get(name, 0) for name in index_names))
+        return result
+    return {}
+
+def run(url, key_type, make_id, args):
+    engine = sa.create_engine(url)
+    metadata = sa.MetaData()
+    order, order_item = build_tables(metadata, key_type)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    rng = random.Random(42)
+    buyers = [make_id() for _ in range(1000)]
+    sellers = [make_id() for _ in range(100)]
+    products = [make_id() for _ in range(5000)]
+    started_at = datetime.utcnow()
+
+    elapsed = 0.0
+    for batch_start in range(0, args.orders, args.batch):
+        orders, items = [], []
+        for n in range(batch_start, min(batch_start + args.batch, args.orders)):
+            order_id = make_id()
+            orders.append({
+                'id': order_id,
+                'buyer_id': rng.choice(buyers),
+                'seller_id': rng.choice(sellers),
+                'total_price': Decimal('19.99'),
+                'status': 'pending',
+                'created_at': started_at + timedelta(milliseconds=n)
+            })
+            for _ in range(args.items):
+                items.append({
+                    'id': make_id(),
+                    'order_id': order_id,
+                    'product_id': rng.choice(products),
+                    'quantity': 1,
+                    'price': Decimal('6.66')
+                })
+        clock = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(order.insert(), orders)
+            conn.execute(order_item.insert(), items)
+        elapsed += time.perf_counter() - clock
+
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn.execute(sa.text('ANALYZE'))
+        measured = sizes(conn, [order, order_item])
+    metadata.drop_all(engine)
+    engine.dispose()
+    rows = args.orders * (1 + args.items)
+    return rows / elapsed, measured
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='database URL (default: a temporary SQLite file)')
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--items', type=int, default=3, help='items per order')
+    parser.add_argument('--batch', type=int, default=1000, help='orders per transaction')
+    args = parser.parse_args()
+
+    url = args.url or f'sqlite:///{os.path.join(tempfile.mkdtemp(), "keys.db")}'
+    variants = [
+        ('String(36) uuid4', sa.String(36), legacy_id),
+        ('CompactUUID uuid7', CompactUUID(), new_id)
+    ]
+    for name, key_type, make_id in variants:
+        rate, measured = run(url, key_type, make_id, args)
+        print(f'== {name}')
+        print(f'  {"rows/s":<30}{rate:,.0f}')
+        for table, (table_bytes, index_bytes) in measured.items():
+            print(f'  {table + " table MiB":<30}{table_bytes / 2 ** 20:.1f}')
+            print(f'  {table + " index MiB":<30}{index_bytes / 2 ** 20:.1f}')
+
+if __name__ == '__main__':
+    main()
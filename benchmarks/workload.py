@@ -0,0 +1,401 @@
+"""Mixed-workload load test with per-endpoint latency and query counts.
+
+Seeds a synthetic marketplace (benchmarks/seed.py) into a fresh SQLite file,
+or the empty database at --url, logs in buyers, sellers and the admin, then
+runs --concurrency clients for --duration seconds. Each client picks
+scenarios from MIX by weight: catalog browsing and search, cart and
+checkout, order history, seller and admin dashboards. Requests go through
+the Flask test client (--mode client) or a local threaded HTTP server
+(--mode http). Statement counts and DB time come from the Server-Timing
+header, so the numbers are the app's own.
+
+Results are printed and, with --out, written as JSON for
+benchmarks/compare.py.
+
+    python benchmarks/workload.py --scale 1 --duration 20 --out /tmp/base.json
+    python benchmarks/workload.py --mode http --url postgresql://localhost/bench --out /tmp/pg.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def parse_server_timing(header):
+    """(statements, db ms) from 'db;dur=1.2;desc="3 queries", app;dur=4.5'"""
+    queries, db_ms = None, None
+    for metric in (header or '').split(','):
+        parts = [part.strip() for part in metric.split(';')]
+        if parts[0] != 'db':
+            continue
+        for part in parts[1:]:
+            if part.startswith('dur='):
+                db_ms = float(part[4:])
+            elif part.startswith('desc='):
+                queries = int(part[5:].strip('"').split()[0])
+    return queries, db_ms
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers, body):
+        response = self.client.open(path, method=method, headers=headers, data=body)
+        return response.status_code, response.headers.get('Server-Timing'), response.get_data()
+
+class HttpTransport:
+    """One keep-alive connection per client thread"""
+
+    def __init__(self, port):
+        self.port = port
+        self.connection = None
+
+    def request(self, method, path, headers, body):
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                return response.status, response.getheader('Server-Timing'), response.read()
+            except (http.client.HTTPException, ConnectionError):
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+class Client:
+    """A simulated user; every request is recorded under a scenario name"""
+
+    def __init__(self, transport, recorder, rng, data, buyer_token):
+        self.transport = transport
+        self.recorder = recorder
+        self.rng = rng
+        self.data = data
+        self.buyer = buyer_token
+
+    def call(self, name, method, path, token=None, body=None):
+        headers = {}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps(body).encode()
+        started = time.perf_counter()
+        status, timing, payload = self.transport.request(method, path, headers, body)
+        elapsed = time.perf_counter() - started
+        self.recorder.record(name, elapsed, status, *parse_server_timing(timing))
+        return status, payload
+
+    def seller(self):
+        return self.rng.choice(self.data['sellers'])
+
+    def product(self):
+        return self.rng.choice(self.data['products'])
+
+# Scenarios: one user action each, possibly several requests
+
+def catalog_list(c):
+    c.call('catalog.list', 'GET', f'/api/products/?page={c.rng.randint(1, 10)}&per_page=20')
+
+def catalog_filter(c):
+    category = c.rng.choice(c.data['categories'])
+    sort = c.rng.choice(['price_asc', 'price_desc', 'newest', 'name'])
+    c.call('catalog.filter', 'GET', f'/api/products/?category={category.replace(" ", "+")}&sort={sort}')
+
+def catalog_search(c):
+    c.call('catalog.search', 'GET', f'/api/products/?search={c.rng.choice(c.data["search_terms"])}')
+
+def catalog_detail(c):
+    c.call('catalog.detail', 'GET', f'/api/products/{c.product()}')
+
+def catalog_categories(c):
+    c.call('catalog.categories', 'GET', '/api/products/categories')
+
+def cart(c):
+    c.call('cart.add', 'POST', '/api/orders/cart', c.buyer, {'productId': c.product(), 'quantity': 1})
+    status, payload = c.call('cart.get', 'GET', '/api/orders/cart', c.buyer)
+    if status == 200:
+        for item in json.loads(payload)['items']:
+            c.call('cart.remove', 'DELETE', f'/api/orders/cart/{item["id"]}', c.buyer)
+
+def checkout(c):
+    # One seller's products, so each checkout creates a single order
+    for product in c.rng.sample(c.data['products_by_seller'][c.rng.choice(list(c.data['products_by_seller']))], 2):
+        c.call('cart.add', 'POST', '/api/orders/cart', c.buyer, {'productId': product, 'quantity': c.rng.randint(1, 3)})
+    c.call('orders.checkout', 'POST', '/api/orders/checkout', c.buyer,
+           {'shippingAddress': '1 Bench Street', 'method': 'paypal'})
+
+def order_history(c):
+    status, payload = c.call('orders.list', 'GET', '/api/orders/?cursor=', c.buyer)
+    orders = json.loads(payload)['orders'] if status == 200 else []
+    if orders:
+        c.call('orders.detail', 'GET', f'/api/orders/{c.rng.choice(orders)["id"]}', c.buyer)
+
+def me(c):
+    c.call('auth.me', 'GET', '/api/auth/me', c.buyer)
+
+def seller_dashboard(c):
+    c.call('seller.dashboard', 'GET', '/api/seller/dashboard', c.seller())
+
+def seller_products(c):
+    c.call('seller.products', 'GET', '/api/seller/products', c.seller())
+
+def seller_withdrawals(c):
+    c.call('seller.withdrawals', 'GET', '/api/seller/withdrawals', c.seller())
+
+def admin_dashboard(c):
+    c.call('admin.dashboard', 'GET', '/api/admin/dashboard', c.data['admin'])
+
+def admin_orders(c):
+    c.call('admin.orders', 'GET', f'/api/admin/orders?page={c.rng.randint(1, 5)}', c.data['admin'])
+
+def admin_users(c):
+    c.call('admin.users', 'GET', '/api/admin/users', c.data['admin'])
+
+def admin_sellers(c):
+    c.call('admin.sellers', 'GET', '/api/admin/sellers', c.data['admin'])
+
+def admin_withdrawals(c):
+    c.call('admin.withdrawals', 'GET', '/api/admin/withdrawals', c.data['admin'])
+
+# Relative weights; roughly a browsing-heavy storefront
+MIX = [
+    (catalog_list, 25),
+    (catalog_filter, 8),
+    (catalog_search, 8),
+    (catalog_detail, 15),
+    (catalog_categories, 5),
+    (cart, 6),
+    (checkout, 4),
+    (order_history, 6),
+    (me, 3),
+    (seller_dashboard, 4),
+    (seller_products, 3),
+    (seller_withdrawals, 2),
+    (admin_dashboard, 2),
+    (admin_orders, 2),
+    (admin_users, 1),
+    (admin_sellers, 1),
+    (admin_withdrawals, 1),
+]
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.enabled = False
+        self.lock = threading.Lock()
+
+    def record(self, name, elapsed, status, queries, db_ms):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.samples.setdefault(name, []).append((elapsed, status, queries, db_ms))
+
+    def summary(self, duration):
+        endpoints = {}
+        everything = []
+        for name, samples in sorted(self.samples.items()):
+            latencies = [s[0] for s in samples]
+            queries = [s[2] for s in samples if s[2] is not None]
+            db_ms = [s[3] for s in samples if s[3] is not None]
+            statuses = {}
+            for s in samples:
+                statuses[str(s[1])] = statuses.get(str(s[1]), 0) + 1
+            everything += latencies
+            endpoints[name] = {
+                'count': len(samples),
+                'rps': round(len(samples) / duration, 2),
+                'errors': sum(1 for s in samples if s[1] >= 400),
+                'statuses': statuses,
+                'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+                'queries_max': max(queries) if queries else None,
+                'db_ms_mean': round(sum(db_ms) / len(db_ms), 2) if db_ms else None,
+            }
+        totals = {
+            'requests': len(everything),
+            'rps': round(len(everything) / duration, 2),
+            'errors': sum(e['errors'] for e in endpoints.values()),
+            'p50_ms': round(percentile(everything, 50) * 1000, 2),
+            'p95_ms': round(percentile(everything, 95) * 1000, 2),
+            'p99_ms': round(percentile(everything, 99) * 1000, 2),
+        }
+        return totals, endpoints
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def login(app, username):
+    from seed import PASSWORD
+    response = app.test_client().post('/api/auth/login', json={'username': username, 'password': PASSWORD})
+    if response.status_code != 200:
+        sys.exit(f'Login as {username} failed: {response.status_code} {response.get_data(as_text=True)}')
+    return response.get_json()['access_token']
+
+def load_data(app, concurrency):
+    """Ids and tokens the scenarios draw from"""
+    from models import Product, Seller, User, db
+    from seed import SEARCH_TERMS
+    with app.app_context():
+        rows = db.session.query(Product.id, Product.seller_id).join(Seller).filter(Seller.status == 'approved').all()
+        categories = sorted({c for (c,) in db.session.query(Product.category).distinct()})
+        seller_names = [name for (name,) in db.session.query(User.username).join(
+            Seller, Seller.user_id == User.id).filter(Seller.status == 'approved').order_by(User.username).limit(5)]
+    products_by_seller = {}
+    for product_id, seller_id in rows:
+        products_by_seller.setdefault(str(seller_id), []).append(str(product_id))
+    return {
+        'products': [str(product_id) for product_id, _ in rows],
+        'products_by_seller': {k: v for k, v in products_by_seller.items() if len(v) >= 2},
+        'categories': categories,
+        'search_terms': SEARCH_TERMS,
+        'sellers': [login(app, name) for name in seller_names],
+        'admin': login(app, 'admin'),
+        'buyers': [login(app, f'buyer{i}') for i in range(concurrency)],
+    }
+
+def run(args):
+    database_dir = None
+    if not args.url:
+        database_dir = tempfile.mkdtemp()
+        args.url = f'sqlite:///{os.path.join(database_dir, "bench.db")}'
+    os.environ['DATABASE_URL'] = args.url
+    os.environ['METRICS_ENABLED'] = '1'
+    os.environ['METRICS_SERVER_TIMING'] = '1'
+    os.environ['THROTTLE_ENABLED'] = '0'
+    # The seeded hashes are cost 4; matching it keeps logins from rehashing
+    os.environ['BCRYPT_ROUNDS'] = '4'
+    os.environ.setdefault('RESERVATION_SWEEP_INTERVAL', '0')
+    os.environ.setdefault('ADMIN_METRICS_REFRESH_INTERVAL', '0')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import flask_migrate
+    from app import create_app
+    from models import User, db
+    from seed import counts, seed
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app = create_app()
+    with app.app_context():
+        flask_migrate.upgrade()
+        seeded = db.session.query(User.id).first() is not None
+        dialect = db.engine.dialect.name
+    if seeded and not args.reuse:
+        sys.exit('Database already has users; pass --reuse to run against it as is')
+    if not seeded:
+        started = time.perf_counter()
+        created = seed(app, args.scale, args.seed)
+        print(f'Seeded {created["products"]} products, {created["orders"]} orders in {time.perf_counter() - started:.1f}s')
+
+    if args.concurrency > counts(args.scale)['buyers']:
+        sys.exit('--concurrency exceeds the seeded buyer count; raise --scale')
+    data = load_data(app, args.concurrency)
+
+    server = None
+    if args.mode == 'http':
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    scenarios, weights = zip(*MIX)
+    recorder = Recorder()
+    stop = threading.Event()
+
+    def client(n):
+        transport = HttpTransport(server.server_port) if server else TestClientTransport(app)
+        c = Client(transport, recorder, random.Random(args.seed * 1000 + n), data, data['buyers'][n])
+        while not stop.is_set():
+            c.rng.choices(scenarios, weights)[0](c)
+
+    threads = [threading.Thread(target=client, args=(n,), daemon=True) for n in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    recorder.enabled = True
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    recorder.enabled = False
+    measured = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if server:
+        server.shutdown()
+
+    totals, endpoints = recorder.summary(measured)
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'commit': git_commit(),
+            'mode': args.mode,
+            'dialect': dialect,
+            'scale': args.scale,
+            'seed': args.seed,
+            'reused_data': seeded,
+            'concurrency': args.concurrency,
+            'duration': round(measured, 2),
+            'python': platform.python_version(),
+            'config': {key: app.config.get(key) for key in ('DB_PROFILE', 'CATALOG_CACHE_ENABLED', 'FAST_JSON')},
+        },
+        'totals': totals,
+        'endpoints': endpoints,
+    }
+
+def print_report(result):
+    meta, totals = result['meta'], result['totals']
+    print(f'== {meta["mode"]} / {meta["dialect"]}, scale {meta["scale"]}, {meta["concurrency"]} clients, {meta["duration"]}s')
+    print(f'{"endpoint":<20}{"count":>7}{"rps":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}{"db ms":>8}{"errors":>8}')
+    for name, e in result['endpoints'].items():
+        queries = '' if e['queries_mean'] is None else e['queries_mean']
+        db_ms = '' if e['db_ms_mean'] is None else e['db_ms_mean']
+        print(f'{name:<20}{e["count"]:>7}{e["rps"]:>9}{e["p50_ms"]:>9}{e["p95_ms"]:>9}{e["p99_ms"]:>9}{queries:>9}{db_ms:>8}{e["errors"]:>8}')
+    print(f'{"total":<20}{totals["requests"]:>7}{totals["rps"]:>9}{totals["p50_ms"]:>9}{totals["p95_ms"]:>9}{totals["p99_ms"]:>9}{"":>9}{"":>8}{totals["errors"]:>8}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['client', 'http'], default='client')
+    parser.add_argument('--url', help='Empty database to seed (default: a new SQLite file)')
+    parser.add_argument('--reuse', action='store_true', help='Run against an already seeded --url')
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--out', help='Write the results as JSON')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+        print(f'Results written to {args.out}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+from werkzeug.utils import import_string
+from replicas import replicas
+
+# Entries are never deleted on writes. Each entry's key embeds the current
+# version of every tag it depends on, so bumping a tag version makes exactly
+# the affected entries unreachable and the backend ages them out.
+
+class CacheBackend:
+    """Storage interface for ResponseCache.
+
+    Values are bytes. Tag versions must survive entry eviction, otherwise a
+    version could reset and resurrect stale entries.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def get_versions(self, tags):
+        raise NotImplementedError
+
+    def bump_versions(self, tags):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def size(self):
+        return None
+
+class LRUBackend(CacheBackend):
+    """In-process LRU bounded by entry count and total bytes"""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at)
+            self._bytes += len(value)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def get_versions(self, tags):
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump_versions(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size(self):
+        return {'entries': len(self._entries), 'bytes': self._bytes, 'evictions': self.evictions}
+
+class RedisBackend(CacheBackend):
+    """Shared backend for multi-process deployments (requires `redis`)"""
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='catalog:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def get_versions(self, tags):
+        if not tags:
+            return []
+        values = self.client.mget([f'{self.prefix}v:{tag}' for tag in tags])
+        return [int(v) if v else 0 for v in values]
+
+    def bump_versions(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(f'{self.prefix}v:{tag}')
+        pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+class ResponseCache:
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        self.ttl = None
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CATALOG_CACHE_ENABLED', True)
+        self.ttl = app.config.get('CATALOG_CACHE_TTL', 300)
+        backend = app.config.get('CATALOG_CACHE_BACKEND', 'memory')
+        options = app.config.get('CATALOG_CACHE_OPTIONS', {})
+        if backend == 'memory':
+            self.backend = LRUBackend(
+                max_entries=app.config.get('CATALOG_CACHE_MAX_ENTRIES', 1024),
+                max_bytes=app.config.get('CATALOG_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+            )
+        elif backend == 'redis':
+            self.backend = RedisBackend(**options)
+        else:
+            self.backend = import_string(backend)(**options)
+        app.extensions['catalog_cache'] = self
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hitRatio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['backend'] = self.backend.size() if self.backend else None
+        return stats
+
+    def cached(self, tags, defaults=None, keep_blank=()):
+        """Cache a view's 200 JSON responses keyed on normalized query args.
+
+        `tags` receives the normalized args and returns the tags the entry
+        depends on; `defaults` fills missing args so equivalent URLs share
+        an entry.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or self.backend is None:
+                    return view(*args, **kwargs)
+
+                params = dict(defaults or {})
+                for name, value in request.args.items():
+                    if value != '' or name in keep_blank:
+                        params[name] = value
+                entry_tags = sorted(tags(params))
+                versions = self.backend.get_versions(entry_tags)
+                key = '|'.join([
+                    request.endpoint,
+                    '&'.join(f'{k}={v}' for k, v in sorted(params.items())),
+                    ','.join(f'{t}@{v}' for t, v in zip(entry_tags, versions))
+                ])
+
+                body = self.backend.get(key)
+                if body is not None:
+                    self._count('hits')
+                    response = current_app.response_class(body, status=200, mimetype='application/json')
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self._count('misses')
+                # Fill shared entries from the primary: a lagging replica
+                # would re-cache data a write has just invalidated
+                with replicas.primary():
+                    response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    self.backend.set(key, response.get_data(), self.ttl)
+                    self._count('stores')
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def get_or_set(self, key, tags, compute, ttl=None):
+        """Cache a JSON-serializable value under key, dependent on tags"""
+        if not self.enabled or self.backend is None:
+            return compute()
+        tags = sorted(tags)
+        versions = self.backend.get_versions(tags)
+        full_key = '|'.join(['value', key, ','.join(f'{t}@{v}' for t, v in zip(tags, versions))])
+        cached = self.backend.get(full_key)
+        if cached is not None:
+            self._count('hits')
+            return json.loads(cached)
+        self._count('misses')
+        with replicas.primary():
+            value = compute()
+        self.backend.set(full_key, json.dumps(value).encode('utf-8'), ttl or self.ttl)
+        self._count('stores')
+        return value
+
+    def invalidate(self, *tags):
+        """Make every entry depending on any of `tags` unreachable"""
+        tags = sorted(set(tags))
+        if tags and self.backend is not None:
+            self.backend.bump_versions(tags)
+            self._count('invalidations', len(tags))
+
+    def invalidate_categories(self, categories):
+        """Evict product listings that could contain products in `categories`"""
+        self.invalidate('category:*', *(f'category:{c}' for c in categories))
+
+    def invalidate_category_list(self):
+        self.invalidate('categories')
+
+catalog_cache = ResponseCache()
+
+def product_list_tags(params):
+    """A category-filtered listing only depends on that category"""
+    category = params.get('category')
+    return [f'category:{category}' if category else 'category:*']
@@ -191,8 +191,8 @@ class ApiClient {
     });
   }
 
-  async getOrders(): Promise<{ orders: any[] }> {
-    return this.request('/orders');
+  async getOrders(cursor = ''): Promise<{ orders: any[]; next_cursor: string | null; summary?: any }> {
+    return this.request(`/orders?cursor=${encodeURIComponent(cursor)}`);
   }
 
   async getOrder(id: string): Promise<any> {
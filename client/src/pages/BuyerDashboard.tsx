@@ -44,7 +44,9 @@ export default function BuyerDashboard() {
     );
   }
 
+  // First page of order history; the stats come from its server-side summary
   const orders = ordersData?.orders || [];
+  const orderSummary = ordersData?.summary;
   const cartItems = cartData?.items || [];
 
   const getStatusIcon = (status: string) => {
@@ -103,7 +105,7 @@ export default function BuyerDashboard() {
                 <div className="ml-4">
                   <p className="text-sm font-medium text-gray-600">Total Orders</p>
                   <p className="text-2xl font-bold text-gray-900" data-testid="text-total-orders">
-                    {orders.length}
+                    {orderSummary?.count ?? 0}
                   </p>
                 </div>
               </div>
@@ -131,7 +133,7 @@ export default function BuyerDashboard() {
                 <div className="ml-4">
                   <p className="text-sm font-medium text-gray-600">Delivered</p>
                   <p className="text-2xl font-bold text-gray-900" data-testid="text-delivered-orders">
-                    {orders.filter(order => order.status === 'delivered').length}
+                    {orderSummary?.statuses?.delivered ?? 0}
                   </p>
                 </div>
               </div>
@@ -314,7 +316,7 @@ export default function BuyerDashboard() {
                   <div className="flex justify-between">
                     <span className="text-gray-600">Total Spent</span>
                     <span className="font-medium text-graffiti-orange" data-testid="text-total-spent">
-                      ${orders.reduce((sum, order) => sum + parseFloat(order.totalPrice), 0).toFixed(2)}
+                      ${(orderSummary?.totalPrice ?? 0).toFixed(2)}
                     </span>
                   </div>
                   <div className="flex justify-between">
@@ -1,5 +1,5 @@
 import { useState } from "react";
-import { useQuery, useMutation } from "@tanstack/react-query";
+import { useQuery, useInfiniteQuery, useMutation } from "@tanstack/react-query";
 import { useAuth } from "@/hooks/useAuth";
 import { api } from "@/lib/api";
 import { Button } from "@/components/ui/button";
@@ -74,8 +74,18 @@ export default function SellerDashboard() {
     enabled: isAuthenticated && user?.role === 'seller',
   });
 
-  const { data: ordersData, isLoading: ordersLoading } = useQuery({
-    queryKey: ['/api/orders'],
+  // Order history is paged; "Load more" follows next_cursor
+  const {
+    data: ordersData,
+    isLoading: ordersLoading,
+    fetchNextPage: fetchMoreOrders,
+    hasNextPage: hasMoreOrders,
+    isFetchingNextPage: loadingMoreOrders,
+  } = useInfiniteQuery({
+    queryKey: ['/api/orders', 'pages'],
+    queryFn: ({ pageParam }) => api.getOrders(pageParam),
+    initialPageParam: '',
+    getNextPageParam: (lastPage) => lastPage.next_cursor || undefined,
     enabled: isAuthenticated && user?.role === 'seller',
   });
 
@@ -221,7 +231,7 @@ export default function SellerDashboard() {
 
   const dashboard = dashboardData;
   const products = productsData?.products || [];
-  const orders = ordersData?.orders || [];
+  const orders = ordersData?.pages.flatMap((page) => page.orders) || [];
   const withdrawals = withdrawalsData?.withdrawals || [];
 
   const handleProductSubmit = async (data: ProductForm) => {
@@ -742,6 +752,18 @@ export default function SellerDashboard() {
                         </div>
                       </div>
                     ))}
+                    {hasMoreOrders && (
+                      <div className="text-center">
+                        <Button
+                          variant="outline"
+                          onClick={() => fetchMoreOrders()}
+                          disabled={loadingMoreOrders}
+                          data-testid="button-load-more-orders"
+                        >
+                          {loadingMoreOrders ? 'Loading...' : 'Load more'}
+                        </Button>
+                      </div>
+                    )}
                   </div>
                 )}
               </CardContent>
@@ -1,5 +1,6 @@
 import os
 from datetime import timedelta
+from db_profiles import get_profile
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-here'
@@ -8,8 +9,109 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///proace_shopping.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Database tuning profile: 'dev' (SQLAlchemy defaults), 'sqlite-prod' or
+    # 'postgres-prod'; see db_profiles.py for the pool options and PRAGMAs
+    DB_PROFILE = os.environ.get('DB_PROFILE', 'dev')
+    SQLALCHEMY_ENGINE_OPTIONS = dict(get_profile(DB_PROFILE)['engine_options'])
+    SQLITE_PRAGMAS = dict(get_profile(DB_PROFILE)['sqlite_pragmas'])
+
+    # Read replicas (comma-separated URLs), bound as replica_0, replica_1, ...
+    # Read-only routes use a replica lagging at most REPLICA_MAX_LAG seconds;
+    # a client that wrote sticks to the primary for REPLICA_STICKY_SECONDS.
+    # REPLICA_LAG_QUERY overrides the per-dialect lag probe (SQL returning seconds)
+    READ_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    SQLALCHEMY_BINDS = {f'replica_{i}': url for i, url in enumerate(READ_REPLICA_URLS)}
+    READ_REPLICAS_ENABLED = os.environ.get('READ_REPLICAS_ENABLED', '1') == '1'
+    REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+    REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 2))
+    REPLICA_LAG_QUERY = os.environ.get('REPLICA_LAG_QUERY')
+
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
 
+    # Catalog response cache ('memory', 'redis' or a dotted backend class path)
+    CATALOG_CACHE_ENABLED = os.environ.get('CATALOG_CACHE_ENABLED', '1') == '1'
+    CATALOG_CACHE_BACKEND = os.environ.get('CATALOG_CACHE_BACKEND', 'memory')
+    CATALOG_CACHE_OPTIONS = {'url': os.environ['REDIS_URL']} if os.environ.get('REDIS_URL') else {}
+    CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', 1024))
+    CATALOG_CACHE_MAX_BYTES = int(os.environ.get('CATALOG_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+
+    # Cart stock holds: lifetime and background sweep interval in seconds
+    RESERVATION_TTL = int(os.environ.get('RESERVATION_TTL', 900))
+    RESERVATION_SWEEP_INTERVAL = int(os.environ.get('RESERVATION_SWEEP_INTERVAL', 60))
+
+    # Admin dashboard metrics snapshot refresh interval in seconds
+    ADMIN_METRICS_REFRESH_INTERVAL = int(os.environ.get('ADMIN_METRICS_REFRESH_INTERVAL', 60))
+    # Upper bound on how stale the admin order category counters may get
+    ORDER_COUNTS_TTL = int(os.environ.get('ORDER_COUNTS_TTL', 60))
+
+    # How long a seller's resolved identity (role, seller id/status) is cached
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 30))
+
+    # bcrypt cost for new hashes; logins rehash stored hashes with a different cost
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    # Dedicated hashing pool size (0 hashes inline) and how many hashes may queue
+    # behind it before logins and registrations get a 503
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+    PASSWORD_HASH_QUEUE_DEPTH = int(os.environ.get('PASSWORD_HASH_QUEUE_DEPTH', 16))
+
+    # Token bucket throttling ('memory', 'redis' or a dotted backend class path).
+    # THROTTLE_LIMITS overrides per-scope rates, e.g. {'login-ip': '60/minute'}
+    THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', '1') == '1'
+    THROTTLE_BACKEND = os.environ.get('THROTTLE_BACKEND', 'memory')
+    THROTTLE_OPTIONS = {'url': os.environ['REDIS_URL']} if os.environ.get('REDIS_URL') else {}
+    THROTTLE_MAX_BUCKETS = int(os.environ.get('THROTTLE_MAX_BUCKETS', 100000))
+    THROTTLE_LIMITS = {}
+    # Reverse proxies in front of the app (the Node/Vite server, nginx, a
+    # load balancer). Per-IP limits key on the client address, which behind
+    # a proxy is the proxy's own; with N > 0 the address is taken from the
+    # N-th X-Forwarded-For entry from the right (werkzeug ProxyFix). Leave 0
+    # when clients reach the app directly, or they can spoof the header
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+
+    # Encode JSON with orjson when it is installed (same output as the default encoder)
+    FAST_JSON = os.environ.get('FAST_JSON', '1') == '1'
+
+    # Per-request latency, SQL count/time and size metrics at /api/metrics;
+    # requests running more statements than their route's @query_budget (or
+    # METRICS_QUERY_BUDGET for routes without one, 0 for no limit) are logged.
+    # METRICS_SERVER_TIMING adds a Server-Timing header with the DB and app time
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_QUERY_BUDGET = int(os.environ.get('METRICS_QUERY_BUDGET', 25))
+    # STRICT (tests, CI) refuses a request's first statement over budget with
+    # a 500, rolling back its open transaction; anything it committed within
+    # budget stays written. REPORT keeps each request's statements and logs
+    # them grouped by normalized SQL
+    METRICS_QUERY_BUDGET_STRICT = os.environ.get('METRICS_QUERY_BUDGET_STRICT', '0') == '1'
+    METRICS_QUERY_BUDGET_REPORT = os.environ.get('METRICS_QUERY_BUDGET_REPORT', '0') == '1'
+    METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '0') == '1'
+    # /api/metrics and the /api/*/stats endpoints answer admins' JWTs and, for
+    # a Prometheus scraper, `Authorization: Bearer <METRICS_TOKEN>` when set
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+    # Rows fetched per round trip by the streamed CSV/NDJSON exports
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+    # Bulk product imports (POST /api/products/import): rows per INSERT ...
+    # ON CONFLICT batch, uploads of up to SYNC_ROWS lines imported during the
+    # request (larger ones run on WORKERS background threads), and the most
+    # row errors kept in a report
+    PRODUCT_IMPORT_CHUNK_SIZE = int(os.environ.get('PRODUCT_IMPORT_CHUNK_SIZE', 500))
+    PRODUCT_IMPORT_SYNC_ROWS = int(os.environ.get('PRODUCT_IMPORT_SYNC_ROWS', 1000))
+    PRODUCT_IMPORT_WORKERS = int(os.environ.get('PRODUCT_IMPORT_WORKERS', 1))
+    PRODUCT_IMPORT_MAX_ERRORS = int(os.environ.get('PRODUCT_IMPORT_MAX_ERRORS', 1000))
+    # Background jobs heartbeat every HEARTBEAT_INTERVAL seconds; queued or
+    # running jobs silent for STALE_AFTER seconds (their process was killed)
+    # are failed and their spooled uploads removed. 0 disables both
+    PRODUCT_IMPORT_HEARTBEAT_INTERVAL = int(os.environ.get('PRODUCT_IMPORT_HEARTBEAT_INTERVAL', 30))
+    PRODUCT_IMPORT_STALE_AFTER = int(os.environ.get('PRODUCT_IMPORT_STALE_AFTER', 300))
+    # Most operations accepted by one POST /api/products/adjustments batch
+    PRODUCT_ADJUST_MAX_ITEMS = int(os.environ.get('PRODUCT_ADJUST_MAX_ITEMS', 1000))
+
+    # Requests replayed at startup to prime caches before workers take traffic
+    WARMUP_PATHS = ['/api/products/categories', '/api/products/']
+
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
@@ -0,0 +1,162 @@
+import csv
+import io
+import logging
+import zlib
+from datetime import datetime
+from flask import Response, current_app, request, stream_with_context
+from models import Order, OrderItem, Product
+from pagination import parse_date_arg
+from serializers import ORDER, ORDER_ITEM
+
+logger = logging.getLogger(__name__)
+
+# Streaming exports for reports too large to page through. Each export is a
+# single query read through a server-side cursor EXPORT_BATCH_SIZE rows at a
+# time (yield_per; PostgreSQL streams the results instead of buffering them
+# in the driver) and written out as CSV or NDJSON while it is read, so
+# memory stays flat whatever the row count. The status line goes out before
+# the first row is fetched: a failure midway ends the body early and is
+# only logged.
+
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+CHUNK_BYTES = 64 * 1024
+
+class InvalidExport(ValueError):
+    pass
+
+def export_format():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        raise InvalidExport(f"Unknown format '{fmt}', expected one of {', '.join(FORMATS)}")
+    return fmt
+
+def filter_export(query, model, status_arg='status', status_column=None):
+    """Apply ?status= (checked against the column's enum) and
+    ?date_from=/?date_to= on created_at"""
+    column = status_column if status_column is not None else getattr(model, 'status', None)
+    value = request.args.get(status_arg)
+    if value and column is not None:
+        allowed = getattr(column.type, 'enums', None)
+        if allowed and value not in allowed:
+            raise InvalidExport(f"Invalid {status_arg} '{value}'")
+        query = query.filter(column == value)
+    date_from = parse_date_arg('date_from')
+    date_to = parse_date_arg('date_to', end_of_day=True)
+    if date_from:
+        query = query.filter(model.created_at >= date_from)
+    if date_to:
+        query = query.filter(model.created_at < date_to)
+    return query.order_by(model.created_at, model.id)
+
+def _batch():
+    return current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+
+def projection_records(projection, query):
+    """API dicts for the rows of `query`, streamed"""
+    encode = projection.encode
+    for row in projection.query(query).yield_per(_batch()):
+        yield encode(row)
+
+def order_records(query):
+    """Order dicts with their items (plus each item's productName), streamed.
+
+    Orders and items come from one outer join ordered by order, so an
+    order's lines are adjacent and each order is emitted once complete.
+    """
+    width = len(ORDER.columns)
+    rows = ORDER.query(
+        query.outerjoin(OrderItem, OrderItem.order_id == Order.id).outerjoin(Product, Product.id == OrderItem.product_id),
+        *ORDER_ITEM.columns, Product.name
+    ).order_by(OrderItem.id)
+    current = None
+    for row in rows.yield_per(_batch()):
+        if current is None or current['id'] != row[0]:
+            if current is not None:
+                yield current
+            current = ORDER.encode(row)
+            current['items'] = []
+        if row[width] is not None:
+            item = ORDER_ITEM.encode(row[width:])
+            item['productName'] = row[-1]
+            current['items'].append(item)
+    if current is not None:
+        yield current
+
+def flat_columns(projection):
+    keys = [key for key, _, _ in projection.fields]
+    return keys, lambda record: [[record[key] for key in keys]]
+
+def order_columns():
+    """CSV header and flattener for order_records(): one line per item,
+    order columns repeated; orders without items get one line"""
+    order_keys = [key for key, _, _ in ORDER.fields]
+    item_keys = [key for key, _, _ in ORDER_ITEM.fields if key != 'orderId'] + ['productName']
+    header = order_keys + ['item' + key[0].upper() + key[1:] for key in item_keys]
+
+    def flatten(record):
+        base = [record[key] for key in order_keys]
+        if not record['items']:
+            return [base + [None] * len(item_keys)]
+        return [base + [item[key] for key in item_keys] for item in record['items']]
+    return header, flatten
+
+def _csv(records, header, flatten):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for record in records:
+        writer.writerows(flatten(record))
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def _ndjson(records):
+    dumps = current_app.json.dumps
+    lines = []
+    size = 0
+    for record in records:
+        line = dumps(record) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield ''.join(lines).encode('utf-8')
+            lines, size = [], 0
+    yield ''.join(lines).encode('utf-8')
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _guarded(name, chunks):
+    try:
+        yield from chunks
+    except Exception:
+        logger.exception('Export %s failed midway; response truncated', name)
+
+def stream_export(name, records, header, flatten):
+    """Streamed download of `records` in the requested format.
+
+    ?gzip=1 sends a .gz file; otherwise clients sending Accept-Encoding:
+    gzip get the body gzip-encoded on the wire.
+    """
+    fmt = export_format()
+    chunks = _csv(records, header, flatten) if fmt == 'csv' else _ndjson(records)
+    filename = f'{name}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}'
+    headers = {'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'}
+    content_type = FORMATS[fmt]
+    if request.args.get('gzip') == '1':
+        chunks = _gzip(chunks)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    elif 'gzip' in request.accept_encodings:
+        chunks = _gzip(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return Response(stream_with_context(_guarded(name, chunks)), content_type=content_type, headers=headers)
@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+import serving
+
+# Production server: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The app is imported and warmed once in the
+# master (preload), then forked into WEB_WORKERS processes with WEB_THREADS
+# request threads each. SIGTERM and SIGHUP stop workers gracefully: they
+# stop accepting, finish in-flight requests (checkouts included) for up to
+# WEB_GRACEFUL_TIMEOUT seconds, then release their resources.
+
+bind = os.environ.get('WEB_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+preload_app = os.environ.get('WEB_PRELOAD', '1') == '1'
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+# Recycle workers now and then to bound slow memory growth
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-')
+
+def when_ready(server):
+    # Runs in the master after binding, before any worker is forked
+    from config import Config
+    config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    for problem in serving.process_local_state(config, server.cfg.workers):
+        server.log.warning('%s workers: %s', server.cfg.workers, problem)
+    if server.cfg.preload_app:
+        app = server.app.wsgi()
+        serving.warmup(app)
+        serving.before_fork(app)
+
+def post_worker_init(worker):
+    app = worker.app.wsgi()
+    if worker.cfg.preload_app:
+        serving.after_fork(app)
+    else:
+        serving.warmup(app)
+
+def worker_exit(server, worker):
+    serving.on_exit(worker.app.wsgi())
@@ -0,0 +1,178 @@
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import Order, Seller, SellerBalance, SellerLedgerEntry, Withdrawal, db
+
+# Every change to a seller's money goes through this module in the same
+# transaction as the change itself: balance-affecting events append a
+# SellerLedgerEntry and all events adjust the seller's SellerBalance row with
+# relative upserts, so readers never aggregate order or withdrawal history.
+
+BALANCE_FIELDS = ('total_sales', 'order_count', 'earnings', 'withdrawn', 'pending_withdrawals')
+
+def init_app(app):
+    @app.cli.command('reconcile-balances')
+    def reconcile_balances_command():
+        """Rebuild seller balances from order and withdrawal history."""
+        changed = reconcile()
+        for seller_id in changed:
+            print(f'Corrected balance for seller {seller_id}')
+        print(f'{len(changed)} balances corrected')
+
+def _insert():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert
+    if dialect == 'sqlite':
+        return sqlite.insert
+    raise NotImplementedError(f'Balance upserts are not supported on {dialect}')
+
+def apply_deltas(deltas):
+    """Add {seller_id: {field: delta}} to balance rows, creating missing rows"""
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {'seller_id': seller_id, 'updated_at': now, **{f: changes.get(f, 0) for f in BALANCE_FIELDS}}
+        for seller_id, changes in sorted(deltas.items())
+    ]
+    statement = _insert()(SellerBalance)
+    statement = statement.on_conflict_do_update(
+        index_elements=[SellerBalance.seller_id],
+        set_={
+            'updated_at': statement.excluded.updated_at,
+            **{f: getattr(SellerBalance, f) + getattr(statement.excluded, f) for f in BALANCE_FIELDS}
+        }
+    )
+    db.session.execute(statement, rows)
+
+def get_balance(seller_id):
+    """Balance row for a seller, or an unsaved all-zero row if none exists"""
+    balance = db.session.get(SellerBalance, seller_id)
+    if balance is None:
+        balance = SellerBalance(seller_id=seller_id, order_count=0, **{
+            f: Decimal('0') for f in BALANCE_FIELDS if f != 'order_count'
+        })
+    return balance
+
+def record_orders_placed(orders):
+    deltas = {}
+    for order in orders:
+        changes = deltas.setdefault(order.seller_id, {'total_sales': 0, 'order_count': 0})
+        changes['total_sales'] += order.total_price
+        changes['order_count'] += 1
+    apply_deltas(deltas)
+
+def record_order_status(order, old_status):
+    """Account for an order moving from old_status to order.status"""
+    new_status = order.status
+    if new_status == old_status:
+        return
+    amount = order.total_price
+    changes = {}
+    if new_status == 'cancelled':
+        changes['total_sales'] = -amount
+    elif old_status == 'cancelled':
+        changes['total_sales'] = amount
+
+    if new_status == 'delivered':
+        changes['earnings'] = amount
+        _append(order.seller_id, 'order_delivered', amount, order_id=order.id)
+    elif old_status == 'delivered':
+        changes['earnings'] = -amount
+        entry_type = 'order_cancelled' if new_status == 'cancelled' else 'order_reopened'
+        _append(order.seller_id, entry_type, -amount, order_id=order.id)
+
+    if changes:
+        apply_deltas({order.seller_id: changes})
+
+def reserve_withdrawal(seller_id, amount):
+    """Earmark amount for a new withdrawal request if the balance covers it.
+
+    The conditional UPDATE locks the seller's balance row until commit, so
+    concurrent requests are serialized and cannot spend the same balance.
+    """
+    result = db.session.execute(
+        update(SellerBalance)
+        .where(
+            SellerBalance.seller_id == seller_id,
+            SellerBalance.earnings - SellerBalance.withdrawn - SellerBalance.pending_withdrawals >= amount
+        )
+        .values(
+            pending_withdrawals=SellerBalance.pending_withdrawals + amount,
+            updated_at=datetime.utcnow()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def record_withdrawal_status(withdrawal, old_status):
+    """Account for a withdrawal moving from old_status to withdrawal.status"""
+    new_status = withdrawal.status
+    if new_status == old_status:
+        return
+    amount = withdrawal.amount_requested
+    changes = {}
+    if old_status == 'pending':
+        changes['pending_withdrawals'] = -amount
+    if new_status == 'processed':
+        changes['withdrawn'] = amount
+        _append(withdrawal.seller_id, 'withdrawal_processed', -amount, withdrawal_id=withdrawal.id)
+    elif old_status == 'processed':
+        changes['withdrawn'] = -amount
+        _append(withdrawal.seller_id, 'withdrawal_reversed', amount, withdrawal_id=withdrawal.id)
+    if changes:
+        apply_deltas({withdrawal.seller_id: changes})
+
+def _append(seller_id, entry_type, amount, order_id=None, withdrawal_id=None):
+    db.session.add(SellerLedgerEntry(
+        seller_id=seller_id,
+        entry_type=entry_type,
+        amount=amount,
+        order_id=order_id,
+        withdrawal_id=withdrawal_id
+    ))
+
+def _money(value):
+    # SQLite sums Numeric columns as floats
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+def reconcile():
+    """Recompute every seller's balance from history; returns corrected seller ids"""
+    expected = {seller_id: {} for (seller_id,) in db.session.query(Seller.id)}
+
+    order_totals = db.session.query(
+        Order.seller_id,
+        func.coalesce(func.sum(case((Order.status != 'cancelled', Order.total_price), else_=0)), 0),
+        func.count(Order.id),
+        func.coalesce(func.sum(case((Order.status == 'delivered', Order.total_price), else_=0)), 0)
+    ).group_by(Order.seller_id)
+    for seller_id, total_sales, order_count, earnings in order_totals:
+        expected.setdefault(seller_id, {}).update(
+            total_sales=_money(total_sales), order_count=order_count, earnings=_money(earnings)
+        )
+
+    withdrawal_totals = db.session.query(
+        Withdrawal.seller_id,
+        func.coalesce(func.sum(case((Withdrawal.status == 'processed', Withdrawal.amount_requested), else_=0)), 0),
+        func.coalesce(func.sum(case((Withdrawal.status == 'pending', Withdrawal.amount_requested), else_=0)), 0)
+    ).group_by(Withdrawal.seller_id)
+    for seller_id, withdrawn, pending in withdrawal_totals:
+        expected.setdefault(seller_id, {}).update(withdrawn=_money(withdrawn), pending_withdrawals=_money(pending))
+
+    balances = {b.seller_id: b for b in SellerBalance.query.with_for_update()}
+    changed = []
+    for seller_id, values in sorted(expected.items()):
+        balance = balances.get(seller_id)
+        if balance is None:
+            balance = SellerBalance(seller_id=seller_id)
+            db.session.add(balance)
+        elif all(_money(getattr(balance, f)) == _money(values.get(f, 0)) for f in BALANCE_FIELDS):
+            continue
+        for field in BALANCE_FIELDS:
+            setattr(balance, field, values.get(field, 0))
+        changed.append(seller_id)
+
+    db.session.commit()
+    return changed
@@ -0,0 +1,249 @@
+import logging
+import threading
+import time
+from flask import current_app, g, has_app_context, jsonify, request
+from sqlalchemy import event
+import db_profiles
+from cache import catalog_cache
+from passwords import password_hasher
+from query_budget import QueryBudgetExceeded, budget_for, report
+from replicas import replicas
+from throttle import throttle
+
+logger = logging.getLogger(__name__)
+
+# Per-process request metrics in the Prometheus text format. Under a
+# preforking server each worker keeps its own numbers, so a scrape sees the
+# worker that answered it; scrape every worker (or sum across restarts) for
+# totals. When METRICS_ENABLED is off no hooks or engine listeners are
+# installed at all.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            le = _labels(self.labels, label_values, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{le} {count}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, label_values)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labels, label_values)} {count}')
+        return lines
+
+def _simple(name, kind, help, samples):
+    """Lines for a counter or gauge from [(label names, label values, value)]"""
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+    for names, values, value in samples:
+        if value is not None:
+            lines.append(f'{name}{_labels(names, values)} {_number(value)}')
+    return lines
+
+class RequestMetrics:
+    def __init__(self):
+        self.enabled = False
+        self.server_timing = False
+        self.query_budget = 0
+        self.budget_strict = False
+        self.budget_report = False
+        self.latency = Histogram('http_request_duration_seconds', 'Request latency.', ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.queries = Histogram('http_request_db_queries', 'SQL statements per request.', ('endpoint', 'method'), QUERY_BUCKETS)
+        self.db_time = Histogram('http_request_db_seconds', 'Time spent in SQL per request.', ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.size = Histogram('http_response_size_bytes', 'Response body size.', ('endpoint', 'method'), SIZE_BUCKETS)
+        self._responses = {}
+        self._over_budget = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Install the request hooks and engine listeners; call after db.init_app(app)"""
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', False)
+        self.query_budget = app.config.get('METRICS_QUERY_BUDGET', 25)
+        self.budget_strict = app.config.get('METRICS_QUERY_BUDGET_STRICT', False)
+        self.budget_report = app.config.get('METRICS_QUERY_BUDGET_REPORT', False)
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        with app.app_context():
+            for engine in app.extensions['sqlalchemy'].engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _start(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db_time = 0.0
+        # An app context pushed around several requests shares its g
+        g.pop('metrics_finished', None)
+        g.pop('metrics_exceeded', None)
+        if self.budget_report or self.budget_strict:
+            g.metrics_statements = []
+        if self.budget_strict:
+            g.metrics_budget = self.budget()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is None or not context.execution_options.get('budgeted', True):
+            return
+        context._metrics_started = time.perf_counter()
+        if self.budget_strict and has_app_context() and g.get('metrics_budget') is not None \
+                and 'metrics_finished' not in g and g.metrics_queries >= g.metrics_budget:
+            # Refuse the statement instead of failing the response afterwards:
+            # the view's transaction is rolled back, so nothing past the
+            # budget is written. Work committed within budget stays committed
+            g.metrics_exceeded = g.metrics_statements + [statement]
+            raise QueryBudgetExceeded(f'{request.method} {request.path}', g.metrics_budget, g.metrics_exceeded)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is None or not context.execution_options.get('budgeted', True) \
+                or not has_app_context() or 'metrics_queries' not in g:
+            return
+        g.metrics_queries += 1
+        g.metrics_db_time += time.perf_counter() - getattr(context, '_metrics_started', time.perf_counter())
+        if 'metrics_statements' in g:
+            g.metrics_statements.append(statement)
+
+    def budget(self):
+        """Statement budget of the current request's view, None for no limit"""
+        view = current_app.view_functions.get(request.endpoint)
+        return budget_for(view, self.query_budget or None)
+
+    def _finish(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        # Statements a streamed body runs later are not counted
+        g.metrics_finished = True
+        queries, db_time = g.metrics_queries, g.metrics_db_time
+        exceeded = g.get('metrics_exceeded')
+        if exceeded:
+            queries = len(exceeded)
+        labels = (request.endpoint or 'unmatched', request.method)
+
+        self.latency.observe(labels, elapsed)
+        self.queries.observe(labels, queries)
+        self.db_time.observe(labels, db_time)
+        if not response.is_streamed and response.content_length is not None:
+            self.size.observe(labels, response.content_length)
+        budget = self.budget()
+        over_budget = budget is not None and queries > budget
+        with self._lock:
+            key = labels + (str(response.status_code),)
+            self._responses[key] = self._responses.get(key, 0) + 1
+            if over_budget:
+                self._over_budget[labels] = self._over_budget.get(labels, 0) + 1
+        if over_budget:
+            statements = exceeded or g.get('metrics_statements')
+            logger.warning('%s %s ran %d SQL statements (budget %d)%s', request.method, request.path, queries, budget,
+                           '\n' + report(statements) if statements else '')
+            if self.budget_strict:
+                # Surface the regression to whoever made the request (tests,
+                # CI); the statement over budget was refused and rolled back
+                response = jsonify({
+                    'message': f'Query budget exceeded: {queries} SQL statements, budget {budget}',
+                    'statements': report(statements).splitlines()
+                })
+                response.status_code = 500
+
+        if self.server_timing:
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={db_time * 1000:.1f};desc="{queries} queries", app;dur={elapsed * 1000:.1f}'
+            )
+        return response
+
+    def render(self):
+        """All metrics, request ones plus the extensions' counters, as Prometheus text"""
+        lines = []
+        if self.enabled:
+            with self._lock:
+                responses = dict(self._responses)
+                over_budget = dict(self._over_budget)
+            lines += _simple('http_requests_total', 'counter', 'Requests by endpoint, method and status.', [
+                (('endpoint', 'method', 'status'), key, count) for key, count in sorted(responses.items())
+            ])
+            for histogram in (self.latency, self.queries, self.db_time, self.size):
+                lines += histogram.render()
+            lines += _simple('http_requests_over_query_budget_total', 'counter',
+                             'Requests that ran more SQL statements than their route\'s budget.', [
+                (('endpoint', 'method'), key, count) for key, count in sorted(over_budget.items())
+            ])
+
+        cache = catalog_cache.stats()
+        lines += _simple('catalog_cache_operations_total', 'counter', 'Catalog cache lookups and writes.', [
+            (('result',), (name,), cache.get(name)) for name in ('hits', 'misses', 'stores', 'invalidations')
+        ])
+        backend = cache.get('backend') or {}
+        lines += _simple('catalog_cache_entries', 'gauge', 'Entries in the in-process catalog cache.', [((), (), backend.get('entries'))])
+        lines += _simple('catalog_cache_bytes', 'gauge', 'Bytes held by the in-process catalog cache.', [((), (), backend.get('bytes'))])
+
+        lines += _simple('throttle_requests_total', 'counter', 'Throttled endpoint requests by scope and outcome.', [
+            (('scope', 'outcome'), (scope, outcome), count)
+            for scope, counters in sorted(throttle.stats()['scopes'].items())
+            for outcome, count in sorted(counters.items())
+        ])
+
+        hasher = password_hasher.stats()
+        lines += _simple('password_hashes_total', 'counter', 'Password hashing pool outcomes.', [
+            (('outcome',), (name,), hasher.get(name)) for name in ('completed', 'rejected', 'rehashed')
+        ])
+
+        routing = replicas.stats()
+        lines += _simple('db_replica_routing_total', 'counter', 'Read-only requests by database choice.', [
+            (('decision',), (name,), routing.get(name)) for name in ('replica', 'sticky', 'lagging', 'pinned')
+        ])
+        lines += _simple('db_replica_lag_seconds', 'gauge', 'Last measured replica lag.', [
+            (('replica',), (key,), lag) for key, lag in sorted(routing['lag'].items())
+        ])
+
+        pools = db_profiles.stats()['pools']
+        for name, help in (('checkedout', 'Connections in use.'), ('checkedin', 'Idle pooled connections.'), ('overflow', 'Connections beyond pool_size.')):
+            lines += _simple(f'db_pool_{name}', 'gauge', help, [
+                (('bind',), (bind,), pool.get(name)) for bind, pool in sorted(pools.items())
+            ])
+        return '\n'.join(lines) + '\n'
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,46 @@
+"""product search
+
+FTS5 table and sync triggers on SQLite, GIN tsvector index on PostgreSQL;
+see search.py. SQLite builds without FTS5 keep the ILIKE fallback.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 01:10:02.118403
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+import search
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_context().dialect.name
+    for statement in search.ddl(dialect):
+        if context.is_offline_mode():
+            op.execute(statement)
+            continue
+        try:
+            op.execute(statement)
+        except sa.exc.OperationalError:
+            # SQLite compiled without FTS5
+            if dialect != 'sqlite':
+                raise
+            return
+
+
+def downgrade():
+    dialect = op.get_context().dialect.name
+    if dialect == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {search.FTS_TABLE}_{suffix}')
+        op.execute(f'DROP TABLE IF EXISTS {search.FTS_TABLE}')
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_product_search')
@@ -0,0 +1,127 @@
+"""compact uuid keys
+
+Store every primary and foreign key as a native uuid on PostgreSQL and as a
+16-byte blob on SQLite instead of 36-character text. Existing ids keep
+their value; new rows get time-ordered UUIDv7 ids (see ids.py).
+
+PostgreSQL converts in place with ALTER COLUMN ... USING and works with
+--sql. SQLite rewrites each table and converts values in Python, so it
+needs a live connection.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 01:22:40.771903
+
+"""
+import uuid
+
+from alembic import context, op
+import sqlalchemy as sa
+
+import search
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+# table -> {id column: referenced table or None for the primary key}
+KEY_COLUMNS = {
+    'user': {'id': None},
+    'seller': {'id': None, 'user_id': 'user'},
+    'product': {'id': None, 'seller_id': 'seller'},
+    'cart_item': {'id': None, 'user_id': 'user', 'product_id': 'product'},
+    'order': {'id': None, 'buyer_id': 'user', 'seller_id': 'seller'},
+    'order_item': {'id': None, 'order_id': 'order', 'product_id': 'product'},
+    'withdrawal': {'id': None, 'seller_id': 'seller'},
+    'review': {'id': None, 'user_id': 'user', 'product_id': 'product'},
+    'seller_ledger_entry': {'id': None, 'seller_id': 'seller', 'order_id': 'order', 'withdrawal_id': 'withdrawal'},
+    'seller_balance': {'seller_id': 'seller'},
+}
+
+
+def _foreign_keys():
+    for table, columns in KEY_COLUMNS.items():
+        for column, referred in columns.items():
+            if referred:
+                # PostgreSQL's default name for the unnamed constraints 0001-0003 created
+                yield f'{table}_{column}_fkey', table, column, referred
+
+
+def _convert_postgresql(to_type, cast):
+    for name, table, _, _ in _foreign_keys():
+        op.drop_constraint(name, table, type_='foreignkey')
+    for table, columns in KEY_COLUMNS.items():
+        alterations = ', '.join(
+            f'ALTER COLUMN {column} TYPE {to_type} USING {column}::{cast}' for column in columns
+        )
+        op.execute(f'ALTER TABLE "{table}" {alterations}')
+    for name, table, column, referred in _foreign_keys():
+        op.create_foreign_key(name, table, referred, [column], ['id'])
+
+
+def _convert_sqlite(convert, new_type, old_type):
+    bind = op.get_bind()
+    for table, columns in KEY_COLUMNS.items():
+        names = list(columns)
+        rows = bind.execute(sa.text(
+            f'SELECT rowid, {", ".join(names)} FROM "{table}"'
+        )).all()
+        if rows:
+            assignments = ', '.join(f'{column} = :{column}' for column in names)
+            bind.execute(
+                sa.text(f'UPDATE "{table}" SET {assignments} WHERE rowid = :rowid'),
+                [dict(rowid=row[0], **{c: convert(v) for c, v in zip(names, row[1:])}) for row in rows]
+            )
+        with op.batch_alter_table(table, recreate='always') as batch_op:
+            for column in names:
+                batch_op.alter_column(column, type_=new_type, existing_type=old_type)
+
+    # Rewriting the product table dropped the search triggers
+    has_fts = bind.execute(sa.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': search.FTS_TABLE}).first()
+    if has_fts:
+        op.execute(f'DELETE FROM {search.FTS_TABLE}')
+        for statement in search.ddl('sqlite'):
+            op.execute(statement)
+
+
+def _to_bytes(value):
+    if value is None or isinstance(value, bytes) and len(value) == 16:
+        return value
+    if isinstance(value, bytes):
+        value = value.decode('ascii')
+    return uuid.UUID(value).bytes
+
+
+def _to_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    return str(uuid.UUID(bytes=bytes(value)))
+
+
+def _dialect():
+    dialect = op.get_context().dialect.name
+    if dialect == 'sqlite' and context.is_offline_mode():
+        raise RuntimeError('The SQLite key conversion needs a live database connection')
+    return dialect
+
+
+def upgrade():
+    dialect = _dialect()
+    if dialect == 'postgresql':
+        _convert_postgresql('uuid', 'uuid')
+    elif dialect == 'sqlite':
+        _convert_sqlite(_to_bytes, sa.LargeBinary(16), sa.String(36))
+
+
+def downgrade():
+    dialect = _dialect()
+    if dialect == 'postgresql':
+        _convert_postgresql('varchar(36)', 'text')
+    elif dialect == 'sqlite':
+        _convert_sqlite(_to_text, sa.String(36), sa.LargeBinary(16))
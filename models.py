@@ -1,11 +1,13 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-import uuid
+from ids import CompactUUID, new_id
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(CompactUUID, primary_key=True, default=new_id)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(255), nullable=False)
@@ -14,6 +16,11 @@ class User(db.Model):
     address = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Admin user listing, newest first
+        db.Index('ix_user_created_at_id', 'created_at', 'id'),
+    )
+
     # Relationships
     seller_profile = db.relationship('Seller', backref='user', uselist=False)
     cart_items = db.relationship('CartItem', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -32,14 +39,20 @@ class User(db.Model):
         }
 
 class Seller(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    id = db.Column(CompactUUID, primary_key=True, default=new_id)
+    user_id = db.Column(CompactUUID, db.ForeignKey('user.id'), nullable=False)
     business_name = db.Column(db.String(200), nullable=False)
     status = db.Column(db.Enum('pending', 'approved', 'rejected', name='seller_status'), default='pending')
     documents = db.Column(db.Text)
     verified_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_seller_user_id', 'user_id'),
+        # Admin seller listings filtered by status, newest first
+        db.Index('ix_seller_status_created_at_id', 'status', 'created_at', 'id'),
+    )
+
     # Relationships
     products = db.relationship('Product', backref='seller', lazy=True)
     orders = db.relationship('Order', foreign_keys='Order.seller_id', backref='seller', lazy=True)
@@ -57,16 +70,31 @@ class Seller(db.Model):
         }
 
 class Product(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    seller_id = db.Column(db.String(36), db.ForeignKey('seller.id'), nullable=False)
+    id = db.Column(CompactUUID, primary_key=True, default=new_id)
+    seller_id = db.Column(CompactUUID, db.ForeignKey('seller.id'), nullable=False)
+    # Seller-assigned stock keeping unit; bulk imports upsert by it
+    sku = db.Column(db.String(100))
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     price = db.Column(db.Numeric(10, 2), nullable=False)
     stock = db.Column(db.Integer, nullable=False, default=0)
+    # Units held by carts; available-to-sell is stock - reserved
+    reserved = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     category = db.Column(db.String(100), nullable=False)
     image_url = db.Column(db.String(500))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_product_seller_id', 'seller_id'),
+        # One product per SKU per seller; products without a SKU are not constrained
+        db.Index('uq_product_seller_sku', 'seller_id', 'sku', unique=True),
+        # Catalog listing: category filter and each sort order's keyset
+        db.Index('ix_product_category_name_id', 'category', 'name', 'id'),
+        db.Index('ix_product_name_id', 'name', 'id'),
+        db.Index('ix_product_price_id', 'price', 'id'),
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+    )
+
     # Relationships
     cart_items = db.relationship('CartItem', backref='product', lazy=True)
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
@@ -76,6 +104,7 @@ class Product(db.Model):
         return {
             'id': self.id,
             'sellerId': self.seller_id,
+            'sku': self.sku,
             'name': self.name,
             'description': self.description,
             'price': float(self.price),
@@ -85,39 +114,96 @@ class Product(db.Model):
             'createdAt': self.created_at.isoformat()
         }
 
+class ProductImport(db.Model):
+    # Background bulk import; see product_import.py
+    id = db.Column(CompactUUID, primary_key=True, default=new_id)
+    seller_id = db.Column(CompactUUID, db.ForeignKey('seller.id'), nullable=False)
+    status = db.Column(db.Enum('queued', 'running', 'completed', 'failed', name='product_import_status'), nullable=False, default='queued')
+    format = db.Column(db.String(10), nullable=False)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    created_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    # JSON list of {line, sku, errors}, capped at PRODUCT_IMPORT_MAX_ERRORS
+    errors = db.Column(db.Text)
+    message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Refreshed while the process running the job is alive; a queued or
+    # running job whose heartbeat stops is failed as abandoned
+    heartbeat_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_product_import_seller_id_created_at', 'seller_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sellerId': self.seller_id,
+            'status': self.status,
+            'format': self.format,
+            'rows': self.row_count,
+            'created': self.created_count,
+            'updated': self.updated_count,
+            'failed': self.failed_count,
+            'errors': json.loads(self.errors) if self.errors else [],
+            'message': self.message,
+            'createdAt': self.created_at.isoformat(),
+            'startedAt': self.started_at.isoformat() if self.started_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None
+        }
+
 class CartItem(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    product_id = db.Column(db.String(36), db.ForeignKey('product.id'), nullable=False)
+    id = db.Column(CompactUUID, primary_key=True, default=new_id)
+    user_id = db.Column(CompactUUID, db.ForeignKey('user.id'), nullable=False)
+    product_id = db.Column(CompactUUID, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
+    # Stock hold counted in Product.reserved until checkout or sweep
+    reserved_quantity = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reserved_until = db.Column(db.DateTime, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # One line per product per cart; also serves cart lookups by user
+        db.Index('uq_cart_item_user_product', 'user_id', 'product_id', unique=True),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
             'userId': self.user_id,
             'productId': self.product_id,
             'quantity': self.quantity,
+            'reservedUntil': self.reserved_until.isoformat() if self.reserved_until else None,
             'createdAt': self.created_at.isoformat(),
             'product': self.product.to_dict() if self.product else None
         }
 
 class Order(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    buyer_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    seller_id = db.Column(db.String(36), db.ForeignKey('seller.id'), nullable=False)
-    total_price = db.Column(db.Numeric(10, 2), nullable=False)
+    id = db.Column(CompactUUID, primary_key=True, default=new_id)
+    buyer_id = db.Column(CompactUUID, db.ForeignKey('user.id'), nullable=False)
+    seller_id = db.Column(CompactUUID, db.ForeignKey('seller.id'), nullable=False)
+    total_price = db.Column(db.Numeric(10, 2), nullable=False, index=True)
     shipping_address = db.Column(db.Text, nullable=False)
     method = db.Column(db.String(50), nullable=False)
     carrier = db.Column(db.String(100))
     tracking_number = db.Column(db.String(100))
     status = db.Column(db.Enum('pending', 'processing', 'shipped', 'in_transit', 'delivered', 'cancelled', name='order_status'), default='pending')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        # Order history per buyer / seller and admin status filter, newest first
+        db.Index('ix_order_buyer_id_created_at_id', 'buyer_id', 'created_at', 'id'),
+        db.Index('ix_order_seller_id_created_at_id', 'seller_id', 'created_at', 'id'),
+        db.Index('ix_order_status_created_at_id', 'status', 'created_at', 'id'),
+    )
 
     # Relationships
     order_items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
 
-    def to_dict(self):
+    def to_dict(self, include_products=True):
         return {
             'id': self.id,
             'buyerId': self.buyer_id,
@@ -129,29 +215,36 @@ class Order(db.Model):
             'trackingNumber': self.tracking_number,
             'status': self.status,
             'createdAt': self.created_at.isoformat(),
-            'items': [item.to_dict() for item in self.order_items]
+            'items': [item.to_dict(include_product=include_products) for item in self.order_items]
         }
 
 class OrderItem(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    order_id = db.Column(db.String(36), db.ForeignKey('order.id'), nullable=False)
-    product_id = db.Column(db.String(36), db.ForeignKey('product.id'), nullable=False)
+    id = db.Column(CompactUUID, primary_key=True, default=new_id)
+    order_id = db.Column(CompactUUID, db.ForeignKey('order.id'), nullable=False)
+    product_id = db.Column(CompactUUID, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)
 
-    def to_dict(self):
-        return {
+    __table_args__ = (
+        db.Index('ix_order_item_order_id', 'order_id'),
+        db.Index('ix_order_item_product_id', 'product_id'),
+    )
+
+    def to_dict(self, include_product=True):
+        data = {
             'id': self.id,
             'orderId': self.order_id,
             'productId': self.product_id,
             'quantity': self.quantity,
-            'price': float(self.price),
-            'product': self.product.to_dict() if self.product else None
+            'price': float(self.price)
         }
+        if include_product:
+            data['product'] = self.product.to_dict() if self.product else None
+        return data
 
 class Withdrawal(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    seller_id = db.Column(db.String(36), db.ForeignKey('seller.id'), nullable=False)
+    id = db.Column(CompactUUID, primary_key=True, default=new_id)
+    seller_id = db.Column(CompactUUID, db.ForeignKey('seller.id'), nullable=False)
     amount_requested = db.Column(db.Numeric(10, 2), nullable=False)
     amount_paid = db.Column(db.Numeric(10, 2), nullable=False)
     method = db.Column(db.Enum('paypal', 'bank', name='withdrawal_methods'), nullable=False)
@@ -160,6 +253,12 @@ class Withdrawal(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     processed_at = db.Column(db.DateTime)
 
+    __table_args__ = (
+        # Seller withdrawal history and admin status filter, newest first
+        db.Index('ix_withdrawal_seller_id_created_at_id', 'seller_id', 'created_at', 'id'),
+        db.Index('ix_withdrawal_status_created_at_id', 'status', 'created_at', 'id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -174,13 +273,19 @@ class Withdrawal(db.Model):
         }
 
 class Review(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    product_id = db.Column(db.String(36), db.ForeignKey('product.id'), nullable=False)
+    id = db.Column(CompactUUID, primary_key=True, default=new_id)
+    user_id = db.Column(CompactUUID, db.ForeignKey('user.id'), nullable=False)
+    product_id = db.Column(CompactUUID, db.ForeignKey('product.id'), nullable=False)
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # One review per user per product
+        db.Index('uq_review_user_product', 'user_id', 'product_id', unique=True),
+        db.Index('ix_review_product_id_created_at', 'product_id', 'created_at'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -191,3 +296,39 @@ class Review(db.Model):
             'createdAt': self.created_at.isoformat(),
             'user': self.user.username if self.user else None
         }
+
+class SellerLedgerEntry(db.Model):
+    id = db.Column(CompactUUID, primary_key=True, default=new_id)
+    seller_id = db.Column(CompactUUID, db.ForeignKey('seller.id'), nullable=False, index=True)
+    entry_type = db.Column(db.Enum('order_delivered', 'order_cancelled', 'order_reopened', 'withdrawal_processed', 'withdrawal_reversed', name='ledger_entry_types'), nullable=False)
+    # Signed effect on the seller's withdrawable balance
+    amount = db.Column(db.Numeric(12, 2), nullable=False)
+    order_id = db.Column(CompactUUID, db.ForeignKey('order.id'))
+    withdrawal_id = db.Column(CompactUUID, db.ForeignKey('withdrawal.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sellerId': self.seller_id,
+            'entryType': self.entry_type,
+            'amount': float(self.amount),
+            'orderId': self.order_id,
+            'withdrawalId': self.withdrawal_id,
+            'createdAt': self.created_at.isoformat()
+        }
+
+class SellerBalance(db.Model):
+    # Materialized from SellerLedgerEntry and Order history; see ledger.py
+    seller_id = db.Column(CompactUUID, db.ForeignKey('seller.id'), primary_key=True)
+    total_sales = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    earnings = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    withdrawn = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    pending_withdrawals = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def available(self):
+        """Withdrawable now: delivered earnings less paid and requested withdrawals"""
+        return self.earnings - self.withdrawn - self.pending_withdrawals
@@ -0,0 +1,141 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from flask import request
+from sqlalchemy import and_, or_, text
+from models import db
+
+MAX_PER_PAGE = 100
+
+class InvalidCursor(ValueError):
+    pass
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.total = total
+
+def wants_cursor():
+    """Cursor mode is opted into with ?cursor= (empty for the first page)"""
+    return 'cursor' in request.args
+
+def parse_date_arg(name, end_of_day=False):
+    """ISO date/datetime query arg; a bare date used as an upper bound covers that whole day"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name}')
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+def _decode_value(value):
+    # Tokens come from clients: anything malformed is a bad cursor, not a 500
+    if isinstance(value, dict):
+        try:
+            if 'dt' in value:
+                return datetime.fromisoformat(value['dt'])
+            if 'dec' in value:
+                decoded = Decimal(value['dec'])
+                if not decoded.is_finite():
+                    raise InvalidOperation
+                return decoded
+        except (ValueError, TypeError, InvalidOperation):
+            raise InvalidCursor('Invalid cursor')
+        raise InvalidCursor('Invalid cursor')
+    if value is not None and not isinstance(value, (str, int, float)):
+        raise InvalidCursor('Invalid cursor')
+    return value
+
+def encode_cursor(values):
+    """Opaque URL-safe token for the sort values of the last row of a page"""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token, size):
+    """Decode a cursor token, checking it matches a sort of `size` keys"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('Invalid cursor')
+    return [_decode_value(v) for v in values]
+
+def order_clauses(keys):
+    """ORDER BY clauses for a list of (expression, descending) keys"""
+    return [expr.desc() if descending else expr.asc() for expr, descending in keys]
+
+def _after(keys, values):
+    """Row-value comparison `keys > values` honouring per-key direction"""
+    clauses = []
+    for i, (expr, descending) in enumerate(keys):
+        tail = expr < values[i] if descending else expr > values[i]
+        head = [keys[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*head, tail) if head else tail)
+    return or_(*clauses)
+
+def estimate_count(query):
+    """Planner row estimate on PostgreSQL, exact count elsewhere"""
+    if db.engine.dialect.name != 'postgresql':
+        return query.order_by(None).count()
+    statement = query.order_by(None).statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}
+    )
+    plan = db.session.execute(text(f'EXPLAIN (FORMAT JSON) {statement}')).scalar()
+    return int(plan[0]['Plan']['Plan Rows'])
+
+def keyset_paginate(query, keys, cursor, per_page, count=None):
+    """Fetch one page of `query` after `cursor` ordered by `keys`.
+
+    `keys` is a list of (expression, descending) pairs that must end with a
+    unique column so the ordering is total. `count` may be 'exact' or
+    'estimate'; anything else skips the COUNT entirely.
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+
+    total = None
+    if count == 'exact':
+        total = query.order_by(None).count()
+    elif count == 'estimate':
+        total = estimate_count(query)
+
+    if cursor:
+        query = query.filter(_after(keys, decode_cursor(cursor, len(keys))))
+
+    labels = [expr.label(f'_key{i}') for i, (expr, _) in enumerate(keys)]
+    rows = query.order_by(None).order_by(*order_clauses(keys)).add_columns(*labels).limit(per_page + 1).all()
+
+    # Rows are the selected entity (or projection columns) then the keys
+    width = len(query.column_descriptions)
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(list(rows[-1][width:]))
+
+    if width == 1:
+        return KeysetPage([row[0] for row in rows], next_cursor, total)
+    return KeysetPage([tuple(row[:width]) for row in rows], next_cursor, total)
+
+def paginate_request(query, keys, per_page):
+    """keyset_paginate driven by the current request's cursor/count args"""
+    return keyset_paginate(
+        query,
+        keys,
+        request.args.get('cursor'),
+        per_page,
+        count=request.args.get('count')
+    )
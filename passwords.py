@@ -0,0 +1,92 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+class HasherBusy(Exception):
+    """Raised when the password hashing queue is full"""
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated pool instead of the request thread.
+
+    At most `workers` hashes run at once and at most `queue_depth` more may
+    wait; anything beyond that raises HasherBusy straight away so a login
+    burst cannot occupy every request worker. With workers=0 hashing runs
+    inline on the calling thread.
+    """
+
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = 0
+        self.queue_depth = 0
+        self._executor = None
+        self._slots = None
+        self._stats = {'completed': 0, 'rejected': 0, 'rehashed': 0}
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_ROUNDS', 12)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2))
+        self.queue_depth = app.config.get('PASSWORD_HASH_QUEUE_DEPTH', 16)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self.workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+            self._slots = threading.BoundedSemaphore(self.workers + self.queue_depth)
+        app.extensions['password_hasher'] = self
+
+    def shutdown(self):
+        """Finish queued hashes and stop the pool; later hashes run inline"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(rounds=self.rounds, workers=self.workers, queueDepth=self.queue_depth)
+        return stats
+
+    def _run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise HasherBusy('Password hashing queue is full')
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        result = future.result()
+        self._count('completed')
+        return result
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password, hashed):
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        """Whether a stored hash was made with a different cost than configured"""
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def rehash(self, password):
+        hashed = self.hash(password)
+        self._count('rehashed')
+        return hashed
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,431 @@
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from background import start_periodic
+from cache import catalog_cache
+from ids import new_id
+from models import Product, ProductImport, db
+
+logger = logging.getLogger(__name__)
+
+# Bulk catalog import. Sellers upload CSV or NDJSON rows keyed by their own
+# SKU; rows are parsed and validated one at a time as the upload is read and
+# written in chunks of PRODUCT_IMPORT_CHUNK_SIZE with one INSERT ... ON
+# CONFLICT (seller_id, sku) DO UPDATE per chunk, committed per chunk. Rows
+# that fail validation (or the database, when a chunk is retried row by row)
+# are reported by line and the rest still import. Uploads up to
+# PRODUCT_IMPORT_SYNC_ROWS lines are imported during the request; larger
+# ones are spooled to a temporary file and imported by a background worker
+# while the seller polls the ProductImport row. Catalog caches are
+# invalidated once, after the last chunk. Background jobs heartbeat while
+# their process lives; one killed mid-import is failed once its heartbeat is
+# PRODUCT_IMPORT_STALE_AFTER seconds old and its spooled upload deleted.
+
+FORMATS = ('csv', 'ndjson')
+MAX_PRICE = Decimal('99999999.99')
+# Columns an import may set; everything else on the row is ignored. Optional
+# ones left out of a row keep their current value
+UPDATE_COLUMNS = ('name', 'description', 'price', 'stock', 'category', 'image_url')
+OPTIONAL_COLUMNS = ('description', 'image_url')
+SPOOL_BYTES = 64 * 1024
+SPOOL_PREFIX = 'product-import-'
+ACTIVE = ('queued', 'running')
+ABANDONED = 'Import stopped: the server running it went away'
+
+class InvalidImport(ValueError):
+    pass
+
+def import_format(fmt, content_type=None, filename=None):
+    """Format from ?format=, the upload's file name or its content type"""
+    if not fmt and filename and '.' in filename:
+        fmt = filename.rsplit('.', 1)[1].lower()
+    if not fmt and content_type:
+        if 'ndjson' in content_type or 'jsonlines' in content_type:
+            fmt = 'ndjson'
+        elif 'csv' in content_type:
+            fmt = 'csv'
+    fmt = fmt or 'csv'
+    if fmt not in FORMATS:
+        raise InvalidImport(f"Unknown format '{fmt}', expected one of {', '.join(FORMATS)}")
+    return fmt
+
+def _insert():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert
+    if dialect == 'sqlite':
+        return sqlite.insert
+    raise NotImplementedError(f'Product imports are not supported on {dialect}')
+
+def parse_rows(fileobj, fmt):
+    """(line, row, error) for each record of a binary upload"""
+    if fmt == 'csv':
+        reader = csv.DictReader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+        if not reader.fieldnames or 'sku' not in reader.fieldnames:
+            raise InvalidImport('CSV header must include a sku column')
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, 'More values than header columns'
+                continue
+            yield reader.line_num, row, None
+        return
+    for line, text in enumerate(io.TextIOWrapper(fileobj, encoding='utf-8-sig'), start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError:
+            yield line, None, 'Invalid JSON'
+            continue
+        if not isinstance(row, dict):
+            yield line, None, 'Expected a JSON object'
+            continue
+        yield line, row, None
+
+def _text(row, key, errors, required=False, limit=None):
+    value = row.get(key)
+    if value is None or value == '':
+        if required:
+            errors.append(f'{key} is required')
+        return None
+    if not isinstance(value, str):
+        value = str(value)
+    value = value.strip()
+    if required and not value:
+        errors.append(f'{key} is required')
+    elif limit and len(value) > limit:
+        errors.append(f'{key} is longer than {limit} characters')
+    return value or None
+
+def validate(row):
+    """Column values for one uploaded row and a list of its problems"""
+    errors = []
+    values = {
+        'sku': _text(row, 'sku', errors, required=True, limit=100),
+        'name': _text(row, 'name', errors, required=True, limit=200),
+        'description': _text(row, 'description', errors),
+        'category': _text(row, 'category', errors, required=True, limit=100),
+        'image_url': _text(row, 'imageUrl', errors, limit=500),
+    }
+    price = row.get('price')
+    try:
+        if price is None or price == '' or isinstance(price, bool):
+            raise InvalidOperation
+        values['price'] = Decimal(str(price).strip()).quantize(Decimal('0.01'))
+        if not 0 <= values['price'] <= MAX_PRICE:
+            errors.append('price is out of range')
+    except (InvalidOperation, ValueError):
+        errors.append('price must be a number')
+    stock = row.get('stock')
+    try:
+        if isinstance(stock, bool) or isinstance(stock, float) and not stock.is_integer():
+            raise ValueError
+        values['stock'] = int(stock.strip() if isinstance(stock, str) else stock)
+        if values['stock'] < 0:
+            errors.append('stock cannot be negative')
+    except (TypeError, ValueError):
+        errors.append('stock must be a whole number')
+    return values, errors
+
+class ImportReport:
+    def __init__(self, max_errors):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self.categories = set()
+
+    def fail(self, line, sku, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'sku': sku, 'errors': errors})
+
+    def counts(self):
+        return {'row_count': self.rows, 'created_count': self.created,
+                'updated_count': self.updated, 'failed_count': self.failed}
+
+    def to_dict(self):
+        return {'rows': self.rows, 'created': self.created, 'updated': self.updated,
+                'failed': self.failed, 'errors': self.errors,
+                'errorsTruncated': self.failed > len(self.errors)}
+
+class ProductImporter:
+    """Runs product imports inline or on a small dedicated pool.
+
+    Background jobs are tracked in ProductImport rows; a job still queued
+    when the pool shuts down is marked failed rather than left queued, and
+    one whose process died is failed by the heartbeat of any other.
+    """
+
+    def __init__(self, app=None):
+        self.workers = 1
+        self.chunk_size = 500
+        self.sync_rows = 1000
+        self.max_errors = 1000
+        self.heartbeat_interval = 30
+        self.stale_after = 300
+        self._app = None
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = app.config.get('PRODUCT_IMPORT_WORKERS', 1)
+        self.chunk_size = app.config.get('PRODUCT_IMPORT_CHUNK_SIZE', 500)
+        self.sync_rows = app.config.get('PRODUCT_IMPORT_SYNC_ROWS', 1000)
+        self.max_errors = app.config.get('PRODUCT_IMPORT_MAX_ERRORS', 1000)
+        self.heartbeat_interval = app.config.get('PRODUCT_IMPORT_HEARTBEAT_INTERVAL', 30)
+        self.stale_after = app.config.get('PRODUCT_IMPORT_STALE_AFTER', 300)
+        # Called again after fork, where background.restart_after_fork
+        # restarts the heartbeat
+        first = app.extensions.get('product_importer') is not self
+        self._app = app
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix='product-import')
+        with self._lock:
+            self._pending = {}
+        app.extensions['product_importer'] = self
+        if first and self.stale_after > 0:
+            start_periodic(app, 'product-import-heartbeat', self.heartbeat_interval, self.heartbeat)
+
+    def shutdown(self):
+        """Finish running imports, fail the ones still queued and stop the pool"""
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+        with self._lock:
+            cancelled = [job_id for job_id, (future, _) in self._pending.items() if future.cancelled()]
+            self._pending = {}
+        if cancelled:
+            with self._app.app_context():
+                ProductImport.query.filter(ProductImport.id.in_(cancelled)).update({
+                    'status': 'failed', 'message': 'Server shut down before the import started',
+                    'finished_at': datetime.utcnow()
+                }, synchronize_session=False)
+                db.session.commit()
+
+    def spool(self, stream):
+        """Copy an upload to a temporary file; returns (path, line count)"""
+        fd, path = tempfile.mkstemp(prefix=SPOOL_PREFIX)
+        lines = 0
+        last = b'\n'
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(SPOOL_BYTES)
+                    if not chunk:
+                        break
+                    lines += chunk.count(b'\n')
+                    last = chunk[-1:]
+                    f.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return path, lines + (last != b'\n')
+
+    def run(self, fileobj, fmt, seller_id, progress=None):
+        """Import every row of `fileobj` for a seller; returns an ImportReport.
+
+        `progress(report)` is called after each committed chunk.
+        """
+        report = ImportReport(self.max_errors)
+        seen = set()
+        chunk = []
+        try:
+            for line, row, error in parse_rows(fileobj, fmt):
+                report.rows += 1
+                if error:
+                    report.fail(line, None, [error])
+                    continue
+                values, errors = validate(row)
+                sku = values['sku']
+                if not errors and sku in seen:
+                    # Only the first row for a sku is imported, whether or not
+                    # the database accepts it
+                    errors = [f"Duplicate sku '{sku}': only its first row in the upload is imported"]
+                if errors:
+                    report.fail(line, sku, errors)
+                    continue
+                seen.add(sku)
+                chunk.append((line, values))
+                if len(chunk) >= self.chunk_size:
+                    self._write(chunk, seller_id, report)
+                    chunk = []
+                    if progress:
+                        progress(report)
+            if chunk:
+                self._write(chunk, seller_id, report)
+        except UnicodeDecodeError:
+            raise InvalidImport(f'Upload is not UTF-8 (after line {report.rows})')
+        finally:
+            # Whatever was committed before a failure is live
+            if report.categories:
+                catalog_cache.invalidate_categories(report.categories)
+                catalog_cache.invalidate_category_list()
+        return report
+
+    def _write(self, chunk, seller_id, report):
+        existing = {sku: (category, reserved) for sku, category, reserved in db.session.query(
+            Product.sku, Product.category, Product.reserved
+        ).filter(
+            Product.seller_id == seller_id, Product.sku.in_([values['sku'] for _, values in chunk])
+        )}
+        table = Product.__table__
+        insert = _insert()(table)
+        # Stock may not drop below the units held in carts; rows the WHERE
+        # skips return nothing, so RETURNING tells which rows were written.
+        # One chunk is one statement
+        statement = insert.on_conflict_do_update(
+            index_elements=['seller_id', 'sku'],
+            set_={
+                column: func.coalesce(insert.excluded[column], table.c[column])
+                if column in OPTIONAL_COLUMNS else insert.excluded[column]
+                for column in UPDATE_COLUMNS
+            },
+            where=insert.excluded.stock >= table.c.reserved
+        ).returning(table.c.sku).execution_options(insertmanyvalues_page_size=max(self.chunk_size, 1))
+        rows = [dict(values, id=new_id(), seller_id=seller_id) for _, values in chunk]
+        written, short = [], []
+        try:
+            skus = set(db.session.execute(statement, rows).scalars())
+            db.session.commit()
+            for line, values in chunk:
+                (written if values['sku'] in skus else short).append((line, values))
+        except SQLAlchemyError:
+            # Retry one row at a time to find the ones the database refuses
+            db.session.rollback()
+            for (line, values), row in zip(chunk, rows):
+                try:
+                    applied = db.session.execute(statement, [row]).first()
+                    db.session.commit()
+                    (written if applied else short).append((line, values))
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    report.fail(line, values['sku'], [str(getattr(e, 'orig', e))])
+        for line, values in short:
+            # Unknown when another import created the sku meanwhile
+            held = f"{existing[values['sku']][1]} units" if values['sku'] in existing else 'units'
+            report.fail(line, values['sku'], [f'Stock would fall below the {held} held in carts'])
+        for _, values in written:
+            if values['sku'] in existing:
+                report.updated += 1
+                report.categories.add(existing[values['sku']][0])
+            else:
+                report.created += 1
+            report.categories.add(values['category'])
+
+    def submit(self, job_id, path, fmt, seller_id):
+        """Import a spooled upload in the background; the file is removed after"""
+        future = self._executor.submit(self._run_job, job_id, path, fmt, seller_id)
+        with self._lock:
+            self._pending[job_id] = (future, path)
+        future.add_done_callback(lambda _: self._done(job_id, path))
+
+    def _done(self, job_id, path):
+        with self._lock:
+            self._pending.pop(job_id, None)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def heartbeat(self):
+        """Refresh this process's jobs, then fail and clean up abandoned ones"""
+        now = datetime.utcnow()
+        with self._lock:
+            pending = dict(self._pending)
+        if pending:
+            ProductImport.query.filter(
+                ProductImport.id.in_(list(pending)), ProductImport.status.in_(ACTIVE)
+            ).update({'heartbeat_at': now}, synchronize_session=False)
+            db.session.commit()
+            for _, path in pending.values():
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+        self.expire_stale(now)
+        self.remove_orphans()
+
+    def _stale(self, now):
+        if self.heartbeat_interval <= 0 or self.stale_after <= 0:
+            return None
+        return now - timedelta(seconds=self.stale_after)
+
+    def expire_stale(self, now=None):
+        """Fail queued or running jobs nobody has heartbeated; returns how many"""
+        now = now or datetime.utcnow()
+        cutoff = self._stale(now)
+        if cutoff is None:
+            return 0
+        count = ProductImport.query.filter(
+            ProductImport.status.in_(ACTIVE),
+            func.coalesce(ProductImport.heartbeat_at, ProductImport.created_at) < cutoff
+        ).update({'status': 'failed', 'message': ABANDONED, 'finished_at': now}, synchronize_session=False)
+        db.session.commit()
+        if count:
+            logger.warning('Failed %d abandoned product imports', count)
+        return count
+
+    def fail_if_stale(self, job):
+        """Fail `job` when its heartbeat stopped; True if it did"""
+        now = datetime.utcnow()
+        cutoff = self._stale(now)
+        if cutoff is None or job.status not in ACTIVE or (job.heartbeat_at or job.created_at) >= cutoff:
+            return False
+        job.status, job.message, job.finished_at = 'failed', ABANDONED, now
+        db.session.commit()
+        return True
+
+    def remove_orphans(self):
+        """Delete spooled uploads no live job has touched for STALE_AFTER seconds"""
+        cutoff = time.time() - self.stale_after
+        with os.scandir(tempfile.gettempdir()) as entries:
+            for entry in entries:
+                try:
+                    if entry.name.startswith(SPOOL_PREFIX) and entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                except OSError:
+                    pass
+
+    def _run_job(self, job_id, path, fmt, seller_id):
+        with self._app.app_context():
+            def update(**values):
+                values['heartbeat_at'] = datetime.utcnow()
+                ProductImport.query.filter_by(id=job_id).update(values, synchronize_session=False)
+                db.session.commit()
+
+            try:
+                update(status='running', started_at=datetime.utcnow())
+                with open(path, 'rb') as f:
+                    report = self.run(f, fmt, seller_id, progress=lambda r: update(**r.counts()))
+                update(status='completed', errors=json.dumps(report.errors), finished_at=datetime.utcnow(),
+                       **report.counts())
+            except InvalidImport as e:
+                db.session.rollback()
+                update(status='failed', message=str(e), finished_at=datetime.utcnow())
+            except Exception as e:
+                logger.exception('Product import %s failed', job_id)
+                db.session.rollback()
+                update(status='failed', message=f'Import failed: {e}', finished_at=datetime.utcnow())
+            finally:
+                db.session.remove()
+
+product_importer = ProductImporter()
@@ -0,0 +1,99 @@
+import re
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import event
+
+# SQL statement budgets. Routes declare how many statements a request may
+# run with @query_budget(n); metrics.py counts every request against it
+# (falling back to METRICS_QUERY_BUDGET), logs or, with
+# METRICS_QUERY_BUDGET_STRICT, fails requests over budget, and with
+# METRICS_QUERY_BUDGET_REPORT lists their statements grouped by shape.
+# count_queries() does the same around any block of code. Statements run
+# with the execution option budgeted=False (replica lag probes) are
+# housekeeping, not the route's work, and are not counted.
+
+class QueryBudgetExceeded(AssertionError):
+    def __init__(self, label, budget, statements):
+        self.label = label
+        self.budget = budget
+        self.statements = statements
+        super().__init__(f'{label} ran {len(statements)} SQL statements (budget {budget})\n{report(statements)}')
+
+def query_budget(limit):
+    """Declare the most statements one request to this view may run.
+
+    The budget is the worst case over every branch the view can take. Place
+    directly under the route decorator so the registered view carries the
+    budget. `limit` may be a callable when the worst case depends on
+    configuration.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+def budget_for(view, default=None):
+    limit = getattr(view, 'query_budget', default)
+    return limit() if callable(limit) else limit
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%\(\w+\)s|(?<!:):\w+|\$\d+'), '?'),
+    # Expanded IN lists of any length collapse to one shape
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+def normalize(statement):
+    """Statement with literals and bound parameters replaced by ?"""
+    for pattern, replacement in _LITERALS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+def report(statements):
+    """Statements grouped by normalized SQL, most repeated first.
+
+    A shape repeated once per row of an earlier result is the usual N+1.
+    """
+    groups = {}
+    for statement in statements:
+        shape = normalize(statement)
+        groups[shape] = groups.get(shape, 0) + 1
+    ordered = sorted(groups.items(), key=lambda item: -item[1])
+    return '\n'.join(f'  {count:>4} x {shape}' for shape, count in ordered)
+
+class QueryLog:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def report(self):
+        return report(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if context is None or context.execution_options.get('budgeted', True):
+            self.statements.append(statement)
+
+@contextmanager
+def count_queries(budget=None, label='block'):
+    """Record the statements run on the app's engines inside the block.
+
+    Yields a QueryLog; with a budget, raises QueryBudgetExceeded on exit
+    when the block ran more statements than that. Statements from every
+    thread are counted, so use it where nothing else is querying.
+    """
+    log = QueryLog()
+    engines = list(current_app.extensions['sqlalchemy'].engines.values())
+    for engine in engines:
+        event.listen(engine, 'after_cursor_execute', log._record)
+    try:
+        yield log
+    finally:
+        for engine in engines:
+            event.remove(engine, 'after_cursor_execute', log._record)
+    if budget is not None and log.count > budget:
+        raise QueryBudgetExceeded(label, budget, log.statements)
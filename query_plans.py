@@ -0,0 +1,81 @@
+from datetime import datetime
+import click
+from sqlalchemy import select
+from models import CartItem, Order, OrderItem, Product, Review, Seller, User, Withdrawal, db
+
+# Representative shapes of the hot route queries. The sample values only
+# have to be the right type; the point is which indexes the plan uses.
+SAMPLE_ID = '00000000-0000-0000-0000-000000000000'
+
+def _main_queries():
+    now = datetime.utcnow()
+    catalog = select(Product).join(Seller).where(Seller.status == 'approved')
+    return [
+        ('catalog by name', catalog.order_by(Product.name, Product.id).limit(21)),
+        ('catalog category by name', catalog.where(Product.category == 'paint').order_by(Product.name, Product.id).limit(21)),
+        ('catalog by price', catalog.order_by(Product.price, Product.id).limit(21)),
+        ('catalog newest', catalog.order_by(Product.created_at.desc(), Product.id.desc()).limit(21)),
+        ('seller products', select(Product).where(Product.seller_id == SAMPLE_ID)),
+        ('product reviews', select(Review).where(Review.product_id == SAMPLE_ID)),
+        ('cart', select(CartItem).where(CartItem.user_id == SAMPLE_ID)),
+        ('cart line', select(CartItem).where(CartItem.user_id == SAMPLE_ID, CartItem.product_id == SAMPLE_ID)),
+        ('expired holds', select(CartItem.id).where(CartItem.reserved_until < now, CartItem.reserved_quantity > 0)),
+        ('buyer orders', select(Order).where(Order.buyer_id == SAMPLE_ID).order_by(Order.created_at.desc(), Order.id.desc()).limit(21)),
+        ('seller orders', select(Order).where(Order.seller_id == SAMPLE_ID).order_by(Order.created_at.desc(), Order.id.desc()).limit(21)),
+        ('orders by status', select(Order).where(Order.status == 'pending').order_by(Order.created_at.desc(), Order.id.desc()).limit(21)),
+        ('order items', select(OrderItem).where(OrderItem.order_id.in_([SAMPLE_ID, SAMPLE_ID]))),
+        ('seller withdrawals', select(Withdrawal).where(Withdrawal.seller_id == SAMPLE_ID).order_by(Withdrawal.created_at.desc())),
+        ('pending withdrawals', select(Withdrawal).where(Withdrawal.status == 'pending').order_by(Withdrawal.created_at, Withdrawal.id).limit(21)),
+        ('pending sellers', select(Seller).where(Seller.status == 'pending').order_by(Seller.created_at, Seller.id).limit(21)),
+        ('users', select(User).order_by(User.created_at.desc(), User.id.desc()).limit(21)),
+        ('identity', select(User.role, Seller.id, Seller.status).outerjoin(Seller, Seller.user_id == User.id).where(User.id == SAMPLE_ID))
+    ]
+
+def explain(statement):
+    """The database's plan for statement, one line per plan node"""
+    conn = db.session.connection()
+    dialect = conn.dialect
+    compiled = statement.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.params
+    if compiled.positiontup is not None:
+        params = tuple(params[name] for name in compiled.positiontup)
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = conn.exec_driver_sql(prefix + compiled.string, params).all()
+    if dialect.name == 'sqlite':
+        return [row[-1] for row in rows]
+    return [' '.join(str(value) for value in row) for row in rows]
+
+def problems(plan):
+    """Full table scans and sorts that an index should have avoided"""
+    found = []
+    for line in plan:
+        text = line.strip()
+        if (text.startswith('SCAN ') and 'USING' not in text and 'VIRTUAL TABLE' not in text) or 'Seq Scan' in text:
+            found.append('full scan')
+        if 'TEMP B-TREE' in text or text.lstrip('-> ').startswith('Sort '):
+            found.append('sort')
+    return found
+
+def init_app(app):
+    @app.cli.command('explain-queries')
+    @click.option('--strict', is_flag=True, help='Exit non-zero if any plan scans or sorts a table.')
+    def explain_queries_command(strict):
+        """Print EXPLAIN plans for the main route queries.
+
+        Plans depend on table statistics, so judge them against analyzed,
+        production-sized data; on empty tables planners pick scans and sorts.
+        """
+        flagged = []
+        for name, statement in _main_queries():
+            plan = explain(statement)
+            issues = problems(plan)
+            print(f'== {name}' + (f"  [{', '.join(sorted(set(issues)))}]" if issues else ''))
+            for line in plan:
+                print(f'   {line}')
+            if issues:
+                flagged.append(name)
+        db.session.rollback()
+        if flagged:
+            print(f"{len(flagged)} queries scan or sort: {', '.join(flagged)}")
+            if strict:
+                raise SystemExit(1)
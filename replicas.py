@@ -0,0 +1,166 @@
+import itertools
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, text
+
+logger = logging.getLogger(__name__)
+
+# Read-only views marked with @replicas.read_only send their SELECTs to a
+# read replica (any SQLALCHEMY_BINDS key starting with 'replica'). Flushes,
+# DML and SELECT ... FOR UPDATE always go to the primary, as does every
+# request from a client that wrote within REPLICA_STICKY_SECONDS (tracked
+# with a cookie so it holds across workers) and every request while all
+# replicas lag more than REPLICA_MAX_LAG seconds.
+
+STICKY_COOKIE = 'db_primary_until'
+
+# Seconds behind the primary; an idle but caught-up standby reports 0
+_LAG_QUERIES = {
+    'postgresql': (
+        'SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 '
+        'WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+        'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+    ),
+}
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends plain SELECTs to the replica
+    chosen for the current request"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+            and has_app_context()
+        ):
+            replica = g.get('db_replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class ReplicaRouter:
+    def __init__(self):
+        self.enabled = False
+        self.keys = []
+        self.max_lag = 5.0
+        self.sticky_seconds = 10
+        self.check_interval = 2.0
+        self.lag_query = None
+        self._lag = {}
+        self._lag_lock = threading.Lock()
+        self._rotation = itertools.count()
+        self._stats = {'replica': 0, 'sticky': 0, 'lagging': 0, 'pinned': 0}
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.keys = sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith('replica'))
+        self.enabled = app.config.get('READ_REPLICAS_ENABLED', True) and bool(self.keys)
+        self.max_lag = app.config.get('REPLICA_MAX_LAG', 5.0)
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 10)
+        self.check_interval = app.config.get('REPLICA_LAG_CHECK_INTERVAL', 2.0)
+        self.lag_query = app.config.get('REPLICA_LAG_QUERY')
+        app.after_request(self._stick_after_write)
+        app.extensions['replicas'] = self
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._lag_lock:
+            stats['lag'] = {key: lag for key, (_, lag) in self._lag.items()}
+        stats['replicas'] = self.keys if self.enabled else []
+        return stats
+
+    def _stick_after_write(self, response):
+        if self.enabled and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(
+                STICKY_COOKIE,
+                f'{time.time() + self.sticky_seconds:.3f}',
+                max_age=math.ceil(self.sticky_seconds),
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    def _sticky(self):
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def lag(self, key):
+        """Replica lag in seconds, re-measured every REPLICA_LAG_CHECK_INTERVAL;
+        None when the replica could not be reached"""
+        now = time.monotonic()
+        with self._lag_lock:
+            checked_at, lag = self._lag.get(key, (None, None))
+            if checked_at is not None and now - checked_at < self.check_interval:
+                return lag
+            # Concurrent requests keep using the old reading while one probes
+            self._lag[key] = (now, lag)
+        engine = current_app.extensions['sqlalchemy'].engines[key]
+        query = self.lag_query or _LAG_QUERIES.get(engine.dialect.name)
+        try:
+            if query is None:
+                lag = 0.0
+            else:
+                # Not counted against the request's query budget
+                with engine.connect().execution_options(budgeted=False) as conn:
+                    lag = float(conn.execute(text(query)).scalar() or 0)
+        except Exception:
+            logger.exception('Replica lag check failed for %s', key)
+            lag = None
+        with self._lag_lock:
+            self._lag[key] = (now, lag)
+        return lag
+
+    def choose(self):
+        """Engine of a replica fit to serve this request, or None for the primary"""
+        if not self.enabled:
+            return None
+        if g.get('db_pinned'):
+            self._count('pinned')
+            return None
+        if self._sticky():
+            self._count('sticky')
+            return None
+        start = next(self._rotation)
+        for i in range(len(self.keys)):
+            key = self.keys[(start + i) % len(self.keys)]
+            lag = self.lag(key)
+            if lag is not None and lag <= self.max_lag:
+                self._count('replica')
+                return current_app.extensions['sqlalchemy'].engines[key]
+        self._count('lagging')
+        return None
+
+    @contextmanager
+    def primary(self):
+        """Serve reads inside the block from the primary"""
+        saved = g.get('db_pinned'), g.get('db_replica')
+        g.db_pinned, g.db_replica = True, None
+        try:
+            yield
+        finally:
+            g.db_pinned, g.db_replica = saved
+
+    def read_only(self, view):
+        """Route the view's reads to a replica when one is fit"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.db_replica = self.choose()
+            return view(*args, **kwargs)
+        return wrapper
+
+replicas = ReplicaRouter()
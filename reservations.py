@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, update
+from models import CartItem, Product, db
+from background import start_periodic
+
+# A cart line holds `reserved_quantity` units until `reserved_until`. Every
+# held unit is counted in Product.reserved, so availability is a single-row
+# read of stock - reserved. Expired holds stay counted until the sweeper
+# reclaims them, which keeps the counter and the cart lines consistent.
+
+def init_app(app):
+    """Register the sweeper command and start the background sweeper"""
+    @app.cli.command('sweep-holds')
+    def sweep_holds_command():
+        """Release expired cart stock holds."""
+        print(f'Released {sweep_expired()} expired holds')
+
+    start_periodic(
+        app,
+        'reservation-sweeper',
+        app.config.get('RESERVATION_SWEEP_INTERVAL', 60),
+        sweep_expired
+    )
+
+def hold_expiry():
+    return datetime.utcnow() + timedelta(seconds=current_app.config.get('RESERVATION_TTL', 900))
+
+def adjust_hold(product_id, delta):
+    """Change a product's reserved count by delta.
+
+    Growing a hold only succeeds while available-to-sell covers it; returns
+    False (and changes nothing) when the product is missing or short.
+    """
+    if delta == 0:
+        return True
+    statement = update(Product).where(Product.id == product_id)
+    if delta > 0:
+        statement = statement.where(Product.stock - Product.reserved >= delta)
+    result = db.session.execute(
+        statement.values(reserved=Product.reserved + delta)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def sweep_expired(now=None, batch_size=1000):
+    """Release expired holds in bulk; returns the number of cart lines freed"""
+    now = now or datetime.utcnow()
+    released = 0
+    while True:
+        rows = db.session.query(
+            CartItem.id, CartItem.product_id, CartItem.reserved_quantity
+        ).filter(
+            CartItem.reserved_until < now,
+            CartItem.reserved_quantity > 0
+        ).order_by(CartItem.id).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not rows:
+            break
+
+        by_product = {}
+        for row in rows:
+            by_product[row.product_id] = by_product.get(row.product_id, 0) + row.reserved_quantity
+
+        db.session.execute(
+            update(CartItem)
+            .where(CartItem.id.in_([row.id for row in rows]))
+            .values(reserved_quantity=0, reserved_until=None)
+            .execution_options(synchronize_session=False)
+        )
+        # Same lock order as checkout
+        db.session.query(Product.id).filter(
+            Product.id.in_(list(by_product))
+        ).order_by(Product.id).with_for_update().all()
+        db.session.execute(
+            update(Product)
+            .where(Product.id.in_(list(by_product)))
+            .values(reserved=Product.reserved - case(
+                *((Product.id == product_id, n) for product_id, n in by_product.items())
+            ))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        released += len(rows)
+        if len(rows) < batch_size:
+            break
+    return released
@@ -1,63 +1,78 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from models import User, Seller, Withdrawal, Order, Product, db
-from auth import get_current_user
+from auth import get_current_identity, invalidate_identity
 from datetime import datetime
 from sqlalchemy import func
+from cache import catalog_cache
+from ledger import record_withdrawal_status
+from pagination import InvalidCursor, keyset_paginate, paginate_request, wants_cursor
+from replicas import replicas
+from serializers import SELLER, USER, WITHDRAWAL, InvalidFields, encode_orders, order_projections, sparse
+from admin_metrics import get_metrics, get_order_category_counts
+from query_budget import query_budget
+from exports import filter_export, flat_columns, order_columns, order_records, projection_records, stream_export
 
 admin_bp = Blueprint('admin', __name__)
 
+def seller_categories(seller_id):
+    """Categories a seller's products are listed under"""
+    rows = db.session.query(Product.category).filter_by(seller_id=seller_id).distinct().all()
+    return [row[0] for row in rows]
+
 @admin_bp.route('/dashboard', methods=['GET'])
+@query_budget(4)
 @jwt_required()
+@replicas.read_only
 def get_admin_dashboard():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'admin':
             return jsonify({'message': 'Unauthorized'}), 403
         
-        # Platform metrics
-        total_users = User.query.count()
-        total_sellers = Seller.query.count()
-        active_sellers = Seller.query.filter_by(status='approved').count()
-        pending_sellers = Seller.query.filter_by(status='pending').count()
-        
-        total_products = Product.query.count()
-        total_orders = Order.query.count()
-        
-        # Revenue metrics
-        total_sales = db.session.query(func.sum(Order.total_price)).filter(Order.status != 'cancelled').scalar() or 0
-        processed_withdrawals = Withdrawal.query.filter_by(status='processed').all()
-        platform_revenue = sum(float(w.amount_requested) * 0.07 for w in processed_withdrawals)
-        
-        # Pending approvals
-        pending_seller_applications = Seller.query.filter_by(status='pending').all()
-        pending_withdrawal_requests = Withdrawal.query.filter_by(status='pending').all()
+        # Platform metrics from the periodically refreshed snapshot
+        metrics, computed_at = get_metrics(fresh=request.args.get('fresh') == '1')
+        
+        # Pending approvals, oldest first, capped and cursor-paginated
+        pending_limit = request.args.get('pending_limit', 20, type=int)
+        seller_projection = sparse(SELLER, main=False)
+        withdrawal_projection = sparse(WITHDRAWAL, main=False)
+        pending_sellers = keyset_paginate(
+            seller_projection.query(Seller.query.filter_by(status='pending')),
+            [(Seller.created_at, False), (Seller.id, False)],
+            request.args.get('sellers_cursor'),
+            pending_limit
+        )
+        pending_withdrawals = keyset_paginate(
+            withdrawal_projection.query(Withdrawal.query.filter_by(status='pending')),
+            [(Withdrawal.created_at, False), (Withdrawal.id, False)],
+            request.args.get('withdrawals_cursor'),
+            pending_limit
+        )
         
         return jsonify({
-            'metrics': {
-                'totalUsers': total_users,
-                'totalSellers': total_sellers,
-                'activeSellers': active_sellers,
-                'pendingSellers': pending_sellers,
-                'totalProducts': total_products,
-                'totalOrders': total_orders,
-                'totalSales': float(total_sales),
-                'platformRevenue': platform_revenue
-            },
+            'metrics': metrics,
+            'metricsComputedAt': computed_at.isoformat(),
             'pendingApprovals': {
-                'sellers': [seller.to_dict() for seller in pending_seller_applications],
-                'withdrawals': [withdrawal.to_dict() for withdrawal in pending_withdrawal_requests]
+                'sellers': seller_projection.encode_all(pending_sellers.items),
+                'withdrawals': withdrawal_projection.encode_all(pending_withdrawals.items),
+                'sellersNextCursor': pending_sellers.next_cursor,
+                'withdrawalsNextCursor': pending_withdrawals.next_cursor
             }
         }), 200
         
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @admin_bp.route('/sellers', methods=['GET'])
+@query_budget(3)
 @jwt_required()
+@replicas.read_only
 def get_all_sellers():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'admin':
             return jsonify({'message': 'Unauthorized'}), 403
         
@@ -70,6 +85,17 @@ def get_all_sellers():
         if status:
             query = query.filter(Seller.status == status)
         
+        projection = sparse(SELLER)
+        query = projection.query(query)
+        
+        if wants_cursor():
+            result = paginate_request(query, [(Seller.created_at, True), (Seller.id, True)], per_page)
+            return jsonify({
+                'sellers': projection.encode_all(result.items),
+                'next_cursor': result.next_cursor,
+                'total': result.total
+            }), 200
+        
         sellers = query.paginate(
             page=page,
             per_page=per_page,
@@ -77,20 +103,23 @@ def get_all_sellers():
         )
         
         return jsonify({
-            'sellers': [seller.to_dict() for seller in sellers.items],
+            'sellers': projection.encode_all(sellers.items),
             'total': sellers.total,
             'pages': sellers.pages,
             'current_page': page
         }), 200
         
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @admin_bp.route('/sellers/<seller_id>/approve', methods=['PUT'])
+@query_budget(5)
 @jwt_required()
 def approve_seller(seller_id):
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'admin':
             return jsonify({'message': 'Unauthorized'}), 403
         
@@ -103,6 +132,9 @@ def approve_seller(seller_id):
         
         db.session.commit()
         
+        invalidate_identity(seller.user_id)
+        catalog_cache.invalidate_categories(seller_categories(seller.id))
+        
         return jsonify({
             'message': 'Seller approved successfully',
             'seller': seller.to_dict()
@@ -113,10 +145,11 @@ def approve_seller(seller_id):
         return jsonify({'message': str(e)}), 500
 
 @admin_bp.route('/sellers/<seller_id>/reject', methods=['PUT'])
+@query_budget(5)
 @jwt_required()
 def reject_seller(seller_id):
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'admin':
             return jsonify({'message': 'Unauthorized'}), 403
         
@@ -128,6 +161,9 @@ def reject_seller(seller_id):
         
         db.session.commit()
         
+        invalidate_identity(seller.user_id)
+        catalog_cache.invalidate_categories(seller_categories(seller.id))
+        
         return jsonify({
             'message': 'Seller rejected',
             'seller': seller.to_dict()
@@ -138,10 +174,12 @@ def reject_seller(seller_id):
         return jsonify({'message': str(e)}), 500
 
 @admin_bp.route('/withdrawals', methods=['GET'])
+@query_budget(3)
 @jwt_required()
+@replicas.read_only
 def get_all_withdrawals():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'admin':
             return jsonify({'message': 'Unauthorized'}), 403
         
@@ -154,6 +192,17 @@ def get_all_withdrawals():
         if status:
             query = query.filter(Withdrawal.status == status)
         
+        projection = sparse(WITHDRAWAL)
+        query = projection.query(query)
+        
+        if wants_cursor():
+            result = paginate_request(query, [(Withdrawal.created_at, True), (Withdrawal.id, True)], per_page)
+            return jsonify({
+                'withdrawals': projection.encode_all(result.items),
+                'next_cursor': result.next_cursor,
+                'total': result.total
+            }), 200
+        
         withdrawals = query.order_by(Withdrawal.created_at.desc()).paginate(
             page=page,
             per_page=per_page,
@@ -161,35 +210,40 @@ def get_all_withdrawals():
         )
         
         return jsonify({
-            'withdrawals': [withdrawal.to_dict() for withdrawal in withdrawals.items],
+            'withdrawals': projection.encode_all(withdrawals.items),
             'total': withdrawals.total,
             'pages': withdrawals.pages,
             'current_page': page
         }), 200
         
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @admin_bp.route('/withdrawals/<withdrawal_id>/process', methods=['PUT'])
+@query_budget(6)
 @jwt_required()
 def process_withdrawal(withdrawal_id):
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'admin':
             return jsonify({'message': 'Unauthorized'}), 403
         
-        withdrawal = Withdrawal.query.get(withdrawal_id)
+        withdrawal = Withdrawal.query.filter_by(id=withdrawal_id).with_for_update().first()
         if not withdrawal:
             return jsonify({'message': 'Withdrawal not found'}), 404
         
         data = request.get_json()
         
+        old_status = withdrawal.status
         withdrawal.status = 'processed'
         withdrawal.processed_at = datetime.utcnow()
         
         if 'transactionId' in data:
             withdrawal.transaction_id = data['transactionId']
         
+        record_withdrawal_status(withdrawal, old_status)
         db.session.commit()
         
         return jsonify({
@@ -202,20 +256,23 @@ def process_withdrawal(withdrawal_id):
         return jsonify({'message': str(e)}), 500
 
 @admin_bp.route('/withdrawals/<withdrawal_id>/reject', methods=['PUT'])
+@query_budget(6)
 @jwt_required()
 def reject_withdrawal(withdrawal_id):
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'admin':
             return jsonify({'message': 'Unauthorized'}), 403
         
-        withdrawal = Withdrawal.query.get(withdrawal_id)
+        withdrawal = Withdrawal.query.filter_by(id=withdrawal_id).with_for_update().first()
         if not withdrawal:
             return jsonify({'message': 'Withdrawal not found'}), 404
         
+        old_status = withdrawal.status
         withdrawal.status = 'rejected'
         withdrawal.processed_at = datetime.utcnow()
         
+        record_withdrawal_status(withdrawal, old_status)
         db.session.commit()
         
         return jsonify({
@@ -228,10 +285,12 @@ def reject_withdrawal(withdrawal_id):
         return jsonify({'message': str(e)}), 500
 
 @admin_bp.route('/users', methods=['GET'])
+@query_budget(3)
 @jwt_required()
+@replicas.read_only
 def get_all_users():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'admin':
             return jsonify({'message': 'Unauthorized'}), 403
         
@@ -244,6 +303,17 @@ def get_all_users():
         if role:
             query = query.filter(User.role == role)
         
+        projection = sparse(USER)
+        query = projection.query(query)
+        
+        if wants_cursor():
+            result = paginate_request(query, [(User.created_at, True), (User.id, True)], per_page)
+            return jsonify({
+                'users': projection.encode_all(result.items),
+                'next_cursor': result.next_cursor,
+                'total': result.total
+            }), 200
+        
         users = query.order_by(User.created_at.desc()).paginate(
             page=page,
             per_page=per_page,
@@ -251,20 +321,24 @@ def get_all_users():
         )
         
         return jsonify({
-            'users': [user.to_dict() for user in users.items],
+            'users': projection.encode_all(users.items),
             'total': users.total,
             'pages': users.pages,
             'current_page': page
         }), 200
         
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @admin_bp.route('/orders', methods=['GET'])
+@query_budget(6)
 @jwt_required()
+@replicas.read_only
 def get_all_orders():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'admin':
             return jsonify({'message': 'Unauthorized'}), 403
         
@@ -299,37 +373,93 @@ def get_all_orders():
                 # Cancelled orders
                 query = query.filter(Order.status == 'cancelled')
         
+        # Category counters are cached apart from the page data
+        categories = get_order_category_counts()
+        
+        order, items, products = order_projections()
+        query = order.query(query)
+        
+        if wants_cursor():
+            result = paginate_request(query, [(Order.created_at, True), (Order.id, True)], per_page)
+            return jsonify({
+                'orders': encode_orders(result.items, order, items, products),
+                'next_cursor': result.next_cursor,
+                'total': result.total,
+                'categories': categories
+            }), 200
+        
         orders = query.order_by(Order.created_at.desc()).paginate(
             page=page,
             per_page=per_page,
             error_out=False
         )
         
-        # Calculate order statistics by category
-        total_orders = Order.query.count()
-        pending_orders = Order.query.filter(Order.status.in_(['pending', 'processing'])).count()
-        completed_orders = Order.query.filter_by(status='delivered').count()
-        cancelled_orders = Order.query.filter_by(status='cancelled').count()
-        
-        from datetime import datetime, timedelta
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        recent_orders = Order.query.filter(Order.created_at >= week_ago).count()
-        high_value_orders = Order.query.filter(Order.total_price > 100).count()
-        
         return jsonify({
-            'orders': [order.to_dict() for order in orders.items],
+            'orders': encode_orders(orders.items, order, items, products),
             'total': orders.total,
             'pages': orders.pages,
             'current_page': page,
-            'categories': {
-                'total': total_orders,
-                'recent': recent_orders,
-                'high_value': high_value_orders,
-                'pending_fulfillment': pending_orders,
-                'completed': completed_orders,
-                'cancelled': cancelled_orders
-            }
+            'categories': categories
         }), 200
         
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+# Streamed exports; the budgets cover the statements run before streaming
+# starts, the export itself is one query
+
+@admin_bp.route('/exports/orders', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+@replicas.read_only
+def export_orders():
+    try:
+        user = get_current_identity()
+        if not user or user.role != 'admin':
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        query = filter_export(Order.query, Order)
+        return stream_export('orders', order_records(query), *order_columns())
+        
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@admin_bp.route('/exports/withdrawals', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+@replicas.read_only
+def export_withdrawals():
+    try:
+        user = get_current_identity()
+        if not user or user.role != 'admin':
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        query = filter_export(Withdrawal.query, Withdrawal)
+        return stream_export('withdrawals', projection_records(WITHDRAWAL, query), *flat_columns(WITHDRAWAL))
+        
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@admin_bp.route('/exports/users', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+@replicas.read_only
+def export_users():
+    try:
+        user = get_current_identity()
+        if not user or user.role != 'admin':
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        query = filter_export(User.query, User, status_arg='role', status_column=User.role)
+        return stream_export('users', projection_records(USER, query), *flat_columns(USER))
+        
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
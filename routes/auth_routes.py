@@ -1,12 +1,17 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import User, Seller, db
-from auth import hash_password, authenticate_user, get_current_user
+from auth import hash_password, authenticate_user, get_current_user, invalidate_identity
+from passwords import HasherBusy
+from throttle import throttle, by_ip, by_json_field
 import re
+from query_budget import query_budget
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST'])
+@query_budget(6)
+@throttle.limit('register-ip', by_ip, '10/hour')
 def register():
     try:
         data = request.get_json()
@@ -53,11 +58,17 @@ def register():
             'user': user.to_dict()
         }), 201
         
+    except HasherBusy:
+        db.session.rollback()
+        return jsonify({'message': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@query_budget(2)
+@throttle.limit('login-ip', by_ip, '30/minute')
+@throttle.limit('login-username', by_json_field('username'), '10/minute')
 def login():
     try:
         data = request.get_json()
@@ -75,10 +86,13 @@ def login():
         else:
             return jsonify({'message': 'Invalid credentials'}), 401
             
+    except HasherBusy:
+        return jsonify({'message': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @auth_bp.route('/me', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def get_profile():
     try:
@@ -98,6 +112,7 @@ def get_profile():
         return jsonify({'message': str(e)}), 500
 
 @auth_bp.route('/profile', methods=['PUT'])
+@query_budget(3)
 @jwt_required()
 def update_profile():
     try:
@@ -116,6 +131,7 @@ def update_profile():
             user.address = data['address']
         
         db.session.commit()
+        invalidate_identity(user.id)
         
         return jsonify({
             'message': 'Profile updated successfully',
@@ -1,33 +1,49 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-from models import Order, OrderItem, Product, CartItem, Seller, db
-from auth import get_current_user
-from datetime import datetime
+from models import Order, OrderItem, Product, CartItem, db
+from auth import get_current_identity
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+from cache import catalog_cache
+from reservations import adjust_hold, hold_expiry
+from pagination import InvalidCursor, paginate_request, parse_date_arg
+from ledger import record_order_status, record_orders_placed
+from admin_metrics import invalidate_order_counts
+from serializers import CART_ITEM, ORDER, PRODUCT, InvalidFields, embeds, encode_cart, encode_orders, order_projections, sparse
+from query_budget import query_budget
 
 order_bp = Blueprint('orders', __name__)
 
 @order_bp.route('/cart', methods=['GET'])
+@query_budget(3)
 @jwt_required()
 def get_cart():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user:
             return jsonify({'message': 'Unauthorized'}), 403
         
-        cart_items = CartItem.query.filter_by(user_id=user.id).all()
+        cart = sparse(CART_ITEM)
+        products = sparse(PRODUCT, main=False) if 'product' in embeds(('product',), ('product',)) else None
+        cart_items = cart.query(CartItem.query.filter_by(user_id=user.id), CartItem.product_id).all()
         
         return jsonify({
-            'items': [item.to_dict() for item in cart_items]
+            'items': encode_cart(cart_items, cart, products)
         }), 200
         
+    except InvalidFields as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @order_bp.route('/cart', methods=['POST'])
+@query_budget(4)
 @jwt_required()
 def add_to_cart():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user:
             return jsonify({'message': 'Unauthorized'}), 403
         
@@ -36,58 +52,79 @@ def add_to_cart():
         if not all(k in data for k in ('productId', 'quantity')):
             return jsonify({'message': 'Missing required fields'}), 400
         
-        product = Product.query.get(data['productId'])
-        if not product:
-            return jsonify({'message': 'Product not found'}), 404
-        
-        if product.stock < data['quantity']:
-            return jsonify({'message': 'Insufficient stock'}), 400
+        # bool is an int subclass; true must not add one unit
+        if isinstance(data['quantity'], bool) or not isinstance(data['quantity'], int) or data['quantity'] <= 0:
+            return jsonify({'message': 'Invalid quantity'}), 400
         
         # Check if item already in cart
         existing_item = CartItem.query.filter_by(
             user_id=user.id,
             product_id=data['productId']
-        ).first()
+        ).with_for_update().first()
+        
+        # Hold stock for the whole line; units it still holds are counted
+        # already, so only the difference has to be available
+        quantity = data['quantity'] + (existing_item.quantity if existing_item else 0)
+        held = existing_item.reserved_quantity if existing_item else 0
+        if not adjust_hold(data['productId'], quantity - held):
+            db.session.rollback()
+            if not db.session.get(Product, data['productId']):
+                return jsonify({'message': 'Product not found'}), 404
+            return jsonify({'message': 'Insufficient stock'}), 400
         
         if existing_item:
-            existing_item.quantity += data['quantity']
+            existing_item.quantity = quantity
         else:
-            cart_item = CartItem(
+            existing_item = CartItem(
                 user_id=user.id,
                 product_id=data['productId'],
-                quantity=data['quantity']
+                quantity=quantity
             )
-            db.session.add(cart_item)
+            db.session.add(existing_item)
+        existing_item.reserved_quantity = quantity
+        existing_item.reserved_until = hold_expiry()
         
         db.session.commit()
         
         return jsonify({'message': 'Item added to cart'}), 200
         
+    except IntegrityError:
+        # A concurrent request created the same cart line first
+        db.session.rollback()
+        return jsonify({'message': 'Cart was updated concurrently, please retry'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
 @order_bp.route('/cart/<item_id>', methods=['PUT'])
+@query_budget(4)
 @jwt_required()
 def update_cart_item(item_id):
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user:
             return jsonify({'message': 'Unauthorized'}), 403
         
-        cart_item = CartItem.query.filter_by(id=item_id, user_id=user.id).first()
+        cart_item = CartItem.query.filter_by(id=item_id, user_id=user.id).with_for_update().first()
         if not cart_item:
             return jsonify({'message': 'Cart item not found'}), 404
         
         data = request.get_json()
         
         if 'quantity' in data:
+            if isinstance(data['quantity'], bool) or not isinstance(data['quantity'], int):
+                db.session.rollback()
+                return jsonify({'message': 'Invalid quantity'}), 400
             if data['quantity'] <= 0:
+                adjust_hold(cart_item.product_id, -cart_item.reserved_quantity)
                 db.session.delete(cart_item)
             else:
-                if cart_item.product.stock < data['quantity']:
+                if not adjust_hold(cart_item.product_id, data['quantity'] - cart_item.reserved_quantity):
+                    db.session.rollback()
                     return jsonify({'message': 'Insufficient stock'}), 400
                 cart_item.quantity = data['quantity']
+                cart_item.reserved_quantity = data['quantity']
+                cart_item.reserved_until = hold_expiry()
         
         db.session.commit()
         
@@ -98,17 +135,19 @@ def update_cart_item(item_id):
         return jsonify({'message': str(e)}), 500
 
 @order_bp.route('/cart/<item_id>', methods=['DELETE'])
+@query_budget(4)
 @jwt_required()
 def remove_from_cart(item_id):
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user:
             return jsonify({'message': 'Unauthorized'}), 403
         
-        cart_item = CartItem.query.filter_by(id=item_id, user_id=user.id).first()
+        cart_item = CartItem.query.filter_by(id=item_id, user_id=user.id).with_for_update().first()
         if not cart_item:
             return jsonify({'message': 'Cart item not found'}), 404
         
+        adjust_hold(cart_item.product_id, -cart_item.reserved_quantity)
         db.session.delete(cart_item)
         db.session.commit()
         
@@ -119,10 +158,11 @@ def remove_from_cart(item_id):
         return jsonify({'message': str(e)}), 500
 
 @order_bp.route('/checkout', methods=['POST'])
+@query_budget(7)
 @jwt_required()
 def checkout():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user:
             return jsonify({'message': 'Unauthorized'}), 403
         
@@ -131,140 +171,225 @@ def checkout():
         if not all(k in data for k in ('shippingAddress', 'method')):
             return jsonify({'message': 'Missing required fields'}), 400
         
-        cart_items = CartItem.query.filter_by(user_id=user.id).all()
-        if not cart_items:
+        # Cart and products in one round trip. Rows are locked in product id
+        # order so concurrent checkouts over overlapping carts cannot deadlock,
+        # and the cart lines are locked against the hold sweeper.
+        rows = db.session.query(CartItem, Product).join(
+            Product, CartItem.product_id == Product.id
+        ).filter(
+            CartItem.user_id == user.id
+        ).order_by(Product.id).with_for_update(of=[CartItem, Product]).all()
+        if not rows:
             return jsonify({'message': 'Cart is empty'}), 400
         
-        # Group cart items by seller
+        quantities = {}
+        held = {}
+        products = {}
+        for item, product in rows:
+            quantities[product.id] = quantities.get(product.id, 0) + item.quantity
+            held[product.id] = held.get(product.id, 0) + item.reserved_quantity
+            products[product.id] = product
+        
+        # Convert holds to sales and decrement every product in a single
+        # conditional UPDATE. Held units are already excluded from other
+        # carts, so a fully held line always passes; unheld units must still
+        # be available. A short row count fails the whole checkout.
+        # Explicit comparisons so the ids are bound through the column type
+        quantity = case(*((Product.id == product_id, n) for product_id, n in quantities.items()))
+        released = case(*((Product.id == product_id, n) for product_id, n in held.items()))
+        result = db.session.execute(
+            update(Product)
+            .where(
+                Product.id.in_(list(quantities)),
+                Product.stock - Product.reserved + released >= quantity
+            )
+            .values(stock=Product.stock - quantity, reserved=Product.reserved - released)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(quantities):
+            db.session.rollback()
+            current = db.session.query(Product.id, Product.name, Product.stock, Product.reserved).filter(
+                Product.id.in_(list(quantities))
+            ).order_by(Product.id).all()
+            name = next(
+                (row.name for row in current if row.stock - row.reserved + held[row.id] < quantities[row.id]),
+                current[0].name if current else 'product'
+            )
+            return jsonify({
+                'message': f'Insufficient stock for {name}'
+            }), 400
+        
+        for product_id, product in products.items():
+            set_committed_value(product, 'stock', product.stock - quantities[product_id])
+            set_committed_value(product, 'reserved', product.reserved - held[product_id])
+        
+        # Group cart items by seller, one order each
         orders_by_seller = {}
-        for item in cart_items:
-            seller_id = item.product.seller_id
-            if seller_id not in orders_by_seller:
-                orders_by_seller[seller_id] = []
-            orders_by_seller[seller_id].append(item)
+        for item, product in rows:
+            orders_by_seller.setdefault(product.seller_id, []).append((item, product))
         
         created_orders = []
-        
-        # Create separate orders for each seller
         for seller_id, items in orders_by_seller.items():
-            total_price = sum(item.quantity * item.product.price for item in items)
-            
             order = Order(
                 buyer_id=user.id,
                 seller_id=seller_id,
-                total_price=total_price,
+                total_price=sum(item.quantity * product.price for item, product in items),
                 shipping_address=data['shippingAddress'],
                 method=data['method']
             )
-            
-            db.session.add(order)
-            db.session.flush()  # Get order ID
-            
-            # Create order items
-            for item in items:
-                # Check stock again
-                if item.product.stock < item.quantity:
-                    db.session.rollback()
-                    return jsonify({
-                        'message': f'Insufficient stock for {item.product.name}'
-                    }), 400
-                
-                order_item = OrderItem(
-                    order_id=order.id,
-                    product_id=item.product_id,
+            order.order_items = [
+                OrderItem(
+                    product_id=product.id,
                     quantity=item.quantity,
-                    price=item.product.price
+                    price=product.price,
+                    product=product
                 )
-                db.session.add(order_item)
-                
-                # Update product stock
-                item.product.stock -= item.quantity
-                
-                # Remove from cart
-                db.session.delete(item)
-            
+                for item, product in items
+            ]
             created_orders.append(order)
         
+        # Client-side id defaults let the flush batch each table into one executemany
+        db.session.add_all(created_orders)
+        db.session.flush()
+        record_orders_placed(created_orders)
+        
+        db.session.execute(
+            delete(CartItem)
+            .where(CartItem.id.in_([item.id for item, _ in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        
+        # Serialize before commit expires the new rows
+        response_orders = [order.to_dict() for order in created_orders]
+        categories = {product.category for product in products.values()}
         db.session.commit()
         
+        catalog_cache.invalidate_categories(categories)
+        invalidate_order_counts()
+        
         return jsonify({
             'message': 'Orders created successfully',
-            'orders': [order.to_dict() for order in created_orders]
+            'orders': response_orders
         }), 201
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
+def order_summary(rows):
+    """{count, totalPrice, statuses} from (status, count, total) rows"""
+    return {
+        'count': sum(count for _, count, _ in rows),
+        'totalPrice': float(sum(total for _, _, total in rows)),
+        'statuses': {status: count for status, count, _ in rows}
+    }
+
 @order_bp.route('/', methods=['GET'])
+@query_budget(6)
 @jwt_required()
 def get_orders():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user:
             return jsonify({'message': 'Unauthorized'}), 403
         
+        per_page = request.args.get('per_page', 20, type=int)
+        status = request.args.get('status')
+        # ?items=summary is the older spelling of embed=items
+        default_embed = ('items',) if request.args.get('items') == 'summary' else ('items', 'items.product')
+        order, items, products = order_projections(default_embed)
+        
+        query = Order.query
         if user.role == 'buyer':
-            orders = Order.query.filter_by(buyer_id=user.id).order_by(Order.created_at.desc()).all()
+            query = query.filter(Order.buyer_id == user.id)
         elif user.role == 'seller':
-            seller = Seller.query.filter_by(user_id=user.id).first()
-            if not seller:
-                return jsonify({'orders': []}), 200
-            orders = Order.query.filter_by(seller_id=seller.id).order_by(Order.created_at.desc()).all()
-        else:
-            orders = Order.query.order_by(Order.created_at.desc()).all()
-        
-        return jsonify({
-            'orders': [order.to_dict() for order in orders]
-        }), 200
-        
+            if not user.seller_id:
+                return jsonify({'orders': [], 'next_cursor': None, 'total': None,
+                                'summary': order_summary([])}), 200
+            query = query.filter(Order.seller_id == user.seller_id)
+        
+        if status:
+            query = query.filter(Order.status == status)
+        
+        date_from = parse_date_arg('date_from')
+        date_to = parse_date_arg('date_to', end_of_day=True)
+        if date_from:
+            query = query.filter(Order.created_at >= date_from)
+        if date_to:
+            query = query.filter(Order.created_at < date_to)
+        
+        # Embedded items and their products come in one IN-query each
+        # instead of one lazy load per order and per item
+        sort_keys = [(Order.created_at, True), (Order.id, True)]
+        result = paginate_request(order.query(query), sort_keys, per_page)
+        response = {
+            'orders': encode_orders(result.items, order, items, products),
+            'next_cursor': result.next_cursor,
+            'total': result.total
+        }
+        # Dashboard counts and totals come with the first page, aggregated in
+        # the database rather than summed over every order client-side
+        if not request.args.get('cursor'):
+            response['summary'] = order_summary(query.with_entities(
+                Order.status, func.count(Order.id), func.coalesce(func.sum(Order.total_price), 0)
+            ).group_by(Order.status).all())
+        return jsonify(response), 200
+        
+    except (InvalidCursor, ValueError) as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @order_bp.route('/<order_id>', methods=['GET'])
+@query_budget(4)
 @jwt_required()
 def get_order(order_id):
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user:
             return jsonify({'message': 'Unauthorized'}), 403
         
-        order = Order.query.get(order_id)
-        if not order:
+        default_embed = ('items',) if request.args.get('items') == 'summary' else ('items', 'items.product')
+        order, items, products = order_projections(default_embed)
+        row = order.query(Order.query.filter_by(id=order_id), Order.buyer_id, Order.seller_id).first()
+        if not row:
             return jsonify({'message': 'Order not found'}), 404
         
         # Check permissions
-        if user.role == 'buyer' and order.buyer_id != user.id:
+        buyer_id, seller_id = row[-2:]
+        if user.role == 'buyer' and buyer_id != user.id:
             return jsonify({'message': 'Unauthorized'}), 403
         elif user.role == 'seller':
-            seller = Seller.query.filter_by(user_id=user.id).first()
-            if not seller or order.seller_id != seller.id:
+            if not user.seller_id or seller_id != user.seller_id:
                 return jsonify({'message': 'Unauthorized'}), 403
         
-        return jsonify(order.to_dict()), 200
+        return jsonify(encode_orders([row], order, items, products)[0]), 200
         
+    except InvalidFields as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @order_bp.route('/<order_id>/status', methods=['PUT'])
+@query_budget(8)
 @jwt_required()
 def update_order_status(order_id):
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role not in ['seller', 'admin']:
             return jsonify({'message': 'Unauthorized'}), 403
         
-        order = Order.query.get(order_id)
+        order = Order.query.filter_by(id=order_id).with_for_update().first()
         if not order:
             return jsonify({'message': 'Order not found'}), 404
         
         # Check seller permissions
         if user.role == 'seller':
-            seller = Seller.query.filter_by(user_id=user.id).first()
-            if not seller or order.seller_id != seller.id:
+            if not user.seller_id or order.seller_id != user.seller_id:
                 return jsonify({'message': 'Unauthorized'}), 403
         
         data = request.get_json()
+        old_status = order.status
         
         if 'status' in data:
             order.status = data['status']
@@ -273,11 +398,19 @@ def update_order_status(order_id):
         if 'trackingNumber' in data:
             order.tracking_number = data['trackingNumber']
         
+        record_order_status(order, old_status)
         db.session.commit()
         
+        if order.status != old_status:
+            invalidate_order_counts()
+        
+        # Order, items and products in three queries rather than to_dict()'s
+        # one lazy load per item
+        rows = ORDER.query(Order.query.filter_by(id=order.id)).all()
+        
         return jsonify({
             'message': 'Order updated successfully',
-            'order': order.to_dict()
+            'order': encode_orders(rows)[0]
         }), 200
         
     except Exception as e:
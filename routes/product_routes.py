@@ -1,18 +1,37 @@
-from flask import Blueprint, request, jsonify
+import os
+import uuid
+from decimal import Decimal, InvalidOperation
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Product, Seller, Review, db
-from auth import get_current_user
-from sqlalchemy import or_
+from werkzeug.exceptions import RequestEntityTooLarge
+from models import Product, ProductImport, Seller, Review, User, db
+from auth import get_current_identity
+from pagination import InvalidCursor, order_clauses, paginate_request, wants_cursor
+import search
+from sqlalchemy import case, update
+from sqlalchemy.exc import IntegrityError
+from cache import catalog_cache, product_list_tags
+from replicas import replicas
+from serializers import PRODUCT, REVIEW, InvalidFields, embeds, sparse
+from query_budget import query_budget
+from product_import import MAX_PRICE, InvalidImport, import_format, product_importer
 
 product_bp = Blueprint('products', __name__)
 
 @product_bp.route('/', methods=['GET'])
+@query_budget(3)
+@catalog_cache.cached(
+    tags=product_list_tags,
+    defaults={'page': '1', 'per_page': '20', 'sort': 'name'},
+    keep_blank=('cursor',)
+)
+@replicas.read_only
 def get_products():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         category = request.args.get('category')
-        search = request.args.get('search')
+        search_term = request.args.get('search')
         sort = request.args.get('sort', 'name')
         
         query = Product.query.join(Seller).filter(Seller.status == 'approved')
@@ -21,70 +40,100 @@ def get_products():
         if category:
             query = query.filter(Product.category == category)
         
-        # Search by name or description
-        if search:
-            query = query.filter(
-                or_(
-                    Product.name.ilike(f'%{search}%'),
-                    Product.description.ilike(f'%{search}%')
-                )
-            )
+        # Full-text search over name and description
+        rank = None
+        if search_term:
+            query, rank = search.apply(query, search_term)
         
-        # Sort products
-        if sort == 'price_asc':
-            query = query.order_by(Product.price.asc())
+        # Sort products; id breaks ties so cursor pages are stable
+        if sort == 'relevance' and rank is not None:
+            sort_keys = [(rank, False), (Product.id, False)]
+        elif sort == 'price_asc':
+            sort_keys = [(Product.price, False), (Product.id, False)]
         elif sort == 'price_desc':
-            query = query.order_by(Product.price.desc())
+            sort_keys = [(Product.price, True), (Product.id, True)]
         elif sort == 'newest':
-            query = query.order_by(Product.created_at.desc())
+            sort_keys = [(Product.created_at, True), (Product.id, True)]
         else:
-            query = query.order_by(Product.name)
+            sort_keys = [(Product.name, False), (Product.id, False)]
+        
+        product = sparse(PRODUCT)
+        query = product.query(query)
+        
+        if wants_cursor():
+            result = paginate_request(query, sort_keys, per_page)
+            return jsonify({
+                'products': product.encode_all(result.items),
+                'next_cursor': result.next_cursor,
+                'total': result.total
+            }), 200
         
         # Paginate results
-        products = query.paginate(
+        products = query.order_by(*order_clauses(sort_keys)).paginate(
             page=page, 
             per_page=per_page, 
             error_out=False
         )
         
         return jsonify({
-            'products': [product.to_dict() for product in products.items],
+            'products': product.encode_all(products.items),
             'total': products.total,
             'pages': products.pages,
             'current_page': page
         }), 200
         
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @product_bp.route('/<product_id>', methods=['GET'])
+@query_budget(2)
+@replicas.read_only
 def get_product(product_id):
     try:
-        product = Product.query.get(product_id)
-        if not product:
+        product = sparse(PRODUCT)
+        embed = embeds(('reviews',), ('reviews',))
+        row = product.query(Product.query.filter(Product.id == product_id)).first()
+        if not row:
             return jsonify({'message': 'Product not found'}), 404
         
-        # Get product reviews
-        reviews = Review.query.filter_by(product_id=product_id).all()
+        product_data = product.encode(row)
         
-        product_data = product.to_dict()
-        product_data['reviews'] = [review.to_dict() for review in reviews]
+        # Get product reviews
+        if 'reviews' in embed:
+            review = sparse(REVIEW, main=False)
+            reviews = review.select().select_from(Review).outerjoin(User, User.id == Review.user_id).filter(
+                Review.product_id == product_id
+            ).all()
+            product_data['reviews'] = review.encode_all(reviews)
         
         return jsonify(product_data), 200
         
+    except InvalidFields as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
+def _sku_conflict(error):
+    """Whether an IntegrityError came from the per-seller SKU index"""
+    orig = getattr(error, 'orig', None)
+    # psycopg2 names the violated constraint; SQLite only words it
+    constraint = getattr(getattr(orig, 'diag', None), 'constraint_name', None)
+    if constraint:
+        return constraint == 'uq_product_seller_sku'
+    return 'uq_product_seller_sku' in str(orig) or 'product.seller_id, product.sku' in str(orig)
+
 @product_bp.route('/', methods=['POST'])
+@query_budget(3)
 @jwt_required()
 def create_product():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'seller':
             return jsonify({'message': 'Unauthorized'}), 403
         
-        seller = Seller.query.filter_by(user_id=user.id).first()
-        if not seller or seller.status != 'approved':
+        if not user.seller_id or user.seller_status != 'approved':
             return jsonify({'message': 'Seller not approved'}), 403
         
         data = request.get_json()
@@ -95,7 +144,8 @@ def create_product():
             return jsonify({'message': 'Missing required fields'}), 400
         
         product = Product(
-            seller_id=seller.id,
+            seller_id=user.seller_id,
+            sku=data.get('sku') or None,
             name=data['name'],
             description=data['description'],
             price=data['price'],
@@ -107,34 +157,50 @@ def create_product():
         db.session.add(product)
         db.session.commit()
         
+        catalog_cache.invalidate_categories([product.category])
+        catalog_cache.invalidate_category_list()
+        
         return jsonify({
             'message': 'Product created successfully',
             'product': product.to_dict()
         }), 201
         
+    except IntegrityError as e:
+        db.session.rollback()
+        if not _sku_conflict(e):
+            return jsonify({'message': str(e)}), 500
+        return jsonify({'message': 'You already have a product with this SKU'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
 @product_bp.route('/<product_id>', methods=['PUT'])
+@query_budget(4)
 @jwt_required()
 def update_product(product_id):
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'seller':
             return jsonify({'message': 'Unauthorized'}), 403
         
-        product = Product.query.get(product_id)
+        # Locked so a cart hold can't grow between the check below and the write
+        product = Product.query.filter_by(id=product_id).with_for_update().first()
         if not product:
             return jsonify({'message': 'Product not found'}), 404
         
-        seller = Seller.query.filter_by(user_id=user.id).first()
-        if not seller or product.seller_id != seller.id:
+        if not user.seller_id or product.seller_id != user.seller_id:
             return jsonify({'message': 'Unauthorized'}), 403
         
         data = request.get_json()
+        old_category = product.category
+        
+        if 'stock' in data and data['stock'] < product.reserved:
+            db.session.rollback()
+            return jsonify({'message': f'Stock would fall below the {product.reserved} units held in carts'}), 409
         
         # Update product fields
+        if 'sku' in data:
+            product.sku = data['sku'] or None
         if 'name' in data:
             product.name = data['name']
         if 'description' in data:
@@ -150,20 +216,30 @@ def update_product(product_id):
         
         db.session.commit()
         
+        catalog_cache.invalidate_categories({old_category, product.category})
+        if product.category != old_category:
+            catalog_cache.invalidate_category_list()
+        
         return jsonify({
             'message': 'Product updated successfully',
             'product': product.to_dict()
         }), 200
         
+    except IntegrityError as e:
+        db.session.rollback()
+        if not _sku_conflict(e):
+            return jsonify({'message': str(e)}), 500
+        return jsonify({'message': 'You already have a product with this SKU'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
 @product_bp.route('/<product_id>', methods=['DELETE'])
+@query_budget(6)
 @jwt_required()
 def delete_product(product_id):
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'seller':
             return jsonify({'message': 'Unauthorized'}), 403
         
@@ -171,20 +247,241 @@ def delete_product(product_id):
         if not product:
             return jsonify({'message': 'Product not found'}), 404
         
-        seller = Seller.query.filter_by(user_id=user.id).first()
-        if not seller or product.seller_id != seller.id:
+        if not user.seller_id or product.seller_id != user.seller_id:
             return jsonify({'message': 'Unauthorized'}), 403
         
+        category = product.category
         db.session.delete(product)
         db.session.commit()
         
+        catalog_cache.invalidate_categories([category])
+        catalog_cache.invalidate_category_list()
+        
         return jsonify({'message': 'Product deleted successfully'}), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
+def _import_budget():
+    """Identity, then per chunk of an inline import the existing-SKU query and
+    the upsert, plus one statement per row of chunks the database refused
+    and that are retried row by row"""
+    chunks = -(-product_importer.sync_rows // product_importer.chunk_size)
+    return 1 + 2 * chunks + product_importer.sync_rows
+
+@product_bp.route('/import', methods=['POST'])
+@query_budget(_import_budget)
+@jwt_required()
+def import_products():
+    path = None
+    try:
+        user = get_current_identity()
+        if not user or user.role != 'seller':
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        if not user.seller_id or user.seller_status != 'approved':
+            return jsonify({'message': 'Seller not approved'}), 403
+        
+        # Raw CSV/NDJSON body (optionally chunked) or a multipart "file" field
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('file')
+            if upload is None:
+                return jsonify({'message': 'Missing file'}), 400
+            fmt = import_format(request.args.get('format'), upload.mimetype, upload.filename)
+            stream = upload.stream
+        else:
+            fmt = import_format(request.args.get('format'), request.mimetype)
+            stream = request.stream
+        path, lines = product_importer.spool(stream)
+        
+        if lines <= product_importer.sync_rows and request.args.get('async') != '1':
+            with open(path, 'rb') as f:
+                report = product_importer.run(f, fmt, user.seller_id)
+            result = report.to_dict()
+            result.update(status='completed', format=fmt)
+            return jsonify({'import': result}), 200
+        
+        job = ProductImport(seller_id=user.seller_id, format=fmt, status='queued')
+        db.session.add(job)
+        db.session.commit()
+        product_importer.submit(job.id, path, fmt, user.seller_id)
+        path = None
+        
+        return jsonify({'import': job.to_dict()}), 202, {'Location': f'/api/products/imports/{job.id}'}
+        
+    except InvalidImport as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    except RequestEntityTooLarge:
+        return jsonify({'message': 'Upload is larger than the request size limit'}), 413
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 500
+    finally:
+        if path:
+            os.unlink(path)
+
+@product_bp.route('/imports/<import_id>', methods=['GET'])
+@query_budget(4)
+@jwt_required()
+def get_import(import_id):
+    try:
+        user = get_current_identity()
+        if not user or user.role != 'seller':
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        job = ProductImport.query.filter_by(id=import_id).first()
+        if not job or job.seller_id != user.seller_id:
+            return jsonify({'message': 'Import not found'}), 404
+        
+        # Its worker may have been killed mid-import
+        product_importer.fail_if_stale(job)
+        return jsonify({'import': job.to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+def _adjustment(operation):
+    """(productId, (stockDelta, stock, price), error) for one batch operation"""
+    if not isinstance(operation, dict):
+        return None, None, 'Expected an object'
+    product_id = operation.get('productId')
+    try:
+        product_id = str(uuid.UUID(str(product_id)))
+    except ValueError:
+        return product_id, None, 'Product not found'
+    values = {}
+    for key in ('stockDelta', 'stock'):
+        if operation.get(key) is not None:
+            if type(operation[key]) is not int:
+                return product_id, None, f'{key} must be a whole number'
+            values[key] = operation[key]
+    if len(values) > 1:
+        return product_id, None, 'Give stockDelta or stock, not both'
+    if values.get('stock', 0) < 0:
+        return product_id, None, 'stock cannot be negative'
+    if operation.get('price') is not None:
+        try:
+            if isinstance(operation['price'], bool):
+                raise InvalidOperation
+            price = Decimal(str(operation['price'])).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            return product_id, None, 'price must be a number'
+        if not 0 <= price <= MAX_PRICE:
+            return product_id, None, 'price is out of range'
+        values['price'] = price
+    if not values:
+        return product_id, None, 'Nothing to change: give stockDelta, stock or price'
+    return product_id, (values.get('stockDelta'), values.get('stock'), values.get('price')), None
+
+@product_bp.route('/adjustments', methods=['POST'])
+@query_budget(3)
+@jwt_required()
+def adjust_products():
+    try:
+        user = get_current_identity()
+        if not user or user.role != 'seller' or not user.seller_id:
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        operations = data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'message': 'operations must be a non-empty list'}), 400
+        limit = current_app.config.get('PRODUCT_ADJUST_MAX_ITEMS', 1000)
+        if len(operations) > limit:
+            return jsonify({'message': f'At most {limit} operations per batch'}), 400
+        
+        # One result per operation, in request order
+        results = [None] * len(operations)
+        adjustments = {}
+        for index, operation in enumerate(operations):
+            product_id, changes, error = _adjustment(operation)
+            if not error and product_id in adjustments:
+                error = 'Duplicate productId in batch'
+            if error:
+                results[index] = {'productId': product_id, 'error': error}
+                continue
+            adjustments[product_id] = (index,) + changes
+        
+        # Ownership, current stock and holds of every product in one query,
+        # locked in id order like checkout so concurrent batches cannot deadlock
+        found = {}
+        if adjustments:
+            rows = db.session.query(
+                Product.id, Product.seller_id, Product.stock, Product.reserved, Product.price, Product.category
+            ).filter(Product.id.in_(list(adjustments))).order_by(Product.id).with_for_update().all()
+            found = {row.id: row for row in rows}
+        
+        stock, price, guard = {}, {}, {}
+        categories = set()
+        for product_id, (index, delta, absolute, new_price) in adjustments.items():
+            row = found.get(product_id)
+            if row is None or row.seller_id != user.seller_id:
+                # Other sellers' products are indistinguishable from missing ones
+                results[index] = {'productId': product_id, 'error': 'Product not found'}
+                continue
+            new_stock = row.stock + delta if delta is not None else absolute if absolute is not None else row.stock
+            if new_stock < row.reserved:
+                results[index] = {'productId': product_id,
+                                  'error': f'Stock would fall below the {row.reserved} units held in carts'}
+                continue
+            if delta is not None:
+                stock[product_id] = Product.stock + delta
+                guard[product_id] = delta
+            elif absolute is not None:
+                stock[product_id] = absolute
+            if new_price is not None:
+                price[product_id] = new_price
+            categories.add(row.category)
+            results[index] = {'productId': product_id, 'stock': new_stock,
+                              'price': float(new_price if new_price is not None else row.price)}
+        
+        # Every accepted operation in a single UPDATE: relative deltas apply
+        # to the stored stock and are re-checked against the holds in the
+        # WHERE clause. Explicit comparisons bind ids through the column type
+        changed = set(stock) | set(price)
+        if changed:
+            values = {}
+            if stock:
+                values['stock'] = case(*((Product.id == product_id, value) for product_id, value in stock.items()),
+                                       else_=Product.stock)
+            if price:
+                values['price'] = case(*((Product.id == product_id, value) for product_id, value in price.items()),
+                                       else_=Product.price)
+            conditions = [Product.id.in_(list(changed)), Product.seller_id == user.seller_id]
+            if guard:
+                conditions.append(Product.stock + case(
+                    *((Product.id == product_id, delta) for product_id, delta in guard.items()), else_=0
+                ) >= Product.reserved)
+            result = db.session.execute(
+                update(Product).where(*conditions).values(**values).execution_options(synchronize_session=False)
+            )
+            if result.rowcount != len(changed):
+                # Only possible when the rows changed after they were read
+                # (SQLite takes no row locks); nothing is applied
+                db.session.rollback()
+                return jsonify({'message': 'Products changed during the batch, retry it'}), 409
+        db.session.commit()
+        
+        if categories:
+            catalog_cache.invalidate_categories(categories)
+        
+        failed = sum(1 for result in results if 'error' in result)
+        return jsonify({
+            'results': results,
+            'updated': len(results) - failed,
+            'failed': failed
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 500
+
 @product_bp.route('/categories', methods=['GET'])
+@query_budget(1)
+@catalog_cache.cached(tags=lambda params: ['categories'])
+@replicas.read_only
 def get_categories():
     try:
         categories = db.session.query(Product.category).distinct().all()
@@ -196,10 +493,11 @@ def get_categories():
         return jsonify({'message': str(e)}), 500
 
 @product_bp.route('/<product_id>/reviews', methods=['POST'])
+@query_budget(6)
 @jwt_required()
 def add_review(product_id):
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user:
             return jsonify({'message': 'Unauthorized'}), 403
         
@@ -236,6 +534,9 @@ def add_review(product_id):
             'review': review.to_dict()
         }), 201
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'You have already reviewed this product'}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
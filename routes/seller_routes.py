@@ -1,110 +1,121 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-from models import Seller, Withdrawal, Order, OrderItem, Product, db
-from auth import get_current_user
+from models import Seller, Withdrawal, Order, Product, db
+from auth import get_current_identity
 from datetime import datetime
 from decimal import Decimal
+from ledger import get_balance, reserve_withdrawal
+from replicas import replicas
+from serializers import PRODUCT, WITHDRAWAL, InvalidFields, encode_orders, order_projections, sparse
+from query_budget import query_budget
+from exports import filter_export, flat_columns, order_columns, order_records, projection_records, stream_export
 
 seller_bp = Blueprint('seller', __name__)
 
 @seller_bp.route('/dashboard', methods=['GET'])
+@query_budget(7)
 @jwt_required()
+@replicas.read_only
 def get_seller_dashboard():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'seller':
             return jsonify({'message': 'Unauthorized'}), 403
         
-        seller = Seller.query.filter_by(user_id=user.id).first()
+        seller = db.session.get(Seller, user.seller_id) if user.seller_id else None
         if not seller:
             return jsonify({'message': 'Seller profile not found'}), 404
         
-        # Calculate revenue metrics
-        orders = Order.query.filter_by(seller_id=seller.id).all()
-        total_sales = sum(float(order.total_price) for order in orders if order.status != 'cancelled')
-        
-        # Calculate pending balance (completed orders minus withdrawals)
-        completed_orders = [order for order in orders if order.status == 'delivered']
-        total_earnings = sum(float(order.total_price) for order in completed_orders)
-        
-        withdrawals = Withdrawal.query.filter_by(seller_id=seller.id, status='processed').all()
-        total_withdrawn = sum(float(w.amount_requested) for w in withdrawals)
-        
-        pending_balance = total_earnings - total_withdrawn
+        # Revenue metrics come from the materialized balance row
+        balance = get_balance(seller.id)
         
         # Get product count
         product_count = Product.query.filter_by(seller_id=seller.id).count()
         
         # Get recent orders
-        recent_orders = Order.query.filter_by(seller_id=seller.id).order_by(Order.created_at.desc()).limit(10).all()
+        order, items, products = order_projections(main=False)
+        recent_orders = order.query(
+            Order.query.filter_by(seller_id=seller.id).order_by(Order.created_at.desc()).limit(10)
+        ).all()
         
         return jsonify({
             'seller': seller.to_dict(),
             'metrics': {
-                'totalSales': total_sales,
-                'pendingBalance': max(0, pending_balance),
-                'totalWithdrawn': total_withdrawn,
+                'totalSales': float(balance.total_sales),
+                'pendingBalance': max(0, float(balance.earnings - balance.withdrawn)),
+                'availableBalance': max(0, float(balance.available)),
+                'totalWithdrawn': float(balance.withdrawn),
                 'productCount': product_count,
-                'orderCount': len(orders)
+                'orderCount': balance.order_count
             },
-            'recentOrders': [order.to_dict() for order in recent_orders]
+            'recentOrders': encode_orders(recent_orders, order, items, products)
         }), 200
         
+    except InvalidFields as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @seller_bp.route('/products', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def get_seller_products():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'seller':
             return jsonify({'message': 'Unauthorized'}), 403
         
-        seller = Seller.query.filter_by(user_id=user.id).first()
-        if not seller:
+        if not user.seller_id:
             return jsonify({'message': 'Seller profile not found'}), 404
         
-        products = Product.query.filter_by(seller_id=seller.id).all()
+        product = sparse(PRODUCT)
+        products = product.query(Product.query.filter_by(seller_id=user.seller_id)).all()
         
         return jsonify({
-            'products': [product.to_dict() for product in products]
+            'products': product.encode_all(products)
         }), 200
         
+    except InvalidFields as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @seller_bp.route('/withdrawals', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def get_withdrawals():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'seller':
             return jsonify({'message': 'Unauthorized'}), 403
         
-        seller = Seller.query.filter_by(user_id=user.id).first()
-        if not seller:
+        if not user.seller_id:
             return jsonify({'message': 'Seller profile not found'}), 404
         
-        withdrawals = Withdrawal.query.filter_by(seller_id=seller.id).order_by(Withdrawal.created_at.desc()).all()
+        withdrawal = sparse(WITHDRAWAL)
+        withdrawals = withdrawal.query(
+            Withdrawal.query.filter_by(seller_id=user.seller_id).order_by(Withdrawal.created_at.desc())
+        ).all()
         
         return jsonify({
-            'withdrawals': [withdrawal.to_dict() for withdrawal in withdrawals]
+            'withdrawals': withdrawal.encode_all(withdrawals)
         }), 200
         
+    except InvalidFields as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @seller_bp.route('/withdrawals', methods=['POST'])
+@query_budget(4)
 @jwt_required()
 def request_withdrawal():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'seller':
             return jsonify({'message': 'Unauthorized'}), 403
         
-        seller = Seller.query.filter_by(user_id=user.id).first()
-        if not seller or seller.status != 'approved':
+        if not user.seller_id or user.seller_status != 'approved':
             return jsonify({'message': 'Seller not approved'}), 403
         
         data = request.get_json()
@@ -117,16 +128,9 @@ def request_withdrawal():
         if amount_requested <= 0:
             return jsonify({'message': 'Invalid amount'}), 400
         
-        # Calculate available balance
-        orders = Order.query.filter_by(seller_id=seller.id, status='delivered').all()
-        total_earnings = sum(order.total_price for order in orders)
-        
-        withdrawals = Withdrawal.query.filter_by(seller_id=seller.id, status='processed').all()
-        total_withdrawn = sum(w.amount_requested for w in withdrawals)
-        
-        available_balance = total_earnings - total_withdrawn
-        
-        if amount_requested > available_balance:
+        # Earmark the amount against the seller's balance row (row-locked)
+        if not reserve_withdrawal(user.seller_id, amount_requested):
+            db.session.rollback()
             return jsonify({'message': 'Insufficient balance'}), 400
         
         # Calculate platform fee (7%)
@@ -134,7 +138,7 @@ def request_withdrawal():
         amount_paid = amount_requested - platform_fee
         
         withdrawal = Withdrawal(
-            seller_id=seller.id,
+            seller_id=user.seller_id,
             amount_requested=amount_requested,
             amount_paid=amount_paid,
             method=data['method']
@@ -153,14 +157,15 @@ def request_withdrawal():
         return jsonify({'message': str(e)}), 500
 
 @seller_bp.route('/verification', methods=['POST'])
+@query_budget(4)
 @jwt_required()
 def submit_verification():
     try:
-        user = get_current_user()
+        user = get_current_identity()
         if not user or user.role != 'seller':
             return jsonify({'message': 'Unauthorized'}), 403
         
-        seller = Seller.query.filter_by(user_id=user.id).first()
+        seller = db.session.get(Seller, user.seller_id) if user.seller_id else None
         if not seller:
             return jsonify({'message': 'Seller profile not found'}), 404
         
@@ -179,3 +184,70 @@ def submit_verification():
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
+
+# Streamed exports of the seller's own records; the budgets cover the
+# statements run before streaming starts, the export itself is one query
+
+@seller_bp.route('/exports/orders', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+@replicas.read_only
+def export_seller_orders():
+    try:
+        user = get_current_identity()
+        if not user or user.role != 'seller':
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        if not user.seller_id:
+            return jsonify({'message': 'Seller profile not found'}), 404
+        
+        query = filter_export(Order.query.filter(Order.seller_id == user.seller_id), Order)
+        return stream_export('orders', order_records(query), *order_columns())
+        
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@seller_bp.route('/exports/withdrawals', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+@replicas.read_only
+def export_seller_withdrawals():
+    try:
+        user = get_current_identity()
+        if not user or user.role != 'seller':
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        if not user.seller_id:
+            return jsonify({'message': 'Seller profile not found'}), 404
+        
+        query = filter_export(Withdrawal.query.filter(Withdrawal.seller_id == user.seller_id), Withdrawal)
+        return stream_export('withdrawals', projection_records(WITHDRAWAL, query), *flat_columns(WITHDRAWAL))
+        
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@seller_bp.route('/exports/products', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+@replicas.read_only
+def export_seller_products():
+    try:
+        user = get_current_identity()
+        if not user or user.role != 'seller':
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        if not user.seller_id:
+            return jsonify({'message': 'Seller profile not found'}), 404
+        
+        query = Product.query.filter(Product.seller_id == user.seller_id)
+        query = filter_export(query, Product, status_arg='category', status_column=Product.category)
+        return stream_export('products', projection_records(PRODUCT, query), *flat_columns(PRODUCT))
+        
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
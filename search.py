@@ -0,0 +1,148 @@
+import re
+from flask import current_app
+from sqlalchemy import func, literal_column, or_, select, text
+from models import Product, db
+
+# SQLite keeps an FTS5 shadow table in sync through triggers, PostgreSQL
+# uses a GIN index over a weighted tsvector expression; both are created by
+# the migrations from ddl(). Any other backend
+# (or a SQLite build without FTS5) falls back to the old ILIKE scan.
+FTS_TABLE = 'product_fts'
+MAX_TERMS = 16
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        product_id UNINDEXED, name, description,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON product BEGIN
+        INSERT INTO {FTS_TABLE} (product_id, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON product BEGIN
+        DELETE FROM {FTS_TABLE} WHERE product_id = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF id, name, description ON product BEGIN
+        DELETE FROM {FTS_TABLE} WHERE product_id = old.id;
+        INSERT INTO {FTS_TABLE} (product_id, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    # Backfill products indexed before the triggers existed
+    f"""INSERT INTO {FTS_TABLE} (product_id, name, description)
+        SELECT id, name, description FROM product
+        WHERE id NOT IN (SELECT product_id FROM {FTS_TABLE})""",
+]
+
+# Must stay expression-equivalent to _pg_document() for the planner to use it
+_PG_DDL = """CREATE INDEX IF NOT EXISTS ix_product_search ON product USING GIN ((
+    setweight(to_tsvector('english'::regconfig, coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'B')
+))"""
+
+def _pg_document():
+    """Weighted tsvector over name (A) and description (B)"""
+    config = literal_column("'english'::regconfig")
+    return func.setweight(
+        func.to_tsvector(config, func.coalesce(Product.name, '')), literal_column("'A'")
+    ).op('||')(func.setweight(
+        func.to_tsvector(config, func.coalesce(Product.description, '')), literal_column("'B'")
+    ))
+
+def tokenize(term):
+    """Split a user search string into at most MAX_TERMS lowercase tokens"""
+    return _TOKEN_RE.findall((term or '').lower())[:MAX_TERMS]
+
+def init_app(app):
+    """Search structures are detected on first use, after migrations ran"""
+    app.extensions['product_search'] = None
+
+def ddl(dialect):
+    """Idempotent statements creating the search structures, run by migrations"""
+    if dialect == 'sqlite':
+        return list(_SQLITE_DDL)
+    if dialect == 'postgresql':
+        return [_PG_DDL]
+    return []
+
+def is_search_table(name):
+    """FTS5 creates shadow tables that are not part of the model metadata"""
+    return name == FTS_TABLE or name.startswith(f'{FTS_TABLE}_')
+
+def detect(engine):
+    """Name of the search backend available on engine"""
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        with engine.connect() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).first()
+        return 'fts5' if exists else 'like'
+    if dialect == 'postgresql':
+        return 'tsvector'
+    return 'like'
+
+def rebuild(engine):
+    """Repopulate the SQLite FTS table from the product table"""
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f'DELETE FROM {FTS_TABLE}')
+        _backfill(conn)
+
+def _backfill(conn):
+    conn.exec_driver_sql(
+        f'INSERT INTO {FTS_TABLE} (product_id, name, description) '
+        'SELECT id, name, description FROM product'
+    )
+
+def backend():
+    """Name of the search backend installed for the current app"""
+    kind = current_app.extensions.get('product_search')
+    if kind is None:
+        kind = current_app.extensions['product_search'] = detect(db.engine)
+    return kind
+
+def apply(query, term):
+    """Restrict a Product query to matches for term.
+
+    Returns the filtered query and a rank expression where ascending order
+    means more relevant, or None when the backend cannot rank.
+    """
+    tokens = tokenize(term)
+    if not tokens:
+        return query, None
+
+    kind = backend()
+    if kind == 'fts5':
+        match = select(
+            literal_column('product_id').label('product_id'),
+            # name matches weigh ten times description matches
+            literal_column(f'bm25({FTS_TABLE}, 0.0, 10.0, 1.0)').label('rank')
+        ).select_from(text(FTS_TABLE)).where(
+            text(f'{FTS_TABLE} MATCH :fts_query').bindparams(
+                fts_query=' '.join(f'"{token}"*' for token in tokens)
+            )
+        ).subquery('product_match')
+        query = query.join(match, match.c.product_id == Product.id)
+        return query, match.c.rank
+
+    if kind == 'tsvector':
+        tsquery = func.to_tsquery(
+            literal_column("'english'::regconfig"),
+            ' & '.join(f'{token}:*' for token in tokens)
+        )
+        document = _pg_document()
+        query = query.filter(document.op('@@')(tsquery))
+        return query, -func.ts_rank(document, tsquery)
+
+    for token in tokens:
+        query = query.filter(
+            or_(
+                Product.name.ilike(f'%{token}%'),
+                Product.description.ilike(f'%{token}%')
+            )
+        )
+    return query, None
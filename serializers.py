@@ -0,0 +1,295 @@
+import dataclasses
+import decimal
+import uuid
+from datetime import date
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+from models import CartItem, Order, OrderItem, Product, Review, Seller, User, Withdrawal, db
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# List endpoints select just the columns below as plain rows and turn each
+# row into the API dict with an encoder generated once per projection, so
+# pages skip ORM identity-map work and per-attribute instrumentation. Every
+# projection mirrors the model's to_dict() field for field.
+#
+# Clients may ask for less: ?fields=id,name,price narrows the main resource,
+# ?fields[<name>]= narrows an embedded one (e.g. fields[product]=) and
+# ?embed= lists the relations to include as dotted paths (embed=items.product,
+# or an empty embed= for none). Unrequested columns are never selected and
+# unrequested relations never queried.
+
+_CONVERSIONS = {
+    None: '{v}',
+    'float': 'float({v})',
+    'iso': '{v}.isoformat()',
+    'iso_or_none': '({v}.isoformat() if {v} is not None else None)',
+}
+
+class InvalidFields(ValueError):
+    pass
+
+class Projection:
+    """Selected columns of one model and how each becomes an API field.
+
+    `fields` is a list of (api key, model attribute or column, conversion)
+    where the conversion is None, 'float', 'iso' or 'iso_or_none'. `name`
+    is the resource name used in ?fields[<name>]=.
+    """
+
+    def __init__(self, name, model, fields):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.columns = [getattr(model, attr) if isinstance(attr, str) else attr for _, attr, _ in fields]
+        self._narrowed = {}
+        body = ', '.join(
+            f'{key!r}: ' + _CONVERSIONS[conversion].format(v=f'row[{i}]')
+            for i, (key, _, conversion) in enumerate(fields)
+        )
+        namespace = {}
+        exec(f'def encode(row):\n    return {{{body}}}', namespace)
+        self.encode = namespace['encode']
+
+    def query(self, query, *extra):
+        """The same query selecting only this projection's columns (then `extra`)"""
+        return query.with_entities(*self.columns, *extra)
+
+    def select(self, *extra):
+        return db.session.query(*self.columns, *extra)
+
+    def narrow(self, keys):
+        """Projection of just the given API keys; the id is always kept"""
+        keys = frozenset(keys) | {'id'}
+        narrowed = self._narrowed.get(keys)
+        if narrowed is None:
+            unknown = keys - {key for key, _, _ in self.fields}
+            if unknown:
+                raise InvalidFields(f"Unknown {self.name} field(s): {', '.join(sorted(unknown))}")
+            narrowed = Projection(self.name, self.model, [f for f in self.fields if f[0] in keys])
+            self._narrowed[keys] = narrowed
+        return narrowed
+
+    def encode_all(self, rows):
+        encode = self.encode
+        return [encode(row) for row in rows]
+
+USER = Projection('user', User, [
+    ('id', 'id', None),
+    ('username', 'username', None),
+    ('email', 'email', None),
+    ('role', 'role', None),
+    ('phone', 'phone', None),
+    ('address', 'address', None),
+    ('createdAt', 'created_at', 'iso'),
+])
+
+SELLER = Projection('seller', Seller, [
+    ('id', 'id', None),
+    ('userId', 'user_id', None),
+    ('businessName', 'business_name', None),
+    ('status', 'status', None),
+    ('documents', 'documents', None),
+    ('verifiedAt', 'verified_at', 'iso_or_none'),
+    ('createdAt', 'created_at', 'iso'),
+])
+
+PRODUCT = Projection('product', Product, [
+    ('id', 'id', None),
+    ('sellerId', 'seller_id', None),
+    ('sku', 'sku', None),
+    ('name', 'name', None),
+    ('description', 'description', None),
+    ('price', 'price', 'float'),
+    ('stock', 'stock', None),
+    ('category', 'category', None),
+    ('imageUrl', 'image_url', None),
+    ('createdAt', 'created_at', 'iso'),
+])
+
+ORDER = Projection('order', Order, [
+    ('id', 'id', None),
+    ('buyerId', 'buyer_id', None),
+    ('sellerId', 'seller_id', None),
+    ('totalPrice', 'total_price', 'float'),
+    ('shippingAddress', 'shipping_address', None),
+    ('method', 'method', None),
+    ('carrier', 'carrier', None),
+    ('trackingNumber', 'tracking_number', None),
+    ('status', 'status', None),
+    ('createdAt', 'created_at', 'iso'),
+])
+
+ORDER_ITEM = Projection('item', OrderItem, [
+    ('id', 'id', None),
+    ('orderId', 'order_id', None),
+    ('productId', 'product_id', None),
+    ('quantity', 'quantity', None),
+    ('price', 'price', 'float'),
+])
+
+WITHDRAWAL = Projection('withdrawal', Withdrawal, [
+    ('id', 'id', None),
+    ('sellerId', 'seller_id', None),
+    ('amountRequested', 'amount_requested', 'float'),
+    ('amountPaid', 'amount_paid', 'float'),
+    ('method', 'method', None),
+    ('status', 'status', None),
+    ('transactionId', 'transaction_id', None),
+    ('createdAt', 'created_at', 'iso'),
+    ('processedAt', 'processed_at', 'iso_or_none'),
+])
+
+CART_ITEM = Projection('cart', CartItem, [
+    ('id', 'id', None),
+    ('userId', 'user_id', None),
+    ('productId', 'product_id', None),
+    ('quantity', 'quantity', None),
+    ('reservedUntil', 'reserved_until', 'iso_or_none'),
+    ('createdAt', 'created_at', 'iso'),
+])
+
+REVIEW = Projection('review', Review, [
+    ('id', 'id', None),
+    ('userId', 'user_id', None),
+    ('productId', 'product_id', None),
+    ('rating', 'rating', None),
+    ('comment', 'comment', None),
+    ('createdAt', 'created_at', 'iso'),
+    ('user', User.username, None),
+])
+
+def _arg_list(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+def sparse(projection, main=True):
+    """`projection` narrowed by ?fields[<name>]=, or by ?fields= when it is
+    the endpoint's main resource"""
+    keys = _arg_list(f'fields[{projection.name}]')
+    if keys is None and main:
+        keys = _arg_list('fields')
+    return projection if keys is None else projection.narrow(keys)
+
+def embeds(allowed, default):
+    """Relation paths named in ?embed=, else `default`; a path implies its parents"""
+    paths = _arg_list('embed')
+    if paths is None:
+        return set(default)
+    unknown = set(paths) - set(allowed)
+    if unknown:
+        raise InvalidFields(f"Cannot embed: {', '.join(sorted(unknown))}")
+    result = set()
+    for path in paths:
+        parts = path.split('.')
+        result.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    return result
+
+def order_projections(default_embed=('items', 'items.product'), main=True):
+    """(order, items, products) projections for the current request; items
+    and products are None when not embedded"""
+    embed = embeds(('items', 'items.product'), default_embed)
+    return (
+        sparse(ORDER, main),
+        sparse(ORDER_ITEM, main=False) if 'items' in embed else None,
+        sparse(PRODUCT, main=False) if 'items.product' in embed else None
+    )
+
+def products_by_id(product_ids, projection=PRODUCT):
+    if not product_ids:
+        return {}
+    rows = projection.select().filter(Product.id.in_(list(product_ids))).all()
+    return {row[0]: projection.encode(row) for row in rows}
+
+def encode_orders(rows, order=ORDER, items=ORDER_ITEM, products=PRODUCT):
+    """Order dicts from `order` rows with their items and the items'
+    products, one IN query per embedded level"""
+    result = order.encode_all(rows)
+    if not result or items is None:
+        return result
+    by_order = {entry['id']: entry for entry in result}
+    for entry in result:
+        entry['items'] = []
+    # Link columns ride after the projection's own, so the encoder ignores them
+    item_rows = items.select(OrderItem.order_id, OrderItem.product_id).filter(
+        OrderItem.order_id.in_(list(by_order))
+    ).all()
+    product_map = products_by_id({row[-1] for row in item_rows}, products) if products is not None else None
+    for row in item_rows:
+        item = items.encode(row)
+        if product_map is not None:
+            item['product'] = product_map.get(row[-1])
+        by_order[row[-2]]['items'].append(item)
+    return result
+
+def encode_cart(rows, cart=CART_ITEM, products=PRODUCT):
+    """Cart line dicts from `cart` rows selected with CartItem.product_id last"""
+    result = cart.encode_all(rows)
+    if products is not None:
+        product_map = products_by_id({row[-1] for row in rows}, products)
+        for line, row in zip(result, rows):
+            line['product'] = product_map.get(row[-1])
+    return result
+
+_ORJSON_OPTIONS = (
+    (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+    if orjson else 0
+)
+
+def _default(o):
+    """Fallback for types orjson does not encode natively, matching what
+    DefaultJSONProvider sends for them"""
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+def _response_obj(args, kwargs):
+    """The value jsonify()/app.json.response() serialize for their arguments"""
+    if args and kwargs:
+        raise TypeError('app.json.response() takes either args or kwargs, not both')
+    if not args and not kwargs:
+        return None
+    if len(args) == 1:
+        return args[0]
+    return args or kwargs
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, decoding to the same values as
+    the default one.
+
+    Keys stay sorted and dates, decimals and UUIDs still go through Flask's
+    fallback; non-ASCII text is sent as UTF-8 instead of \\u escapes.
+    Pretty-printed (debug) responses use the standard library.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.get('indent') is not None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = _response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+def init_app(app):
+    """Use orjson for request and response bodies when it is installed"""
+    if orjson is not None and app.config.get('FAST_JSON', True):
+        app.json = OrjsonProvider(app)
@@ -33,6 +33,8 @@ export async function setupVite(app: Express, server: Server) {
     createProxyMiddleware({
       target: "http://localhost:5000", // Flask backend
       changeOrigin: true,
+      // X-Forwarded-For for the backend's per-IP limits (TRUSTED_PROXIES=1)
+      xfwd: true,
     })
   );
 
@@ -0,0 +1,77 @@
+import logging
+import background
+import search
+from models import db
+from passwords import password_hasher
+from product_import import product_importer
+
+logger = logging.getLogger(__name__)
+
+# Process lifecycle for preforked serving (see gunicorn.conf.py). The app is
+# created and warmed once in the master; each worker then gets fresh DB
+# connections, hashing pool and background threads, none of which survive
+# fork() in a usable state.
+
+def process_local_state(config, workers):
+    """Per-process state that diverges between `workers` > 1 processes.
+
+    Each worker keeps its own memory caches and throttle buckets, so an
+    invalidation or a spent token in one worker is invisible to the others.
+    """
+    if workers <= 1:
+        return []
+    problems = []
+    if config.get('CATALOG_CACHE_ENABLED') and config.get('CATALOG_CACHE_BACKEND', 'memory') == 'memory':
+        problems.append('catalog cache and admin order counters are per worker and may serve '
+                        'entries another worker invalidated until CATALOG_CACHE_TTL/ORDER_COUNTS_TTL '
+                        'expire; set CATALOG_CACHE_BACKEND=redis')
+    if config.get('THROTTLE_ENABLED') and config.get('THROTTLE_BACKEND', 'memory') == 'memory':
+        problems.append(f'throttle buckets are per worker, so clients get up to {workers}x '
+                        'the configured rates; set THROTTLE_BACKEND=redis')
+    if config.get('IDENTITY_CACHE_TTL', 30) > 0:
+        problems.append('seller identity cache is per worker, so role and seller status changes '
+                        'reach other workers only after IDENTITY_CACHE_TTL seconds; set it to 0 '
+                        'to look sellers up on every request')
+    return problems
+
+def warmup(app):
+    """Detect search structures and prime the caches behind WARMUP_PATHS"""
+    with app.app_context():
+        try:
+            search.backend()
+        except Exception:
+            logger.exception('Warmup: search detection failed')
+    client = app.test_client()
+    for path in app.config.get('WARMUP_PATHS', []):
+        try:
+            status = client.get(path).status_code
+            logger.info('Warmup: GET %s -> %s', path, status)
+        except Exception:
+            logger.exception('Warmup: GET %s failed', path)
+
+def before_fork(app):
+    """Release what the master used so workers do not inherit it"""
+    background.stop_all(app, timeout=5)
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+def after_fork(app):
+    with app.app_context():
+        # Drop pooled connections copied from the parent without closing
+        # the parent's sockets
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    password_hasher.init_app(app)
+    product_importer.init_app(app)
+    background.restart_after_fork(app)
+
+def on_exit(app):
+    """Finish background work and close connections after requests drained"""
+    background.stop_all(app, timeout=10)
+    password_hasher.shutdown()
+    product_importer.shutdown()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
@@ -0,0 +1,179 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import jsonify, request
+from werkzeug.utils import import_string
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+def parse_rate(rate):
+    """'5/minute' -> (capacity, tokens per second)"""
+    count, _, period = rate.partition('/')
+    count = int(count)
+    seconds = _PERIODS[period] if period in _PERIODS else float(period)
+    return count, count / seconds
+
+class ThrottleBackend:
+    """Token bucket storage for Throttle.
+
+    take() refills the bucket at `rate` tokens per second up to `capacity`,
+    spends `cost` tokens if available and returns (allowed, retry_after).
+    """
+
+    def take(self, key, rate, capacity, cost=1):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def size(self):
+        return None
+
+class MemoryBackend(ThrottleBackend):
+    """In-process buckets, least recently used evicted past max_buckets.
+
+    An evicted bucket comes back full, so the bound trades some precision
+    for an attacker spraying keys for fixed memory.
+    """
+
+    def __init__(self, max_buckets=100000):
+        self.max_buckets = max_buckets
+        self.evictions = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                retry_after = 0.0
+            else:
+                retry_after = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+        return retry_after == 0.0, retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def size(self):
+        return {'buckets': len(self._buckets), 'evictions': self.evictions}
+
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+class RedisBackend(ThrottleBackend):
+    """Buckets shared across processes (requires `redis`)"""
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='throttle:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key, rate, capacity, cost=1):
+        retry_after = float(self._take(keys=[self.prefix + key], args=[rate, capacity, time.time(), cost]))
+        return retry_after == 0.0, retry_after
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+class Throttle:
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        self.limits = {}
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('THROTTLE_ENABLED', True)
+        self.limits = app.config.get('THROTTLE_LIMITS', {})
+        backend = app.config.get('THROTTLE_BACKEND', 'memory')
+        options = app.config.get('THROTTLE_OPTIONS', {})
+        if backend == 'memory':
+            self.backend = MemoryBackend(max_buckets=app.config.get('THROTTLE_MAX_BUCKETS', 100000))
+        elif backend == 'redis':
+            self.backend = RedisBackend(**options)
+        else:
+            self.backend = import_string(backend)(**options)
+        app.extensions['throttle'] = self
+
+    def _count(self, scope, outcome):
+        with self._stats_lock:
+            counters = self._stats.setdefault(scope, {'allowed': 0, 'rejected': 0})
+            counters[outcome] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            scopes = {scope: dict(counters) for scope, counters in self._stats.items()}
+        return {'scopes': scopes, 'backend': self.backend.size() if self.backend else None}
+
+    def limit(self, scope, key, rate):
+        """Reject requests over `rate` (e.g. '5/minute') per key(request) with a 429.
+
+        The check runs before the view, so rejected requests cost no DB or
+        bcrypt work. THROTTLE_LIMITS[scope] overrides the default rate;
+        requests whose key is None are not counted.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or self.backend is None:
+                    return view(*args, **kwargs)
+                value = key()
+                if value is None:
+                    return view(*args, **kwargs)
+
+                capacity, per_second = parse_rate(self.limits.get(scope, rate))
+                allowed, retry_after = self.backend.take(f'{scope}:{value}', per_second, capacity)
+                if not allowed:
+                    self._count(scope, 'rejected')
+                    return jsonify({'message': 'Too many requests, please retry later'}), 429, {
+                        'Retry-After': str(max(1, math.ceil(retry_after)))
+                    }
+                self._count(scope, 'allowed')
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+throttle = Throttle()
+
+def by_ip():
+    return request.remote_addr
+
+def by_json_field(name):
+    """Key on a (case-folded) field of the JSON body, e.g. the username"""
+    def key():
+        data = request.get_json(silent=True)
+        value = data.get(name) if isinstance(data, dict) else None
+        return value.strip().lower() if isinstance(value, str) and value.strip() else None
+    return key